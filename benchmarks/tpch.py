@@ -0,0 +1,184 @@
+"""
+TPC-H-style tables generated with Spark.
+Same tables, keys and row counts per scale factor as TPC-H (lineitem has 4
+lines per order instead of 1..7), with values derived from hashes of the
+row key, so a given scale factor always produces the same data regardless
+of the number of cores. Not a compliant dbgen; meant for relative timings.
+"""
+
+from typing import Dict, List
+
+from pyspark.sql import Column, DataFrame, SparkSession
+from pyspark.sql import functions as F
+
+# Rows at scale factor 1 (region and nation are fixed)
+BASE_ROWS = {
+    "region": 5,
+    "nation": 25,
+    "supplier": 10_000,
+    "customer": 150_000,
+    "part": 200_000,
+    "partsupp": 800_000,
+    "orders": 1_500_000,
+    "lineitem": 6_000_000,
+}
+FIXED_TABLES = ("region", "nation")
+LINES_PER_ORDER = 4
+
+SEGMENTS = ["AUTOMOBILE", "BUILDING", "FURNITURE", "HOUSEHOLD", "MACHINERY"]
+PRIORITIES = ["1-URGENT", "2-HIGH", "3-MEDIUM", "4-NOT SPECIFIED", "5-LOW"]
+SHIP_MODES = ["AIR", "FOB", "MAIL", "RAIL", "REG AIR", "SHIP", "TRUCK"]
+REGIONS = ["AFRICA", "AMERICA", "ASIA", "EUROPE", "MIDDLE EAST"]
+PART_TYPES = ["ECONOMY", "LARGE", "MEDIUM", "PROMO", "SMALL", "STANDARD"]
+
+
+def row_count(table: str, scale_factor: float) -> int:
+    if table in FIXED_TABLES:
+        return BASE_ROWS[table]
+    return max(1, int(BASE_ROWS[table] * scale_factor))
+
+
+def _uniform(key: Column, salt: str, low: int, high: int) -> Column:
+    """Deterministic integer in [low, high] from the row key"""
+    return (F.pmod(F.xxhash64(key, F.lit(salt)), F.lit(high - low + 1)) + low).cast("long")
+
+
+def _pick(key: Column, salt: str, values: List[str]) -> Column:
+    return F.element_at(F.array(*[F.lit(v) for v in values]), _uniform(key, salt, 1, len(values)).cast("int"))
+
+
+def _money(key: Column, salt: str, low: int, high: int) -> Column:
+    return (_uniform(key, salt, low * 100, high * 100) / 100).cast("decimal(15,2)")
+
+
+def _date(key: Column, salt: str, start: str, days: int) -> Column:
+    return F.date_add(F.lit(start).cast("date"), _uniform(key, salt, 0, days).cast("int"))
+
+
+def generate(spark: SparkSession, scale_factor: float) -> Dict[str, DataFrame]:
+    """DataFrames for every table at `scale_factor`"""
+    rows = {table: row_count(table, scale_factor) for table in BASE_ROWS}
+    key = F.col("id")
+
+    region = spark.range(rows["region"]).select(
+        key.alias("r_regionkey"),
+        F.element_at(F.array(*[F.lit(r) for r in REGIONS]), (key + 1).cast("int")).alias("r_name"),
+        F.concat(F.lit("region "), key.cast("string")).alias("r_comment"),
+    )
+    nation = spark.range(rows["nation"]).select(
+        key.alias("n_nationkey"),
+        F.concat(F.lit("NATION_"), key.cast("string")).alias("n_name"),
+        (key % 5).alias("n_regionkey"),
+        F.concat(F.lit("nation "), key.cast("string")).alias("n_comment"),
+    )
+    supplier = spark.range(1, rows["supplier"] + 1).select(
+        key.alias("s_suppkey"),
+        F.format_string("Supplier#%09d", key).alias("s_name"),
+        _uniform(key, "s_nation", 0, 24).alias("s_nationkey"),
+        _money(key, "s_acctbal", -999, 9999).alias("s_acctbal"),
+    )
+    customer = spark.range(1, rows["customer"] + 1).select(
+        key.alias("c_custkey"),
+        F.format_string("Customer#%09d", key).alias("c_name"),
+        _uniform(key, "c_nation", 0, 24).alias("c_nationkey"),
+        _money(key, "c_acctbal", -999, 9999).alias("c_acctbal"),
+        _pick(key, "c_segment", SEGMENTS).alias("c_mktsegment"),
+    )
+    part = spark.range(1, rows["part"] + 1).select(
+        key.alias("p_partkey"),
+        F.concat(F.lit("part "), key.cast("string")).alias("p_name"),
+        F.format_string("Brand#%d%d", _uniform(key, "p_b1", 1, 5), _uniform(key, "p_b2", 1, 5)).alias("p_brand"),
+        _pick(key, "p_type", PART_TYPES).alias("p_type"),
+        _uniform(key, "p_size", 1, 50).cast("int").alias("p_size"),
+        _money(key, "p_price", 900, 2000).alias("p_retailprice"),
+    )
+    partsupp = spark.range(rows["partsupp"]).select(
+        (key % rows["part"] + 1).alias("ps_partkey"),
+        ((key % rows["part"] + (key / rows["part"]).cast("long") * 7) % rows["supplier"] + 1).alias("ps_suppkey"),
+        _uniform(key, "ps_qty", 1, 9999).cast("int").alias("ps_availqty"),
+        _money(key, "ps_cost", 1, 1000).alias("ps_supplycost"),
+    )
+    orders = spark.range(1, rows["orders"] + 1).select(
+        key.alias("o_orderkey"),
+        _uniform(key, "o_cust", 1, rows["customer"]).alias("o_custkey"),
+        _pick(key, "o_status", ["F", "O", "P"]).alias("o_orderstatus"),
+        _money(key, "o_total", 850, 550000).alias("o_totalprice"),
+        _date(key, "o_date", "1992-01-01", 2405).alias("o_orderdate"),
+        _pick(key, "o_prio", PRIORITIES).alias("o_orderpriority"),
+        F.lit(0).alias("o_shippriority"),
+    )
+    order_key = (key / LINES_PER_ORDER).cast("long") % rows["orders"] + 1
+    lineitem = spark.range(rows["lineitem"]).select(
+        order_key.alias("l_orderkey"),
+        _uniform(key, "l_part", 1, rows["part"]).alias("l_partkey"),
+        _uniform(key, "l_supp", 1, rows["supplier"]).alias("l_suppkey"),
+        (key % LINES_PER_ORDER + 1).cast("int").alias("l_linenumber"),
+        _uniform(key, "l_qty", 1, 50).cast("decimal(15,2)").alias("l_quantity"),
+        _money(key, "l_price", 900, 105000).alias("l_extendedprice"),
+        (_uniform(key, "l_disc", 0, 10) / 100).cast("decimal(15,2)").alias("l_discount"),
+        (_uniform(key, "l_tax", 0, 8) / 100).cast("decimal(15,2)").alias("l_tax"),
+        _pick(key, "l_rflag", ["A", "N", "R"]).alias("l_returnflag"),
+        _pick(key, "l_lstatus", ["F", "O"]).alias("l_linestatus"),
+        _date(key, "l_ship", "1992-01-02", 2525).alias("l_shipdate"),
+        _pick(key, "l_mode", SHIP_MODES).alias("l_shipmode"),
+    )
+    return {
+        "region": region,
+        "nation": nation,
+        "supplier": supplier,
+        "customer": customer,
+        "part": part,
+        "partsupp": partsupp,
+        "orders": orders,
+        "lineitem": lineitem,
+    }
+
+
+# Queries over tables named <prefix><table>; {p} is replaced by the prefix
+QUERIES = {
+    # Pricing summary report: full scan + aggregation
+    "q1": """
+        SELECT l_returnflag, l_linestatus, sum(l_quantity) AS sum_qty,
+               sum(l_extendedprice) AS sum_base_price,
+               sum(l_extendedprice * (1 - l_discount)) AS sum_disc_price,
+               avg(l_discount) AS avg_disc, count(*) AS count_order
+        FROM {p}lineitem
+        WHERE l_shipdate <= date '1998-09-02'
+        GROUP BY l_returnflag, l_linestatus
+        ORDER BY l_returnflag, l_linestatus
+    """,
+    # Shipping priority: three-way join, top-N
+    "q3": """
+        SELECT l_orderkey, sum(l_extendedprice * (1 - l_discount)) AS revenue, o_orderdate, o_shippriority
+        FROM {p}customer, {p}orders, {p}lineitem
+        WHERE c_mktsegment = 'BUILDING' AND c_custkey = o_custkey AND l_orderkey = o_orderkey
+          AND o_orderdate < date '1995-03-15' AND l_shipdate > date '1995-03-15'
+        GROUP BY l_orderkey, o_orderdate, o_shippriority
+        ORDER BY revenue DESC, o_orderdate
+        LIMIT 10
+    """,
+    # Local supplier volume: join through nation and region
+    "q5": """
+        SELECT n_name, sum(l_extendedprice * (1 - l_discount)) AS revenue
+        FROM {p}customer, {p}orders, {p}lineitem, {p}supplier, {p}nation, {p}region
+        WHERE c_custkey = o_custkey AND l_orderkey = o_orderkey AND l_suppkey = s_suppkey
+          AND c_nationkey = s_nationkey AND s_nationkey = n_nationkey AND n_regionkey = r_regionkey
+          AND r_name = 'ASIA' AND o_orderdate >= date '1994-01-01' AND o_orderdate < date '1995-01-01'
+        GROUP BY n_name
+        ORDER BY revenue DESC
+    """,
+    # Forecasting revenue change: selective scan
+    "q6": """
+        SELECT sum(l_extendedprice * l_discount) AS revenue
+        FROM {p}lineitem
+        WHERE l_shipdate >= date '1994-01-01' AND l_shipdate < date '1995-01-01'
+          AND l_discount BETWEEN 0.05 AND 0.07 AND l_quantity < 24
+    """,
+    # Single-table filtered scan: eligible for the pyarrow fast path
+    "lookup": """
+        SELECT o_orderkey, o_custkey, o_totalprice, o_orderdate
+        FROM {p}orders
+        WHERE o_orderpriority = '1-URGENT'
+        LIMIT 100
+    """,
+}
@@ -122,13 +122,134 @@ CREATE TABLE IF NOT EXISTS audit_logs (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Query history (per-query execution profile written by the query engine)
+CREATE TABLE IF NOT EXISTS query_history (
+    id SERIAL PRIMARY KEY,
+    query_id VARCHAR(64) UNIQUE NOT NULL,
+    user_id INTEGER REFERENCES users(id),
+    query_text TEXT NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    error_message TEXT,
+    result_format VARCHAR(20),
+    cache_hit BOOLEAN DEFAULT false,
+    engine VARCHAR(20),
+    rows_returned BIGINT,
+    queue_ms INTEGER,
+    wall_ms INTEGER,
+    planning_ms INTEGER,
+    execution_ms INTEGER,
+    spark_jobs INTEGER,
+    stages INTEGER,
+    tasks INTEGER,
+    rows_read BIGINT,
+    bytes_read BIGINT,
+    files_read BIGINT,
+    files_pruned BIGINT,
+    shuffle_bytes BIGINT,
+    metrics JSONB,
+    plan TEXT,
+    submitted_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Table statistics (row counts, sizes, per-column min/max/null count/NDV)
+CREATE TABLE IF NOT EXISTS table_stats (
+    table_id INTEGER PRIMARY KEY REFERENCES data_tables(id) ON DELETE CASCADE,
+    table_version BIGINT,
+    row_count BIGINT,
+    size_bytes BIGINT,
+    file_count INTEGER,
+    column_stats JSONB,
+    source VARCHAR(20) NOT NULL,
+    computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Table maintenance runs (OPTIMIZE / VACUUM / checkpoint by the query engine).
+-- File counts are active files, except for VACUUM: data files in storage
+CREATE TABLE IF NOT EXISTS table_maintenance_runs (
+    id SERIAL PRIMARY KEY,
+    table_id INTEGER REFERENCES data_tables(id) ON DELETE CASCADE,
+    operation VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    error_message TEXT,
+    version_before BIGINT,
+    version_after BIGINT,
+    files_before BIGINT,
+    files_after BIGINT,
+    bytes_before BIGINT,
+    bytes_after BIGINT,
+    duration_ms INTEGER,
+    details JSONB,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Chunked uploads in progress (parts live in the S3 multipart upload)
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    upload_id TEXT PRIMARY KEY,
+    bucket VARCHAR(255) NOT NULL,
+    object_name TEXT NOT NULL,
+    content_type VARCHAR(255),
+    part_size BIGINT NOT NULL,
+    presigned BOOLEAN DEFAULT false,
+    owner_id INTEGER REFERENCES users(id),
+    status VARCHAR(20) DEFAULT 'uploading',
+    size_bytes BIGINT,
+    etag VARCHAR(255),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    completed_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Storage usage index (storage service): the size of every object, and
+-- object counts / bytes per bucket (prefix '') and per directory prefix
+-- ('a/', 'a/b/'), kept current from MinIO bucket notifications
+CREATE TABLE IF NOT EXISTS storage_objects (
+    bucket VARCHAR(63) NOT NULL,
+    key TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    etag VARCHAR(255),
+    last_modified TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (bucket, key)
+);
+
+CREATE TABLE IF NOT EXISTS storage_usage (
+    bucket VARCHAR(63) NOT NULL,
+    prefix TEXT NOT NULL,
+    parent TEXT,
+    object_count BIGINT NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (bucket, prefix)
+);
+
+-- Last full rescan of each bucket and how far the index had drifted
+CREATE TABLE IF NOT EXISTS storage_usage_scans (
+    bucket VARCHAR(63) PRIMARY KEY,
+    objects BIGINT NOT NULL,
+    bytes BIGINT NOT NULL,
+    drift_objects BIGINT,
+    drift_bytes BIGINT,
+    duration_ms INTEGER,
+    scanned_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Create indexes for better query performance
 CREATE INDEX IF NOT EXISTS idx_notebooks_workspace ON notebooks(workspace_id);
 CREATE INDEX IF NOT EXISTS idx_jobs_notebook ON jobs(notebook_id);
 CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job_id);
 CREATE INDEX IF NOT EXISTS idx_data_tables_database ON data_tables(database);
+CREATE INDEX IF NOT EXISTS idx_data_tables_updated ON data_tables(updated_at);
+CREATE INDEX IF NOT EXISTS idx_data_tables_lower_name ON data_tables(lower(name));
 CREATE INDEX IF NOT EXISTS idx_audit_logs_user ON audit_logs(user_id);
 CREATE INDEX IF NOT EXISTS idx_audit_logs_created ON audit_logs(created_at);
+CREATE INDEX IF NOT EXISTS idx_query_history_user ON query_history(user_id);
+CREATE INDEX IF NOT EXISTS idx_query_history_submitted ON query_history(submitted_at);
+CREATE INDEX IF NOT EXISTS idx_query_history_wall ON query_history(wall_ms);
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_status ON upload_sessions(status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_table_maintenance_runs_table ON table_maintenance_runs(table_id, started_at);
+CREATE INDEX IF NOT EXISTS idx_storage_usage_parent ON storage_usage(bucket, parent);
 
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -157,3 +278,55 @@ CREATE TRIGGER update_clusters_updated_at BEFORE UPDATE ON clusters
 
 CREATE TRIGGER update_data_tables_updated_at BEFORE UPDATE ON data_tables
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Notify listeners (e.g. the query engine's catalog sync) when the data catalog changes
+CREATE OR REPLACE FUNCTION notify_data_tables_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    PERFORM pg_notify(
+        'data_tables_changed',
+        json_build_object(
+            'op', lower(TG_OP),
+            'id', changed.id,
+            'name', changed.name,
+            'database', changed.database
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER notify_data_tables_change
+    AFTER INSERT OR UPDATE OR DELETE ON data_tables
+    FOR EACH ROW EXECUTE FUNCTION notify_data_tables_change();
+
+-- Stats are written by the query engine; the storage service's catalog cache
+-- serves them with table details, so it has to hear about new ones too
+CREATE OR REPLACE FUNCTION notify_table_stats_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    PERFORM pg_notify(
+        'table_stats_changed',
+        json_build_object('op', lower(TG_OP), 'id', changed.table_id)::text
+    );
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER notify_table_stats_change
+    AFTER INSERT OR UPDATE OR DELETE ON table_stats
+    FOR EACH ROW EXECUTE FUNCTION notify_table_stats_change();
@@ -1,3 +1,4 @@
+const crypto = require("crypto");
 const express = require("express");
 const cors = require("cors");
 const helmet = require("helmet");
@@ -17,10 +18,23 @@ const STORAGE_SERVICE_URL =
 const QUERY_SERVICE_URL =
   process.env.QUERY_SERVICE_URL || "http://localhost:8003";
 
+// Every request gets an id (kept if the client sent a well-formed one);
+// upstream services tag their logs, traces and responses with it
+const REQUEST_ID_PATTERN = /^[A-Za-z0-9._:-]{1,128}$/;
+app.use((req, res, next) => {
+  const incoming = req.get("X-Request-Id");
+  req.requestId =
+    incoming && REQUEST_ID_PATTERN.test(incoming) ? incoming : crypto.randomUUID();
+  res.setHeader("X-Request-Id", req.requestId);
+  next();
+});
+
+morgan.token("request-id", (req) => req.requestId);
+
 // Middleware
 app.use(helmet());
-app.use(cors());
-app.use(morgan("combined"));
+app.use(cors({ exposedHeaders: ["X-Request-Id", "Server-Timing"] }));
+app.use(morgan(`:request-id ${morgan.combined}`));
 // Note: We do NOT use express.json() globally because it consumes the request body stream,
 // which breaks http-proxy-middleware for POST/PUT requests.
 // If the Gateway needs to parse body for its own endpoints, apply it specifically to those routes.
@@ -78,6 +92,7 @@ const proxyOptions = {
     if (req.ip) {
       proxyReq.setHeader("X-Forwarded-For", req.ip);
     }
+    proxyReq.setHeader("X-Request-Id", req.requestId);
   },
 };
 
@@ -32,6 +32,76 @@ export interface AuthResponse {
   user: User;
 }
 
+export interface ColumnarQueryResult {
+  success: boolean;
+  data: Record<string, any[]>;
+  columns: string[];
+  types: Record<string, string>;
+  row_count: number;
+  truncated: boolean;
+  cached?: boolean;
+  engine?: "spark" | "fastpath" | "cache" | null;
+  error?: string;
+}
+
+export interface QueryJob {
+  job_id: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  query: string;
+  error?: string | null;
+  progress?: {
+    spark_jobs: number;
+    total_tasks: number;
+    completed_tasks: number;
+    fraction: number;
+  };
+}
+
+export interface IngestRequest {
+  bucket: string;
+  path: string;
+  table: string;
+  database?: string;
+  format?: "csv" | "json";
+  mode?: "error" | "append" | "overwrite";
+  partition_by?: string[];
+  target_file_mb?: number;
+  header?: boolean;
+  delimiter?: string;
+}
+
+export interface IngestJob extends QueryJob {
+  location?: string;
+  report?: {
+    table: any;
+    schema: any;
+    input_bytes: number;
+    records_per_file: number;
+    seconds: number;
+    throughput_mb_s: number | null;
+    stats?: any;
+  } | null;
+}
+
+export interface MultipartUpload {
+  upload_id: string;
+  bucket: string;
+  object_name: string;
+  part_size: number;
+  part_count: number | null;
+}
+
+export interface UploadOptions {
+  // Parts sent at the same time
+  concurrency?: number;
+  // Resume this upload: only parts not yet stored are sent
+  uploadId?: string;
+  onProgress?: (uploadedBytes: number, totalBytes: number) => void;
+}
+
+// Files above this size are uploaded in parallel parts
+const MULTIPART_THRESHOLD = 32 * 1024 * 1024;
+
 class ApiClient {
   private token: string | null = null;
 
@@ -223,13 +293,22 @@ class ApiClient {
     );
   }
 
-  async listFiles(bucket: string, prefix = "") {
-    return this.request<{ files: any[] }>(
-      `${GATEWAY_URL}/api/storage/files/${bucket}?prefix=${prefix}`
-    );
+  async listFiles(bucket: string, prefix = "", continuationToken?: string) {
+    const params = new URLSearchParams({ prefix });
+    if (continuationToken) {
+      params.set("continuation_token", continuationToken);
+    }
+    return this.request<{
+      files: any[];
+      is_truncated: boolean;
+      next_continuation_token: string | null;
+    }>(`${GATEWAY_URL}/api/storage/files/${bucket}?${params}`);
   }
 
-  async uploadFile(bucket: string, file: File, path = "") {
+  async uploadFile(bucket: string, file: File, path = "", options: UploadOptions = {}) {
+    if (file.size > MULTIPART_THRESHOLD || options.uploadId) {
+      return this.uploadFileMultipart(bucket, file, path, options);
+    }
     const formData = new FormData();
     formData.append("file", file);
 
@@ -256,19 +335,119 @@ class ApiClient {
     return response.json();
   }
 
+  async uploadFileMultipart(bucket: string, file: File, path = "", options: UploadOptions = {}) {
+    const { concurrency = 4, onProgress } = options;
+    let upload: MultipartUpload;
+    const done = new Set<number>();
+    let uploadedBytes = 0;
+
+    if (options.uploadId) {
+      const status = await this.request<{
+        upload: MultipartUpload;
+        parts: { part_number: number; size: number }[];
+      }>(`${GATEWAY_URL}/api/storage/uploads/${options.uploadId}`);
+      upload = status.upload;
+      for (const part of status.parts) {
+        done.add(part.part_number);
+        uploadedBytes += part.size;
+      }
+    } else {
+      upload = await this.request<MultipartUpload>(`${GATEWAY_URL}/api/storage/uploads`, {
+        method: "POST",
+        body: JSON.stringify({
+          bucket,
+          path,
+          filename: file.name,
+          content_type: file.type || undefined,
+          size: file.size,
+        }),
+      });
+    }
+
+    const partCount = Math.max(1, Math.ceil(file.size / upload.part_size));
+    const pending: number[] = [];
+    for (let n = 1; n <= partCount; n++) {
+      if (!done.has(n)) pending.push(n);
+    }
+    onProgress?.(uploadedBytes, file.size);
+
+    const headers: Record<string, string> = {};
+    if (this.token) {
+      headers["Authorization"] = `Bearer ${this.token}`;
+    }
+
+    const sendParts = async () => {
+      for (let n = pending.shift(); n !== undefined; n = pending.shift()) {
+        const chunk = file.slice((n - 1) * upload.part_size, n * upload.part_size);
+        const response = await fetch(
+          `${GATEWAY_URL}/api/storage/uploads/${upload.upload_id}/parts/${n}`,
+          { method: "PUT", headers, body: chunk }
+        );
+        if (!response.ok) {
+          // Stored parts survive: retry with { uploadId } to resume
+          throw new Error(
+            `Part ${n} failed (HTTP ${response.status}); resume upload ${upload.upload_id}`
+          );
+        }
+        uploadedBytes += chunk.size;
+        onProgress?.(uploadedBytes, file.size);
+      }
+    };
+    await Promise.all(Array.from({ length: Math.min(concurrency, pending.length) }, sendParts));
+
+    return this.request(`${GATEWAY_URL}/api/storage/uploads/${upload.upload_id}/complete`, {
+      method: "POST",
+    });
+  }
+
+  async abortUpload(uploadId: string) {
+    return this.request(`${GATEWAY_URL}/api/storage/uploads/${uploadId}`, {
+      method: "DELETE",
+    });
+  }
+
   // Query Endpoints
   async executeQuery(query: string) {
-    return this.request<{
-      success: boolean;
-      data: any[];
-      columns: string[];
-      error?: string;
-    }>(`${GATEWAY_URL}/api/query/sql`, {
+    return this.request<ColumnarQueryResult>(`${GATEWAY_URL}/api/query/sql`, {
       method: "POST",
-      body: JSON.stringify({ query }),
+      body: JSON.stringify({ query, format: "columnar" }),
     });
   }
 
+  async submitQueryJob(query: string) {
+    return this.request<QueryJob>(`${GATEWAY_URL}/api/query/jobs`, {
+      method: "POST",
+      body: JSON.stringify({ query, format: "columnar" }),
+    });
+  }
+
+  async getQueryJob(jobId: string) {
+    return this.request<QueryJob>(`${GATEWAY_URL}/api/query/jobs/${jobId}`);
+  }
+
+  async getQueryJobResult(jobId: string) {
+    return this.request<ColumnarQueryResult>(
+      `${GATEWAY_URL}/api/query/jobs/${jobId}/result`
+    );
+  }
+
+  async cancelQueryJob(jobId: string) {
+    return this.request<QueryJob>(`${GATEWAY_URL}/api/query/jobs/${jobId}`, {
+      method: "DELETE",
+    });
+  }
+
+  async ingestFile(data: IngestRequest) {
+    return this.request<IngestJob>(`${GATEWAY_URL}/api/query/ingest`, {
+      method: "POST",
+      body: JSON.stringify(data),
+    });
+  }
+
+  async getIngestJob(jobId: string) {
+    return this.request<IngestJob>(`${GATEWAY_URL}/api/query/ingest/${jobId}`);
+  }
+
   // Health checks
   async checkApiHealth() {
     return this.request<{ status: string }>(`${API_SERVICE_URL}/health`);
@@ -1,46 +1,89 @@
-import { useState } from "react";
-import { Play, Terminal, AlertCircle, CheckCircle2 } from "lucide-react";
+import { useRef, useState } from "react";
+import {
+  Play,
+  Square,
+  Terminal,
+  AlertCircle,
+  CheckCircle2,
+} from "lucide-react";
 import { api } from "../lib/api";
 
+const POLL_INTERVAL_MS = 500;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
 export default function Query() {
   const [query, setQuery] = useState("SELECT * FROM default.users LIMIT 10");
-  const [results, setResults] = useState<any[]>([]);
+  const [results, setResults] = useState<Record<string, any[]>>({});
+  const [rowCount, setRowCount] = useState(0);
   const [columns, setColumns] = useState<string[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [executionTime, setExecutionTime] = useState<number | null>(null);
+  const [engine, setEngine] = useState<string | null>(null);
+  const [progress, setProgress] = useState<number | null>(null);
+  const jobIdRef = useRef<string | null>(null);
 
   const handleRunQuery = async () => {
     if (!query.trim()) return;
 
     setLoading(true);
     setError(null);
-    setResults([]);
+    setResults({});
+    setRowCount(0);
     setColumns([]);
     setExecutionTime(null);
+    setEngine(null);
+    setProgress(null);
 
     const startTime = performance.now();
 
     try {
-      const response = await api.executeQuery(query);
+      // Submit as a job and poll, so long queries don't hold a connection open
+      let job = await api.submitQueryJob(query);
+      jobIdRef.current = job.job_id;
 
-      if (response.data && response.data.length > 0) {
-        setColumns(Object.keys(response.data[0]));
-        setResults(response.data);
-      } else {
-        setResults([]);
+      while (job.status === "queued" || job.status === "running") {
+        await sleep(POLL_INTERVAL_MS);
+        job = await api.getQueryJob(job.job_id);
+        setProgress(job.progress?.fraction ?? null);
       }
 
+      const response = await api.getQueryJobResult(job.job_id);
+
+      if (!response.success) {
+        throw new Error(response.error || "Query execution failed");
+      }
+
+      // Results arrive column-oriented: one array of values per column
+      setColumns(response.columns);
+      setResults(response.data);
+      setRowCount(response.row_count);
+      setEngine(response.engine ?? null);
+
       const endTime = performance.now();
       setExecutionTime(endTime - startTime);
     } catch (err: any) {
       console.error("Query execution failed:", err);
-      setError(err.response?.data?.detail || "Query execution failed");
+      setError(
+        err.response?.data?.detail || err.message || "Query execution failed"
+      );
     } finally {
+      jobIdRef.current = null;
+      setProgress(null);
       setLoading(false);
     }
   };
 
+  const handleCancelQuery = async () => {
+    if (!jobIdRef.current) return;
+    try {
+      await api.cancelQueryJob(jobIdRef.current);
+    } catch (err) {
+      console.error("Failed to cancel query:", err);
+    }
+  };
+
   return (
     <div className="space-y-6 h-[calc(100vh-6rem)] flex flex-col">
       <div className="flex items-center justify-between flex-shrink-0">
@@ -50,16 +93,33 @@ export default function Query() {
             Execute Spark SQL queries against your Data Lake
           </p>
         </div>
-        <button
-          onClick={handleRunQuery}
-          disabled={loading}
-          className={`flex items-center space-x-2 bg-blue-600 text-white px-6 py-2 rounded-lg hover:bg-blue-700 transition-colors ${
-            loading ? "opacity-75 cursor-not-allowed" : ""
-          }`}
-        >
-          <Play className={`w-4 h-4 ${loading ? "animate-spin" : ""}`} />
-          <span>{loading ? "Running..." : "Run Query"}</span>
-        </button>
+        <div className="flex items-center space-x-2">
+          {loading && (
+            <button
+              onClick={handleCancelQuery}
+              className="flex items-center space-x-2 bg-white text-gray-700 border border-gray-300 px-4 py-2 rounded-lg hover:bg-gray-50 transition-colors"
+            >
+              <Square className="w-4 h-4" />
+              <span>Cancel</span>
+            </button>
+          )}
+          <button
+            onClick={handleRunQuery}
+            disabled={loading}
+            className={`flex items-center space-x-2 bg-blue-600 text-white px-6 py-2 rounded-lg hover:bg-blue-700 transition-colors ${
+              loading ? "opacity-75 cursor-not-allowed" : ""
+            }`}
+          >
+            <Play className={`w-4 h-4 ${loading ? "animate-spin" : ""}`} />
+            <span>
+              {loading
+                ? progress !== null
+                  ? `Running... ${Math.round(progress * 100)}%`
+                  : "Running..."
+                : "Run Query"}
+            </span>
+          </button>
+        </div>
       </div>
 
       {/* Query Editor */}
@@ -89,6 +149,7 @@ export default function Query() {
             <span className="text-xs text-gray-500 flex items-center">
               <CheckCircle2 className="w-3 h-3 mr-1 text-green-500" />
               Executed in {executionTime.toFixed(2)}ms
+              {engine && ` (${engine})`}
             </span>
           )}
         </div>
@@ -106,7 +167,7 @@ export default function Query() {
                 {error}
               </p>
             </div>
-          ) : results.length > 0 ? (
+          ) : rowCount > 0 ? (
             <table className="w-full text-sm text-left">
               <thead className="bg-gray-50 text-gray-500 font-medium sticky top-0">
                 <tr>
@@ -121,16 +182,16 @@ export default function Query() {
                 </tr>
               </thead>
               <tbody className="divide-y divide-gray-200">
-                {results.map((row, i) => (
+                {Array.from({ length: rowCount }, (_, i) => (
                   <tr key={i} className="hover:bg-gray-50">
                     {columns.map((col) => (
                       <td
                         key={`${i}-${col}`}
                         className="px-6 py-3 whitespace-nowrap text-gray-900"
                       >
-                        {typeof row[col] === "object"
-                          ? JSON.stringify(row[col])
-                          : String(row[col])}
+                        {typeof results[col][i] === "object"
+                          ? JSON.stringify(results[col][i])
+                          : String(results[col][i])}
                       </td>
                     ))}
                   </tr>
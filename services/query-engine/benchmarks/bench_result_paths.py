@@ -0,0 +1,111 @@
+"""
+Benchmark: row-dict vs Arrow result paths for /api/query/sql
+
+Runs against a local Spark session (no cluster, MinIO or Postgres needed) and
+times the driver-side work each response mode does after spark.sql():
+
+  rows      df.limit().collect() -> Row.asDict() -> QueryResponse -> JSON
+  columnar  Arrow collection -> per-column lists -> JSON
+  arrow     Arrow collection -> IPC stream bytes
+
+Usage (from services/query-engine):
+    python -m benchmarks.bench_result_paths --rows 1000 --cols 10,50,200
+"""
+
+import argparse
+import statistics
+import time
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+
+from src.results import collect_arrow, iter_arrow_stream, to_columnar
+from src.server import ColumnarQueryResponse, QueryResponse
+
+
+def make_frame(spark, rows: int, cols: int):
+    """Wide frame mixing ints, doubles, strings and timestamps"""
+    df = spark.range(rows)
+    exprs = []
+    for i in range(cols):
+        kind = i % 4
+        if kind == 0:
+            exprs.append((F.col("id") * i).alias(f"c{i}_int"))
+        elif kind == 1:
+            exprs.append((F.col("id") / (i + 1)).alias(f"c{i}_dbl"))
+        elif kind == 2:
+            exprs.append(F.concat(F.lit(f"v{i}_"), F.col("id").cast("string")).alias(f"c{i}_str"))
+        else:
+            exprs.append(F.timestamp_seconds(F.col("id") + i).alias(f"c{i}_ts"))
+    # Cache so every run measures collection, not generation
+    return df.select(*exprs).cache()
+
+
+def rows_path(df, limit):
+    rows = df.limit(limit + 1).collect()
+    data = [row.asDict() for row in rows[:limit]]
+    resp = QueryResponse(
+        success=True, columns=df.columns, data=data,
+        row_count=len(data), truncated=len(rows) > limit,
+    )
+    return len(resp.model_dump_json())
+
+
+def columnar_path(df, limit):
+    table, truncated = collect_arrow(df, limit)
+    resp = ColumnarQueryResponse.model_construct(
+        success=True, row_count=table.num_rows, truncated=truncated,
+        **to_columnar(table)
+    )
+    return len(resp.model_dump_json())
+
+
+def arrow_path(df, limit):
+    table, _ = collect_arrow(df, limit)
+    return sum(len(chunk) for chunk in iter_arrow_stream(table))
+
+
+def time_it(fn, df, limit, repeat):
+    fn(df, limit)  # warm-up
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn(df, limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="rows returned (QUERY_ROW_LIMIT)")
+    parser.add_argument("--cols", default="10,50,200", help="comma-separated column counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    spark = (SparkSession.builder
+        .appName("bench-result-paths")
+        .master("local[*]")
+        .config("spark.sql.execution.arrow.pyspark.enabled", "true")
+        .config("spark.ui.enabled", "false")
+        .getOrCreate())
+    spark.sparkContext.setLogLevel("WARN")
+
+    paths = [("rows", rows_path), ("columnar", columnar_path), ("arrow", arrow_path)]
+    print(f"{'cols':>6} {'path':>10} {'median ms':>10} {'bytes':>12} {'speedup':>8}")
+    try:
+        for cols in (int(c) for c in args.cols.split(",")):
+            df = make_frame(spark, args.rows, cols)
+            df.count()
+            baseline = None
+            for name, fn in paths:
+                ms, size = time_it(fn, df, args.rows, args.repeat)
+                baseline = baseline or ms
+                print(f"{cols:>6} {name:>10} {ms:>10.1f} {size:>12} {baseline / ms:>7.1f}x")
+            df.unpersist()
+    finally:
+        spark.stop()
+
+
+if __name__ == "__main__":
+    main()
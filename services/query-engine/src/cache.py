@@ -0,0 +1,193 @@
+"""
+Query result cache for the query engine.
+Entries are keyed on the normalized query text plus the current Delta version
+of every catalog table the query references, so a write to any of those
+tables makes its old entries unreachable. Memory is bounded by a byte budget
+with LRU eviction.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+
+# String literals, quoted identifiers, comments, whitespace, everything else
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<literal>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<space>\s+)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Functions whose result changes between runs of the same query text
+_NONDETERMINISTIC = {
+    "rand", "randn", "random", "uuid", "shuffle", "now", "current_timestamp",
+    "current_date", "localtimestamp", "unix_timestamp", "monotonically_increasing_id",
+}
+
+_CACHEABLE_STATEMENTS = ("select", "with", "(")
+
+# Words that can follow a table reference without being its alias
+_CLAUSE_WORDS = {
+    "where", "group", "order", "having", "limit", "offset", "union", "intersect", "except",
+    "join", "inner", "left", "right", "full", "cross", "semi", "anti", "natural", "on",
+    "using", "lateral", "window", "tablesample", "pivot", "unpivot", "cluster", "distribute", "sort",
+}
+
+
+def _tokens(query: str) -> Iterator[Tuple[str, str]]:
+    for match in _TOKEN_RE.finditer(query):
+        yield match.lastgroup, match.group()
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonical form of a query: comments dropped, whitespace collapsed and
+    keywords/identifiers lower-cased. Literals are kept verbatim.
+    """
+    parts = []
+    pending_space = False
+    for kind, text in _tokens(query):
+        if kind in ("comment", "space"):
+            pending_space = bool(parts)
+            continue
+        if pending_space:
+            parts.append(" ")
+            pending_space = False
+        parts.append(text if kind == "literal" else text.lower())
+    return "".join(parts).rstrip(";").rstrip()
+
+
+def referenced_identifiers(normalized: str) -> Set[str]:
+    """Every bare or back-quoted identifier in a normalized query"""
+    names = set()
+    for kind, text in _tokens(normalized):
+        if kind == "word":
+            names.add(text)
+        elif kind == "quoted":
+            names.add(text[1:-1].replace("``", "`").lower())
+    return names
+
+
+def table_references(normalized: str) -> Set[str]:
+    """
+    Names read as tables: those after FROM or JOIN (and after commas in a
+    FROM list), with qualified and path-based names (db.t, delta.`s3a://..`)
+    kept whole and names defined by the query's own CTEs left out. Table
+    functions are returned with a trailing "()".
+    """
+    tokens = [(kind, text) for kind, text in _tokens(normalized) if kind not in ("space", "comment")]
+    ctes = {
+        _unquote(tokens[i][1]) for i in range(1, len(tokens) - 2)
+        if tokens[i - 1] in (("word", "with"), ("other", ","))
+        and tokens[i][0] in ("word", "quoted") and tokens[i + 1] == ("word", "as")
+        and tokens[i + 2] == ("other", "(")
+    }
+    names = set()
+    i = 0
+    while i < len(tokens):
+        if tokens[i] not in (("word", "from"), ("word", "join")):
+            i += 1
+            continue
+        while True:
+            i += 1
+            if i >= len(tokens) or tokens[i][0] not in ("word", "quoted"):
+                break
+            parts = [_unquote(tokens[i][1])]
+            while i + 2 < len(tokens) and tokens[i + 1] == ("other", ".") and tokens[i + 2][0] in ("word", "quoted"):
+                i += 2
+                parts.append(_unquote(tokens[i][1]))
+            name = ".".join(parts)
+            if i + 1 < len(tokens) and tokens[i + 1] == ("other", "("):
+                name += "()"
+            if name not in ctes:
+                names.add(name)
+            # Skip an alias, then continue a comma-separated FROM list
+            i += 1
+            if i < len(tokens) and tokens[i] == ("word", "as"):
+                i += 1
+            if i < len(tokens) and tokens[i][0] in ("word", "quoted") and tokens[i][1] not in _CLAUSE_WORDS:
+                i += 1
+            if i >= len(tokens) or tokens[i] != ("other", ","):
+                break
+    return names
+
+
+def _unquote(text: str) -> str:
+    return text[1:-1].replace("``", "`").lower() if text.startswith("`") else text
+
+
+def is_cacheable(normalized: str, identifiers: Set[str]) -> bool:
+    """Only plain read queries with deterministic results are cached"""
+    if not normalized.startswith(_CACHEABLE_STATEMENTS):
+        return False
+    return not (identifiers & _NONDETERMINISTIC)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by the total estimated size of its entries.
+    A `max_bytes` of 0 disables caching.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
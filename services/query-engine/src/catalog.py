@@ -0,0 +1,353 @@
+"""
+Catalog resolution for the query engine.
+Postgres 'data_tables' entries become Spark temp views in one of two ways:
+- lazy (TableResolver): only the tables a query references are looked up and
+  registered just before it runs, and unused ones are dropped after a TTL
+- eager (CatalogSync): every table is mirrored, with incremental re-syncs
+A LISTEN/NOTIFY listener reacts to catalog changes in either mode.
+"""
+
+import json
+import time
+import select
+import logging
+import threading
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Must match the channel used by the data_tables trigger in 01-schema.sql
+CATALOG_CHANNEL = "data_tables_changed"
+
+# Re-read rows updated this long before the newest one already seen, so rows
+# from transactions that committed out of timestamp order are not missed
+UPDATE_OVERLAP = timedelta(seconds=5)
+
+# Words that can never name a table reference; never looked up
+SQL_KEYWORDS = frozenset("""
+    select from where and or not in is null as on join inner outer left right
+    full cross semi anti group by order having limit offset union all distinct
+    case when then else end with asc desc between like ilike rlike exists true
+    false cast interval over partition rows range preceding following current
+    row lateral view explode using natural window values table
+""".split())
+
+
+class CatalogSync:
+    """
+    Keeps Spark temp views in step with 'data_tables'.
+    `by_name` maps lower-cased table names to their location and format.
+    """
+
+    def __init__(self, connect: Callable):
+        self.connect = connect
+        self.by_name: Dict[str, Dict[str, str]] = {}
+        self._by_id: Dict[int, Dict] = {}
+        self._high_water: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def full_sync(self, spark) -> Dict[str, int]:
+        """Re-register every table and drop views for rows that are gone"""
+        with self._lock:
+            rows = self._fetch("SELECT id, name, location, format, updated_at FROM data_tables")
+            stats = self._apply(spark, rows, {row["id"] for row in rows}, force=True)
+        logger.info(f"Full catalog sync: {stats}")
+        return stats
+
+    def incremental_sync(self, spark) -> Dict[str, int]:
+        """Register only new/changed tables and drop deleted ones"""
+        with self._lock:
+            if self._high_water is None:
+                rows = self._fetch("SELECT id, name, location, format, updated_at FROM data_tables")
+                live_ids = {row["id"] for row in rows}
+            else:
+                rows = self._fetch(
+                    "SELECT id, name, location, format, updated_at FROM data_tables WHERE updated_at >= %s",
+                    (self._high_water - UPDATE_OVERLAP,)
+                )
+                # Deletions leave no row behind: diff the id set instead
+                live_ids = {row["id"] for row in self._fetch("SELECT id FROM data_tables")}
+            stats = self._apply(spark, rows, live_ids, force=False)
+        if stats["registered"] or stats["dropped"]:
+            logger.info(f"Incremental catalog sync: {stats}")
+        return stats
+
+    def _fetch(self, query: str, params: tuple = ()):
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def _apply(self, spark, rows, live_ids, force: bool) -> Dict[str, int]:
+        registered = dropped = failed = 0
+
+        for table_id in [i for i in self._by_id if i not in live_ids]:
+            _drop_view(spark, self._by_id.pop(table_id))
+            dropped += 1
+
+        for row in rows:
+            known = self._by_id.get(row["id"])
+            if known and not force and known["updated_at"] == row["updated_at"]:
+                continue
+            if known and known["name"] != row["name"]:
+                _drop_view(spark, known)
+                dropped += 1
+            if _register_view(spark, row):
+                registered += 1
+            else:
+                failed += 1
+            self._by_id[row["id"]] = dict(row)
+            if self._high_water is None or row["updated_at"] > self._high_water:
+                self._high_water = row["updated_at"]
+
+        self.by_name = {
+            t["name"].lower(): {"location": t["location"], "format": t["format"] or "delta"}
+            for t in self._by_id.values()
+        }
+        return {"registered": registered, "dropped": dropped, "failed": failed, "tables": len(self._by_id)}
+
+
+@dataclass
+class _Resolved:
+    # data_tables row, or None if the name is not a catalog table
+    row: Optional[Dict]
+    checked_at: float
+    last_used: float
+
+
+class TableResolver:
+    """
+    Registers catalog tables as temp views on first reference.
+    Lookups are cached for `ttl` seconds (`negative_ttl` for names that are
+    not tables); views unused for `ttl` seconds are dropped by `evict`.
+    The lock only guards the in-memory map: Postgres lookups and view
+    (un)registration run outside it, at most one at a time per name.
+    """
+
+    def __init__(self, connect: Callable, ttl: int, negative_ttl: int):
+        self.connect = connect
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: Dict[str, _Resolved] = {}
+        # Names being refreshed or evicted -> set when that finishes
+        self._inflight: Dict[str, threading.Event] = {}
+        # In-flight names invalidated meanwhile: their refresh is not trusted
+        self._invalidated: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def by_name(self) -> Dict[str, Dict[str, str]]:
+        """Currently registered tables, same shape as CatalogSync.by_name"""
+        with self._lock:
+            return {
+                name: {"location": e.row["location"], "format": e.row["format"] or "delta"}
+                for name, e in self._entries.items() if e.row
+            }
+
+    def resolve(self, spark, identifiers: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Make sure every catalog table among `identifiers` is registered and
+        current. Returns name -> location/format for those tables.
+        """
+        now = time.time()
+        names = {n for n in identifiers if n not in SQL_KEYWORDS}
+        while True:
+            with self._lock:
+                stale = [n for n in names if self._is_stale(self._entries.get(n), now)]
+                waits = {self._inflight[n] for n in stale if n in self._inflight}
+                mine = [n for n in stale if n not in self._inflight]
+                done = self._claim(mine)
+            if mine:
+                try:
+                    self._refresh(spark, mine, now)
+                finally:
+                    self._release(mine, done)
+            if not waits:
+                break
+            # Another query is resolving (or evicting) some of these names
+            for event in waits:
+                event.wait()
+
+        resolved = {}
+        with self._lock:
+            for name in names:
+                entry = self._entries.get(name)
+                if entry and entry.row:
+                    entry.last_used = now
+                    resolved[name] = {"location": entry.row["location"],
+                                      "format": entry.row["format"] or "delta"}
+        return resolved
+
+    def invalidate(self, names: Optional[Iterable[str]] = None):
+        """Force the next reference to re-check `names` (all if None)"""
+        with self._lock:
+            targets = list(self._entries) if names is None else [n.lower() for n in names]
+            for name in targets:
+                if name in self._entries:
+                    self._entries[name].checked_at = 0
+            self._invalidated.update(
+                self._inflight if names is None else [n for n in targets if n in self._inflight]
+            )
+
+    def evict(self, spark) -> int:
+        """Drop views not referenced for `ttl` seconds and forget stale negatives"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            names = [n for n, e in self._entries.items()
+                     if e.last_used < cutoff and n not in self._inflight]
+            rows = [row for row in (self._entries.pop(n).row for n in names) if row]
+            done = self._claim(names)
+        try:
+            for row in rows:
+                _drop_view(spark, row)
+        finally:
+            self._release(names, done)
+        return len(rows)
+
+    def _is_stale(self, entry: Optional[_Resolved], now: float) -> bool:
+        if entry is None:
+            return True
+        ttl = self.ttl if entry.row else self.negative_ttl
+        return entry.checked_at < now - ttl
+
+    def _claim(self, names: List[str]) -> threading.Event:
+        # Caller holds the lock
+        done = threading.Event()
+        for name in names:
+            self._inflight[name] = done
+        return done
+
+    def _release(self, names: List[str], done: threading.Event):
+        with self._lock:
+            for name in names:
+                self._inflight.pop(name, None)
+                self._invalidated.discard(name)
+        done.set()
+
+    def _refresh(self, spark, names: List[str], now: float):
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id, name, location, format, updated_at FROM data_tables WHERE lower(name) = ANY(%s)",
+                (names,)
+            )
+            rows = {row["name"].lower(): row for row in cur.fetchall()}
+        finally:
+            conn.close()
+
+        # The names are claimed: nobody else registers, drops or replaces them
+        with self._lock:
+            old_entries = {name: self._entries.get(name) for name in names}
+        for name in names:
+            row = rows.get(name)
+            old = old_entries[name]
+            old_row = old.row if old else None
+            if row and (old_row is None or _row_changed(old_row, row)):
+                if not _register_view(spark, row):
+                    row = None
+            elif row is None and old_row is not None:
+                _drop_view(spark, old_row)
+            with self._lock:
+                checked_at = 0 if name in self._invalidated else now
+                self._entries[name] = _Resolved(row, checked_at, old.last_used if old else now)
+
+
+class CatalogListener(threading.Thread):
+    """
+    LISTENs on CATALOG_CHANNEL and calls `on_change(changes)` with the decoded
+    payloads of each burst of notifications. `on_interval()` runs every
+    `fallback_interval` seconds, covering notifications lost while
+    disconnected.
+    """
+
+    def __init__(self, connect: Callable, on_change: Callable[[List[Dict]], None],
+                 on_interval: Callable[[], None], fallback_interval: int = 300):
+        super().__init__(name="catalog-listener", daemon=True)
+        self.connect = connect
+        self.on_change = on_change
+        self.on_interval = on_interval
+        self.fallback_interval = fallback_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = 1
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+                backoff = 1
+            except Exception as e:
+                logger.warning(f"Catalog listener disconnected: {e}; retrying in {backoff}s")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _listen(self):
+        conn = self.connect()
+        try:
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CATALOG_CHANNEL}")
+            logger.info(f"Listening for catalog changes on '{CATALOG_CHANNEL}'")
+            # Anything that changed while we were not listening
+            self.on_interval()
+            last_run = time.monotonic()
+
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([conn], [], [], 1.0)
+                if readable:
+                    conn.poll()
+                    if conn.notifies:
+                        # Coalesce a burst of notifications into one callback
+                        changes = [_decode(n.payload) for n in conn.notifies]
+                        conn.notifies.clear()
+                        self.on_change(changes)
+                        continue
+                if time.monotonic() - last_run >= self.fallback_interval:
+                    self.on_interval()
+                    last_run = time.monotonic()
+        finally:
+            conn.close()
+
+
+def _decode(payload: str) -> Dict:
+    try:
+        change = json.loads(payload)
+    except ValueError:
+        change = {}
+    logger.debug(f"Catalog change: {change.get('op')} {change.get('database')}.{change.get('name')}")
+    return change
+
+
+def _row_changed(old: Dict, new: Dict) -> bool:
+    return any(old[k] != new[k] for k in ("id", "name", "location", "format", "updated_at"))
+
+
+def _register_view(spark, table) -> bool:
+    name = table['name']
+    location = table['location']
+    fmt = table['format'] or 'delta'
+    # Register as temp view
+    # We use CREATE OR REPLACE TEMP VIEW to update if exists
+    # Syntax: CREATE OR REPLACE TEMP VIEW name USING format LOCATION 'path'
+    try:
+        spark.sql(f"CREATE OR REPLACE TEMP VIEW {name} USING {fmt} LOCATION '{location}'")
+        logger.info(f"Registered table '{name}' at '{location}'")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to register table '{name}': {e}")
+        return False
+
+
+def _drop_view(spark, table):
+    try:
+        spark.catalog.dropTempView(table['name'])
+        logger.info(f"Dropped table '{table['name']}'")
+    except Exception as e:
+        logger.error(f"Failed to drop table '{table['name']}': {e}")
@@ -0,0 +1,267 @@
+"""
+Server-side result cursors for the query engine.
+A query is materialized once into a snapshot: kept in memory as an Arrow
+table when small, written to Parquet in object storage when large. Pages are
+then served from the snapshot without re-running the query. At most
+`max_cursors` cursors exist at once, and in-memory snapshots share a budget
+of `max_memory_bytes`: a result that does not fit it is spilled.
+"""
+
+import time
+import uuid
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+from pyspark.sql.pandas.types import to_arrow_schema
+
+logger = logging.getLogger(__name__)
+
+
+class CursorLimitReached(Exception):
+    """Too many open cursors; retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class ParquetSpill:
+    """Row-addressable index over the Parquet files of a spilled result"""
+    path: str
+    schema: pa.Schema
+    # (file path, row-group sizes) in query output order
+    files: List[Tuple[str, List[int]]]
+    # Absolute start row of every (file, row group), flattened
+    starts: List[int] = field(default_factory=list)
+    locations: List[Tuple[int, int]] = field(default_factory=list)
+
+    def __post_init__(self):
+        row = 0
+        for file_index, (_, row_groups) in enumerate(self.files):
+            for rg_index, num_rows in enumerate(row_groups):
+                self.starts.append(row)
+                self.locations.append((file_index, rg_index))
+                row += num_rows
+
+    @property
+    def num_rows(self) -> int:
+        return sum(sum(row_groups) for _, row_groups in self.files)
+
+
+@dataclass
+class ResultCursor:
+    id: str
+    owner_id: Optional[int]
+    query: str
+    schema: pa.Schema
+    total_rows: int
+    expires_at: float
+    table: Optional[pa.Table] = None
+    spill: Optional[ParquetSpill] = None
+
+    @property
+    def storage(self) -> str:
+        return "memory" if self.table is not None else "parquet"
+
+    def to_dict(self) -> Dict:
+        return {
+            "cursor_id": self.id,
+            "columns": self.schema.names,
+            "total_rows": self.total_rows,
+            "storage": self.storage,
+            "expires_at": self.expires_at,
+        }
+
+
+class CursorManager:
+    """
+    Creates, pages and expires result cursors.
+    Results with more than `memory_rows` rows, or that would take the
+    in-memory snapshots past `max_memory_bytes`, are spilled under
+    `spill_location` (an s3a:// URI) and read back with pyarrow.
+    """
+
+    def __init__(self, ttl: int, memory_rows: int, spill_location: str, filesystem: pafs.FileSystem,
+                 max_cursors: int = 1000, max_memory_bytes: int = 512 * 1024 * 1024):
+        self.ttl = ttl
+        self.memory_rows = memory_rows
+        self.spill_location = spill_location.rstrip("/")
+        self.filesystem = filesystem
+        self.max_cursors = max_cursors
+        self.max_memory_bytes = max_memory_bytes
+        self.rejected = 0
+        self._cursors: Dict[str, ResultCursor] = {}
+        # Cursors being materialized, counted against max_cursors
+        self._pending = 0
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reserved(self):
+        """
+        Hold one of the `max_cursors` slots while a cursor is materialized,
+        so the query is not run when no cursor could be kept.
+        CursorLimitReached if none is free.
+        """
+        with self._lock:
+            if len(self._cursors) + self._pending >= self.max_cursors:
+                self.rejected += 1
+                soonest = min((c.expires_at for c in self._cursors.values()), default=time.time())
+                raise CursorLimitReached(
+                    f"Too many open cursors (limit {self.max_cursors}); close unused cursors or retry later",
+                    max(1, min(int(soonest - time.time()) + 1, self.ttl)),
+                )
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def materialize(self, df, query: str, owner_id: Optional[int]) -> ResultCursor:
+        """Run `df` once and snapshot its full result into a new cursor"""
+        cursor_id = uuid.uuid4().hex
+        expires_at = time.time() + self.ttl
+
+        # Persisted so that the probe and the spill share one execution:
+        # partitions the probe computed are not run again by the write, and a
+        # non-deterministic query cannot spill rows the probe did not see
+        df = df.persist()
+        try:
+            # Probe one row past the threshold: small results never touch storage
+            batches = df.limit(self.memory_rows + 1)._collect_as_arrow()
+            if batches:
+                probe = pa.Table.from_batches(batches)
+            else:
+                probe = to_arrow_schema(df.schema).empty_table()
+
+            with self._lock:
+                in_memory = (probe.num_rows <= self.memory_rows
+                             and self._memory_bytes + probe.nbytes <= self.max_memory_bytes)
+                if in_memory:
+                    self._memory_bytes += probe.nbytes
+            if in_memory:
+                cursor = ResultCursor(cursor_id, owner_id, query, probe.schema,
+                                      probe.num_rows, expires_at, table=probe)
+            else:
+                path = f"{self.spill_location}/{cursor_id}"
+                logger.info(f"Spilling result for cursor {cursor_id} to {path}")
+                df.write.mode("overwrite").parquet(path)
+                spill = self._index_spill(path)
+                # Parquet may widen some types (e.g. INT96 timestamps); pages
+                # are served with the schema actually stored
+                cursor = ResultCursor(cursor_id, owner_id, query, spill.schema or probe.schema,
+                                      spill.num_rows, expires_at, spill=spill)
+        finally:
+            df.unpersist()
+
+        with self._lock:
+            self._cursors[cursor_id] = cursor
+        return cursor
+
+    def get(self, cursor_id: str) -> Optional[ResultCursor]:
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+        if cursor and cursor.expires_at < time.time():
+            self.close(cursor_id)
+            return None
+        return cursor
+
+    def page(self, cursor: ResultCursor, offset: int, limit: int) -> pa.Table:
+        """Rows [offset, offset + limit) of the snapshot"""
+        # Reading a page extends the cursor's lifetime
+        cursor.expires_at = time.time() + self.ttl
+        if cursor.table is not None:
+            return cursor.table.slice(offset, limit)
+        return self._read_spill(cursor, offset, limit)
+
+    def close(self, cursor_id: str) -> bool:
+        with self._lock:
+            cursor = self._cursors.pop(cursor_id, None)
+            if cursor is not None and cursor.table is not None:
+                self._memory_bytes -= cursor.table.nbytes
+        if cursor is None:
+            return False
+        if cursor.spill is not None:
+            try:
+                self.filesystem.delete_dir(_fs_path(cursor.spill.path))
+            except Exception as e:
+                logger.warning(f"Failed to delete spilled result {cursor.spill.path}: {e}")
+        return True
+
+    def expire(self) -> int:
+        """Close every cursor past its TTL; returns how many were closed"""
+        now = time.time()
+        with self._lock:
+            expired = [c.id for c in self._cursors.values() if c.expires_at < now]
+        for cursor_id in expired:
+            self.close(cursor_id)
+        return len(expired)
+
+    def close_all(self):
+        with self._lock:
+            cursor_ids = list(self._cursors)
+        for cursor_id in cursor_ids:
+            self.close(cursor_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cursors": len(self._cursors),
+                "max_cursors": self.max_cursors,
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "rejected": self.rejected,
+            }
+
+    def _index_spill(self, path: str) -> ParquetSpill:
+        selector = pafs.FileSelector(_fs_path(path), recursive=False)
+        # Spark names part files by partition index, so name order is output order
+        parts = sorted(
+            info.path for info in self.filesystem.get_file_info(selector)
+            if info.is_file and info.path.endswith(".parquet")
+        )
+        files = []
+        schema = None
+        for part in parts:
+            with self.filesystem.open_input_file(part) as f:
+                parquet_file = pq.ParquetFile(f)
+                metadata = parquet_file.metadata
+                schema = schema or parquet_file.schema_arrow
+            files.append((part, [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]))
+        return ParquetSpill(path, schema, files)
+
+    def _read_spill(self, cursor: ResultCursor, offset: int, limit: int) -> pa.Table:
+        spill = cursor.spill
+        if limit <= 0 or offset >= spill.num_rows:
+            return cursor.schema.empty_table()
+
+        # Only the row groups overlapping the requested range are read
+        first = bisect.bisect_right(spill.starts, offset) - 1
+        end = offset + limit
+        wanted: Dict[int, List[int]] = {}
+        index = first
+        while index < len(spill.starts) and spill.starts[index] < end:
+            file_index, rg_index = spill.locations[index]
+            wanted.setdefault(file_index, []).append(rg_index)
+            index += 1
+
+        tables = []
+        for file_index, row_groups in wanted.items():
+            with self.filesystem.open_input_file(spill.files[file_index][0]) as f:
+                tables.append(pq.ParquetFile(f).read_row_groups(row_groups))
+        table = pa.concat_tables(tables)
+        return table.slice(offset - spill.starts[first], limit)
+
+
+def _fs_path(uri: str) -> str:
+    """s3a://bucket/key -> bucket/key as pyarrow's S3FileSystem expects"""
+    return uri.split("://", 1)[-1]
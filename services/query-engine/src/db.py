@@ -0,0 +1,251 @@
+"""
+Bounded Postgres connection pool.
+Connections are reused instead of opened for every request: `close()` on a
+pooled connection hands it back. Connections that sat idle are checked
+before reuse, old ones are replaced, and callers wait at most
+`acquire_timeout` seconds for a free connection before PoolTimeout.
+
+A deliberate copy of services/storage/db.py (only this note
+differs): each service is built as an image from its own directory, so
+they cannot import one shared module. Change both together.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the acquire timeout"""
+
+
+class PooledConnection:
+    """
+    Proxy for a psycopg2 connection borrowed from a ConnectionPool.
+    `close()` returns it to the pool; as a context manager it commits (or
+    rolls back on error) and then returns it.
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name: str):
+        if self._conn is None:
+            raise extensions.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value: Any):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            # e.g. autocommit: must reach the real connection
+            setattr(self._conn, name, value)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._conn is not None and not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+
+    def __del__(self):
+        # Safety net for code paths that forget close(): the connection
+        # would otherwise count against the pool forever
+        if getattr(self, "_conn", None) is not None:
+            logger.warning("Pooled database connection was not closed; returning it to the pool")
+            self.close()
+
+
+class ConnectionPool:
+    """
+    At most `max_size` open connections from `connect()`. Idle connections
+    are reused most-recently-returned first; one idle for longer than
+    `check_after` seconds is pinged before reuse, and one older than
+    `max_lifetime` seconds is replaced. `on_acquire(seconds)` is called with
+    the time every successful borrow took.
+    """
+
+    def __init__(self, connect: Callable, max_size: int, acquire_timeout: float,
+                 check_after: float = 30.0, max_lifetime: float = 1800.0,
+                 on_acquire: Optional[Callable[[float], None]] = None):
+        self.connect = connect
+        self.on_acquire = on_acquire
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+        # (connection, opened at, returned at)
+        self._idle: deque = deque()
+        self._opened_at: Dict[int, float] = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        # Counters and recent acquisition waits (seconds)
+        self._waits: deque = deque(maxlen=1000)
+        self.acquired = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    def connection(self) -> PooledConnection:
+        """Borrow a connection; raises PoolTimeout if none frees up in time"""
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        entry = None
+        with self._cond:
+            had_to_wait = False
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.acquire_timeout}s waiting for a database connection "
+                        f"({self.max_size} in use)"
+                    )
+                had_to_wait = True
+                self._cond.wait(remaining)
+            self.acquired += 1
+            if had_to_wait:
+                self.waited += 1
+            self._waits.append(time.monotonic() - started)
+
+        try:
+            conn = self._checked(entry) if entry else None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            # The slot reserved for this connection is free again
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        if self.on_acquire:
+            self.on_acquire(time.monotonic() - started)
+        return PooledConnection(self, conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._waits)
+            idle = len(self._idle)
+            size = self._size
+        return {
+            "max_size": self.max_size,
+            "open": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "timeouts": self.timeouts,
+            "created": self.created,
+            "discarded": self.discarded,
+            "acquire_wait_ms": {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                "p95": _percentile_ms(waits, 0.95),
+                "max": _percentile_ms(waits, 1.0),
+            },
+        }
+
+    def close_all(self):
+        """Close idle connections; borrowed ones are closed when returned"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self.max_size = 0
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def _open(self):
+        conn = self.connect()
+        self._opened_at[id(conn)] = time.monotonic()
+        self.created += 1
+        return conn
+
+    def _checked(self, entry):
+        """The idle connection if still usable, else None after closing it"""
+        conn, opened_at, returned_at = entry
+        now = time.monotonic()
+        usable = not conn.closed and now - opened_at < self.max_lifetime
+        if usable and now - returned_at >= self.check_after:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.fetchall()
+                conn.rollback()
+            except Exception as e:
+                logger.info(f"Discarding broken pooled connection: {e}")
+                usable = False
+        if usable:
+            return conn
+        self.discarded += 1
+        self._close(conn)
+        return None
+
+    def _release(self, conn):
+        reusable = not conn.closed
+        if reusable:
+            try:
+                # Leave no open transaction, session mode or pending
+                # notifications behind for the next borrower
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+                if conn.notifies:
+                    conn.notifies.clear()
+            except Exception as e:
+                logger.info(f"Discarding pooled connection that could not be reset: {e}")
+                reusable = False
+        with self._cond:
+            if reusable and self._size <= self.max_size:
+                self._idle.append((conn, self._opened_at.get(id(conn), time.monotonic()), time.monotonic()))
+            else:
+                self._size -= 1
+                reusable = False
+            self._cond.notify()
+        if not reusable:
+            self.discarded += 1
+            self._close(conn)
+
+    def _close(self, conn):
+        self._opened_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _percentile_ms(sorted_seconds: List[float], fraction: float) -> float:
+    if not sorted_seconds:
+        return 0.0
+    index = min(int(len(sorted_seconds) * fraction), len(sorted_seconds) - 1)
+    return round(sorted_seconds[index] * 1000, 2)
@@ -0,0 +1,608 @@
+"""
+Fast path for simple single-table queries.
+`SELECT * | col, ... FROM table [WHERE pred AND ...] [LIMIT n]` over a Delta or
+Parquet catalog table is answered in-process with pyarrow, straight from
+object storage and without scheduling a Spark job:
+- files are pruned with Delta partition values and per-file column stats
+- row groups are pruned with Parquet statistics by the pyarrow scanner
+- only the selected columns are read, and reading stops at the row limit
+Anything the planner does not recognise is left to Spark.
+"""
+
+import re
+import json
+import logging
+import operator
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+
+logger = logging.getLogger(__name__)
+
+FAST_PATH_ENGINE = "fastpath"
+SPARK_ENGINE = "spark"
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|'')*')
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*|`(?:[^`]|``)*`)
+  | (?P<op><=|>=|<>|!=|==|=|<|>)
+  | (?P<punct>[,*;])
+  | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_COMPARISONS = {
+    "=": operator.eq, "==": operator.eq, "!=": operator.ne, "<>": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+_RESERVED = {"select", "from", "where", "and", "or", "not", "is", "null", "limit",
+             "as", "distinct", "order", "group", "by", "having", "join", "union"}
+
+# Delta primitive type names -> Arrow types; anything else is left to Spark
+_DELTA_TYPES = {
+    "string": pa.string(), "long": pa.int64(), "integer": pa.int32(),
+    "short": pa.int16(), "byte": pa.int8(), "float": pa.float32(),
+    "double": pa.float64(), "boolean": pa.bool_(), "date": pa.date32(),
+    "timestamp": pa.timestamp("us", tz="UTC"), "timestamp_ntz": pa.timestamp("us"),
+    "binary": pa.binary(),
+}
+_DECIMAL_RE = re.compile(r"decimal\((\d+),\s*(\d+)\)")
+
+_COMMIT_RE = re.compile(r"^(\d{20})\.json$")
+_CHECKPOINT_RE = re.compile(r"^(\d{20})\.checkpoint(?:\.(\d{10})\.(\d{10}))?\.parquet$")
+
+
+@dataclass
+class Predicate:
+    column: str
+    # One of _COMPARISONS, "is_null" or "not_null"
+    op: str
+    value: Any = None
+
+
+@dataclass
+class SimpleScan:
+    table: str
+    # None for SELECT *
+    columns: Optional[List[str]]
+    predicates: List[Predicate]
+    limit: Optional[int]
+
+
+@dataclass
+class DataFile:
+    path: str
+    size: int
+    partition_values: Dict[str, Optional[str]] = field(default_factory=dict)
+    # Delta per-file stats (numRecords, minValues, maxValues, nullCount)
+    stats: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class TableSnapshot:
+    version: Optional[int]
+    # Arrow types for every column; None where the type is not supported here
+    columns: Dict[str, Optional[pa.DataType]]
+    partition_columns: List[str]
+    files: List[DataFile]
+    # Newest complete checkpoint in the log, if any
+    checkpoint_version: Optional[int] = None
+
+
+def parse_simple_scan(query: str) -> Optional[SimpleScan]:
+    """Recognise a simple single-table scan; None for anything else"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        if kind == "other":
+            return None
+        tokens.append((kind, match.group()))
+    while tokens and tokens[-1] == ("punct", ";"):
+        tokens.pop()
+
+    pos = 0
+
+    def peek_word() -> Optional[str]:
+        if pos < len(tokens) and tokens[pos][0] == "ident" and not tokens[pos][1].startswith("`"):
+            return tokens[pos][1].lower()
+        return None
+
+    def identifier() -> Optional[str]:
+        nonlocal pos
+        if pos >= len(tokens) or tokens[pos][0] != "ident":
+            return None
+        text = tokens[pos][1]
+        if text.startswith("`"):
+            name = text[1:-1].replace("``", "`")
+        elif text.lower() in _RESERVED:
+            return None
+        else:
+            name = text
+        pos += 1
+        return name.lower()
+
+    if peek_word() != "select":
+        return None
+    pos += 1
+
+    columns: Optional[List[str]] = []
+    if pos < len(tokens) and tokens[pos] == ("punct", "*"):
+        columns = None
+        pos += 1
+    else:
+        while True:
+            name = identifier()
+            if name is None:
+                return None
+            columns.append(name)
+            if pos < len(tokens) and tokens[pos] == ("punct", ","):
+                pos += 1
+                continue
+            break
+
+    if peek_word() != "from":
+        return None
+    pos += 1
+    table = identifier()
+    if table is None:
+        return None
+
+    predicates = []
+    if peek_word() == "where":
+        pos += 1
+        while True:
+            column = identifier()
+            if column is None:
+                return None
+            if peek_word() == "is":
+                pos += 1
+                negated = peek_word() == "not"
+                if negated:
+                    pos += 1
+                if peek_word() != "null":
+                    return None
+                pos += 1
+                predicates.append(Predicate(column, "not_null" if negated else "is_null"))
+            else:
+                if pos + 1 >= len(tokens) or tokens[pos][0] != "op":
+                    return None
+                op = tokens[pos][1]
+                literal = _literal(tokens[pos + 1])
+                if literal is _NOT_A_LITERAL:
+                    return None
+                pos += 2
+                if literal is None:
+                    # col = NULL is never true; leave that subtlety to Spark
+                    return None
+                predicates.append(Predicate(column, op, literal))
+            if peek_word() == "and":
+                pos += 1
+                continue
+            break
+
+    limit = None
+    if peek_word() == "limit":
+        pos += 1
+        if pos >= len(tokens) or tokens[pos][0] != "number" or not tokens[pos][1].isdigit():
+            return None
+        limit = int(tokens[pos][1])
+        pos += 1
+
+    if pos != len(tokens):
+        return None
+    return SimpleScan(table, columns, predicates, limit)
+
+
+_NOT_A_LITERAL = object()
+
+
+def _literal(token: Tuple[str, str]) -> Any:
+    kind, text = token
+    if kind == "string":
+        if "''" in text[1:-1]:
+            # Spark concatenates adjacent literals ('it''s' is 'its'); a
+            # doubled quote is not an escape there, so leave it to Spark
+            return _NOT_A_LITERAL
+        return text[1:-1]
+    if kind == "number":
+        return float(text) if any(c in text for c in ".eE") else int(text)
+    if kind == "ident":
+        word = text.lower()
+        if word in ("true", "false"):
+            return word == "true"
+        if word == "null":
+            return None
+    return _NOT_A_LITERAL
+
+
+def _arrow_type(delta_type) -> Optional[pa.DataType]:
+    if not isinstance(delta_type, str):
+        # struct/array/map
+        return None
+    match = _DECIMAL_RE.fullmatch(delta_type)
+    if match:
+        return pa.decimal128(int(match.group(1)), int(match.group(2)))
+    return _DELTA_TYPES.get(delta_type)
+
+
+def coerce_value(value: Any, arrow_type: pa.DataType) -> pa.Scalar:
+    """Literal as a scalar of the column's type; raises if it does not convert"""
+    if pa.types.is_timestamp(arrow_type) and arrow_type.tz and isinstance(value, str):
+        # Naive literals are read as UTC
+        return pa.array([value]).cast(pa.timestamp(arrow_type.unit)).cast(arrow_type)[0]
+    return pa.array([value]).cast(arrow_type)[0]
+
+
+def _fs_path(uri: str) -> str:
+    """s3a://bucket/key -> bucket/key as pyarrow's S3FileSystem expects"""
+    return uri.split("://", 1)[-1].rstrip("/")
+
+
+class _DeltaState:
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.files: Dict[str, Dict] = {}
+        self.metadata: Optional[Dict] = None
+        self.protocol: Optional[Dict] = None
+
+    def apply(self, action: Dict):
+        if action.get("add"):
+            add = action["add"]
+            self.files[add["path"]] = add
+        elif action.get("remove"):
+            self.files.pop(action["remove"]["path"], None)
+        elif action.get("metaData"):
+            self.metadata = action["metaData"]
+        elif action.get("protocol"):
+            self.protocol = action["protocol"]
+
+
+class DeltaLogReader:
+    """
+    Reconstructs the active file set of Delta tables from their _delta_log.
+    Snapshots are cached per table and rolled forward with new commits only.
+    """
+
+    def __init__(self, filesystem: pafs.FileSystem):
+        self.filesystem = filesystem
+        self._states: Dict[str, _DeltaState] = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self, location: str) -> Optional[TableSnapshot]:
+        """Current snapshot, or None if the table uses unsupported features"""
+        root = _fs_path(location)
+        commits, checkpoints = self._list_log(f"{root}/_delta_log")
+        latest = _latest_version(location, commits, checkpoints)
+
+        # Held while rolling forward and listing files: the cached state is
+        # shared between queries
+        with self._lock:
+            return self._snapshot(location, root, commits, checkpoints, latest)
+
+    def version(self, location: str) -> int:
+        """
+        Latest committed version, from a listing of the log alone. Unlike
+        `snapshot` it works for tables with any reader features.
+        """
+        commits, checkpoints = self._list_log(f"{_fs_path(location)}/_delta_log")
+        return _latest_version(location, commits, checkpoints)
+
+    def _snapshot(self, location, root, commits, checkpoints, latest) -> Optional[TableSnapshot]:
+        state = self._states.get(root)
+        if state is not None and state.version is not None and any(
+                v not in commits for v in range(state.version + 1, latest + 1)):
+            # Log cleanup removed commits that a newer checkpoint covers
+            state = None
+        if state is None or state.version is None or state.version > latest:
+            state = _DeltaState()
+            complete = [v for v, parts in checkpoints.items() if parts]
+            if complete:
+                start = max(complete)
+                self._read_checkpoint(state, checkpoints[start])
+                state.version = start
+
+        first = -1 if state.version is None else state.version
+        for version in range(first + 1, latest + 1):
+            if version not in commits:
+                raise FileNotFoundError(f"Delta log for {location} is missing version {version}")
+            self._read_commit(state, commits[version])
+            state.version = version
+        self._states[root] = state
+
+        protocol = state.protocol or {}
+        if protocol.get("minReaderVersion", 1) > 1 or state.metadata is None:
+            # Column mapping, deletion vectors, ...: Spark only
+            return None
+
+        schema = json.loads(state.metadata["schemaString"])
+        columns = {f["name"]: _arrow_type(f["type"]) for f in schema["fields"]}
+        files = []
+        for add in state.files.values():
+            path = unquote(add["path"])
+            if "://" in path:
+                path = _fs_path(path)
+            else:
+                path = f"{root}/{path}"
+            stats = json.loads(add["stats"]) if add.get("stats") else None
+            files.append(DataFile(path, add.get("size") or 0,
+                                  _as_dict(add.get("partitionValues")), stats))
+        complete = [v for v, parts in checkpoints.items() if parts]
+        return TableSnapshot(state.version, columns, list(state.metadata.get("partitionColumns") or []), files,
+                             max(complete) if complete else None)
+
+    def _list_log(self, log_dir: str):
+        commits: Dict[int, str] = {}
+        # version -> part paths, empty while a multi-part checkpoint is incomplete
+        checkpoints: Dict[int, List[str]] = {}
+        expected: Dict[int, int] = {}
+        for info in self.filesystem.get_file_info(pafs.FileSelector(log_dir, allow_not_found=True)):
+            name = info.base_name
+            match = _COMMIT_RE.match(name)
+            if match:
+                commits[int(match.group(1))] = info.path
+                continue
+            match = _CHECKPOINT_RE.match(name)
+            if match:
+                version = int(match.group(1))
+                checkpoints.setdefault(version, []).append(info.path)
+                expected[version] = int(match.group(3) or 1)
+        for version, parts in checkpoints.items():
+            if len(parts) != expected[version]:
+                checkpoints[version] = []
+        return commits, checkpoints
+
+    def _read_checkpoint(self, state: _DeltaState, parts: List[str]):
+        for part in sorted(parts):
+            with self.filesystem.open_input_file(part) as f:
+                table = pq.read_table(f, columns=["add", "remove", "metaData", "protocol"])
+            for action in table.to_pylist():
+                state.apply(action)
+
+    def _read_commit(self, state: _DeltaState, path: str):
+        with self.filesystem.open_input_stream(path) as f:
+            for line in f.read().decode("utf-8").splitlines():
+                if line.strip():
+                    state.apply(json.loads(line))
+
+
+def _latest_version(location: str, commits: Dict[int, str], checkpoints: Dict[int, List[str]]) -> int:
+    if not commits and not checkpoints:
+        raise FileNotFoundError(f"No Delta log under {location}")
+    return max(list(commits) + list(checkpoints))
+
+
+def _as_dict(values) -> Dict[str, Optional[str]]:
+    # Checkpoint maps come back from Arrow as lists of (key, value) pairs
+    if values is None:
+        return {}
+    return dict(values)
+
+
+class FastPathExecutor:
+    """
+    Runs eligible queries with pyarrow. `max_bytes` caps the data files a
+    filtered query may have to scan after pruning; above it Spark's
+    parallelism wins.
+    """
+
+    def __init__(self, filesystem: pafs.FileSystem, max_bytes: int):
+        self.filesystem = filesystem
+        self.max_bytes = max_bytes
+        self.delta_log = DeltaLogReader(filesystem)
+
+    def execute(self, query: str, tables: Dict[str, Dict[str, str]],
+                row_limit: int, profile=None) -> Optional[Tuple[pa.Table, bool]]:
+        """
+        (table, truncated) with at most `row_limit` rows, or None if the
+        query is not a simple scan this engine can serve.
+        """
+        scan = parse_simple_scan(query)
+        if scan is None or scan.table not in tables:
+            return None
+        table = tables[scan.table]
+        if table["format"] == "delta":
+            snapshot = self.delta_log.snapshot(table["location"])
+        elif table["format"] == "parquet":
+            snapshot = self._parquet_snapshot(table["location"])
+        else:
+            return None
+        if snapshot is None:
+            return None
+
+        # Spark resolves column names case-insensitively
+        by_lower: Dict[str, str] = {}
+        for name in snapshot.columns:
+            if name.lower() in by_lower:
+                return None
+            by_lower[name.lower()] = name
+
+        wanted = list(snapshot.columns) if scan.columns is None else scan.columns
+        if any(c.lower() not in by_lower for c in wanted):
+            # Let Spark produce the error message
+            return None
+        selected = [by_lower[c.lower()] for c in wanted]
+        if len(set(selected)) != len(selected):
+            return None
+        schema = pa.schema([(name, snapshot.columns[name]) for name in selected])
+        if any(f.type is None for f in schema):
+            return None
+
+        predicates = []
+        for pred in scan.predicates:
+            column = by_lower.get(pred.column)
+            if column is None or snapshot.columns[column] is None:
+                return None
+            value = None
+            if pred.op in _COMPARISONS:
+                try:
+                    value = coerce_value(pred.value, snapshot.columns[column])
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                    return None
+            predicates.append(Predicate(column, pred.op, value))
+
+        partition_preds = [p for p in predicates if p.column in snapshot.partition_columns]
+        data_preds = [p for p in predicates if p.column not in snapshot.partition_columns]
+        candidates = [
+            f for f in snapshot.files
+            if self._partition_matches(f, partition_preds, snapshot)
+            and _stats_may_match(f.stats, data_preds, snapshot.columns)
+        ]
+        if data_preds and sum(f.size for f in candidates) > self.max_bytes:
+            return None
+
+        fetch = row_limit + 1 if scan.limit is None else min(scan.limit, row_limit + 1)
+        tables_read = []
+        rows = files_read = bytes_read = 0
+        for data_file in candidates:
+            if rows >= fetch:
+                break
+            part = self._read_file(data_file, schema, snapshot, data_preds, fetch - rows)
+            files_read += 1
+            bytes_read += data_file.size
+            if part.num_rows:
+                tables_read.append(part)
+                rows += part.num_rows
+
+        result = pa.concat_tables(tables_read) if tables_read else schema.empty_table()
+        if profile is not None:
+            profile.rows_read = result.num_rows
+            profile.bytes_read = bytes_read
+            profile.files_read = files_read
+            profile.files_pruned = len(snapshot.files) - len(candidates)
+
+        truncated = result.num_rows > row_limit
+        if truncated:
+            result = result.slice(0, row_limit)
+        return result, truncated
+
+    def _parquet_snapshot(self, location: str) -> Optional[TableSnapshot]:
+        root = _fs_path(location)
+        files = []
+        for info in self.filesystem.get_file_info(pafs.FileSelector(root)):
+            if info.base_name.startswith(("_", ".")):
+                continue
+            if info.type == pafs.FileType.Directory:
+                # Hive-style partition directories: Spark only
+                return None
+            if info.base_name.endswith(".parquet"):
+                files.append(DataFile(info.path, info.size or 0))
+        if not files:
+            return None
+        with self.filesystem.open_input_file(files[0].path) as f:
+            arrow_schema = pq.read_schema(f)
+        columns = {
+            f.name: (None if pa.types.is_nested(f.type) else f.type)
+            for f in arrow_schema
+        }
+        return TableSnapshot(None, columns, [], files)
+
+    def _partition_matches(self, data_file: DataFile, predicates: List[Predicate],
+                           snapshot: TableSnapshot) -> bool:
+        for pred in predicates:
+            raw = data_file.partition_values.get(pred.column)
+            if pred.op == "is_null":
+                if raw is not None:
+                    return False
+                continue
+            if raw is None:
+                # NULL fails every comparison and IS NOT NULL
+                return False
+            if pred.op == "not_null":
+                continue
+            value = coerce_value(raw, snapshot.columns[pred.column]).as_py()
+            if not _COMPARISONS[pred.op](value, pred.value.as_py()):
+                return False
+        return True
+
+    def _read_file(self, data_file: DataFile, schema: pa.Schema, snapshot: TableSnapshot,
+                   predicates: List[Predicate], limit: int) -> pa.Table:
+        dataset = ds.dataset(data_file.path, format="parquet", filesystem=self.filesystem)
+        present = set(dataset.schema.names)
+
+        row_filter = None
+        for pred in predicates:
+            if pred.column not in present:
+                # Column added after this file was written: all NULL here
+                if pred.op == "is_null":
+                    continue
+                return schema.empty_table()
+            expression = _expression(pred)
+            row_filter = expression if row_filter is None else row_filter & expression
+
+        read = [f.name for f in schema if f.name in present and f.name not in snapshot.partition_columns]
+        part = dataset.scanner(columns=read, filter=row_filter).head(limit)
+
+        arrays = []
+        for f in schema:
+            if f.name in snapshot.partition_columns:
+                raw = data_file.partition_values.get(f.name)
+                value = None if raw is None else coerce_value(raw, f.type).as_py()
+                arrays.append(pa.array([value] * part.num_rows, type=f.type))
+            elif f.name in present:
+                column = part.column(f.name)
+                # INT96 timestamps come back as ns; Spark reports us
+                arrays.append(column.cast(f.type, safe=not pa.types.is_timestamp(f.type)))
+            else:
+                arrays.append(pa.nulls(part.num_rows, type=f.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _expression(pred: Predicate) -> ds.Expression:
+    column = ds.field(pred.column)
+    if pred.op == "is_null":
+        return column.is_null()
+    if pred.op == "not_null":
+        return column.is_valid()
+    return _COMPARISONS[pred.op](column, pred.value)
+
+
+def _stats_may_match(stats: Optional[Dict[str, Any]], predicates: List[Predicate],
+                     columns: Dict[str, Optional[pa.DataType]]) -> bool:
+    """False only when the file's stats prove no row can satisfy every predicate"""
+    if not stats:
+        return True
+    num_records = stats.get("numRecords")
+    for pred in predicates:
+        null_count = (stats.get("nullCount") or {}).get(pred.column)
+        if pred.op == "is_null":
+            if null_count == 0:
+                return False
+            continue
+        if pred.op == "not_null":
+            if null_count is not None and null_count == num_records:
+                return False
+            continue
+        arrow_type = columns[pred.column]
+        # Only numeric and string stats compare reliably with Python values
+        if not (pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+                or pa.types.is_string(arrow_type)):
+            continue
+        low = (stats.get("minValues") or {}).get(pred.column)
+        high = (stats.get("maxValues") or {}).get(pred.column)
+        if low is None or high is None:
+            continue
+        value = pred.value.as_py()
+        if pred.op in ("=", "==") and (value < low or value > high):
+            return False
+        if pred.op == "<" and low >= value:
+            return False
+        if pred.op == "<=" and low > value:
+            return False
+        if pred.op == ">" and high <= value:
+            return False
+        if pred.op == ">=" and high < value:
+            return False
+    return True
@@ -0,0 +1,220 @@
+"""
+CSV / JSON ingestion into catalog Delta tables.
+The schema is inferred from the first `sample_rows` lines of the source; the
+conversion is then a single Spark write with that schema, so the input is
+read split by split and never held in memory as a whole. Output files are
+kept near a target size through maxRecordsPerFile, estimated from the
+sample. The table is registered in 'data_tables' with its schema.
+"""
+
+import re
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import Json
+from pyarrow import fs as pafs
+from pyspark.sql.types import (
+    ArrayType,
+    DataType,
+    DoubleType,
+    FloatType,
+    IntegerType,
+    LongType,
+    MapType,
+    ShortType,
+    StructField,
+    StructType,
+)
+
+logger = logging.getLogger(__name__)
+
+CSV = "csv"
+JSON = "json"
+FORMATS = (CSV, JSON)
+
+# Spark save modes: fail if the table exists, add to it, or replace it
+MODES = ("error", "append", "overwrite")
+
+# Snappy Parquet is typically several times smaller than the text it came
+# from; used to turn the sampled bytes per line into records per file
+TEXT_TO_PARQUET_RATIO = 4
+MIN_RECORDS_PER_FILE = 10_000
+
+TABLE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_EXTENSIONS = {".csv": CSV, ".tsv": CSV, ".txt": CSV, ".json": JSON, ".jsonl": JSON, ".ndjson": JSON}
+
+
+class IngestError(Exception):
+    """The source cannot be ingested as requested"""
+
+
+@dataclass
+class IngestSpec:
+    # s3a:// URI of a file or a directory of files
+    source: str
+    format: str
+    database: str
+    table: str
+    location: str
+    owner_id: Optional[int]
+    mode: str = "error"
+    partition_by: List[str] = field(default_factory=list)
+    target_file_bytes: int = 128 * 1024 * 1024
+    sample_rows: int = 10_000
+    header: bool = True
+    delimiter: str = ","
+
+
+def detect_format(path: str) -> Optional[str]:
+    """csv or json from the file extension (ignoring .gz / .bz2), else None"""
+    name = path.rstrip("/").rsplit("/", 1)[-1].lower()
+    for suffix in (".gz", ".bz2"):
+        name = name.removesuffix(suffix)
+    dot = name.rfind(".")
+    return _EXTENSIONS.get(name[dot:]) if dot >= 0 else None
+
+
+def infer_schema(spark, spec: IngestSpec) -> Tuple[StructType, float]:
+    """
+    Schema and average line size (bytes) of the first lines of the source.
+    Numeric types are widened so values past the sample still fit.
+    """
+    wanted = spec.sample_rows + (1 if spec.format == CSV and spec.header else 0)
+    lines = [row.value for row in spark.read.text(spec.source).limit(wanted).collect()]
+    if not lines:
+        raise IngestError(f"{spec.source} is empty")
+    sample = spark.sparkContext.parallelize(lines)
+    if spec.format == CSV:
+        df = spark.read.csv(sample, header=spec.header, sep=spec.delimiter, inferSchema=True)
+    else:
+        df = spark.read.json(sample)
+    schema = _widen(df.schema)
+    if "_corrupt_record" in schema.fieldNames():
+        raise IngestError("The sample contains lines that are not valid JSON objects (one per line expected)")
+    avg_line_bytes = sum(len(line.encode()) + 1 for line in lines) / len(lines)
+    return schema, avg_line_bytes
+
+
+def records_per_file(target_file_bytes: int, avg_line_bytes: float) -> int:
+    return max(MIN_RECORDS_PER_FILE, int(target_file_bytes * TEXT_TO_PARQUET_RATIO / max(avg_line_bytes, 1)))
+
+
+def source_bytes(filesystem: pafs.FileSystem, source: str) -> int:
+    """Size of the source file, or of all files under a directory"""
+    path = _fs_path(source)
+    info = filesystem.get_file_info(path)
+    if info.type == pafs.FileType.File:
+        return info.size
+    if info.type == pafs.FileType.NotFound:
+        raise IngestError(f"{source} does not exist")
+    selector = pafs.FileSelector(path, recursive=True)
+    return sum(f.size for f in filesystem.get_file_info(selector) if f.type == pafs.FileType.File)
+
+
+def write_delta(spark, spec: IngestSpec, schema: StructType, max_records: int):
+    """Convert the whole source with `schema` into the Delta table at spec.location"""
+    missing = [c for c in spec.partition_by if c not in schema.fieldNames()]
+    if missing:
+        raise IngestError(f"Partition columns not in the inferred schema: {', '.join(missing)}")
+
+    reader = spark.read.schema(schema).option("mode", "FAILFAST")
+    if spec.format == CSV:
+        df = reader.csv(spec.source, header=spec.header, sep=spec.delimiter)
+    else:
+        df = reader.json(spec.source)
+    if spec.partition_by:
+        # One task per partition value, so each partition gets a few large
+        # files instead of one small file from every input split
+        df = df.repartition(*spec.partition_by)
+
+    writer = df.write.format("delta").mode(spec.mode).option("maxRecordsPerFile", max_records)
+    if spec.partition_by:
+        writer = writer.partitionBy(*spec.partition_by)
+    if spec.mode == "overwrite":
+        writer = writer.option("overwriteSchema", "true")
+    writer.save(spec.location)
+
+
+def register_table(conn, spec: IngestSpec, schema: StructType) -> Dict[str, Any]:
+    """Insert the catalog row, or update the schema of the one being appended to / replaced"""
+    cur = conn.cursor()
+    if spec.mode == "error":
+        cur.execute(
+            """
+            INSERT INTO data_tables (name, database, format, location, schema_definition, owner_id)
+            VALUES (%s, %s, 'delta', %s, %s, %s)
+            RETURNING *
+            """,
+            (spec.table, spec.database, spec.location, Json(schema.jsonValue()), spec.owner_id)
+        )
+    else:
+        cur.execute(
+            """
+            INSERT INTO data_tables (name, database, format, location, schema_definition, owner_id)
+            VALUES (%s, %s, 'delta', %s, %s, %s)
+            ON CONFLICT (database, name) DO UPDATE SET schema_definition = EXCLUDED.schema_definition
+            RETURNING *
+            """,
+            (spec.table, spec.database, spec.location, Json(schema.jsonValue()), spec.owner_id)
+        )
+    table = cur.fetchone()
+    conn.commit()
+    return table
+
+
+def ingest(spark, spec: IngestSpec, filesystem: pafs.FileSystem, connect) -> Dict[str, Any]:
+    """Infer, convert and register; returns a report of what was written"""
+    started = time.perf_counter()
+    input_bytes = source_bytes(filesystem, spec.source)
+    schema, avg_line_bytes = infer_schema(spark, spec)
+    max_records = records_per_file(spec.target_file_bytes, avg_line_bytes)
+    logger.info(
+        f"Ingesting {spec.source} ({input_bytes} bytes) into {spec.database}.{spec.table} "
+        f"at {spec.location}, {max_records} records per file"
+    )
+    write_delta(spark, spec, schema, max_records)
+    elapsed = time.perf_counter() - started
+
+    conn = connect()
+    try:
+        table = register_table(conn, spec, schema)
+    finally:
+        conn.close()
+    return {
+        "table": table,
+        "source": spec.source,
+        "format": spec.format,
+        "mode": spec.mode,
+        "partition_by": spec.partition_by,
+        "schema": schema.jsonValue(),
+        "input_bytes": input_bytes,
+        "records_per_file": max_records,
+        "seconds": round(elapsed, 2),
+        "throughput_mb_s": round(input_bytes / elapsed / 1e6, 2) if elapsed else None,
+    }
+
+
+def _widen(schema: StructType) -> StructType:
+    return StructType([StructField(f.name, _widen_type(f.dataType), True) for f in schema.fields])
+
+
+def _widen_type(data_type: DataType) -> DataType:
+    if isinstance(data_type, (ShortType, IntegerType)):
+        return LongType()
+    if isinstance(data_type, FloatType):
+        return DoubleType()
+    if isinstance(data_type, StructType):
+        return _widen(data_type)
+    if isinstance(data_type, ArrayType):
+        return ArrayType(_widen_type(data_type.elementType), True)
+    if isinstance(data_type, MapType):
+        return MapType(data_type.keyType, _widen_type(data_type.valueType), True)
+    return data_type
+
+
+def _fs_path(uri: str) -> str:
+    """s3a://bucket/key -> bucket/key as pyarrow's S3FileSystem expects"""
+    return uri.split("://", 1)[-1].rstrip("/")
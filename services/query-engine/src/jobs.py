@@ -0,0 +1,359 @@
+"""
+Asynchronous query jobs for the query engine.
+Queries run on a bounded thread pool, each tagged with its own Spark job
+group so that cancelling a job actually kills its running stages, and with
+its owner's FAIR scheduler pool. Admission control caps how many queries
+each user may have running and waiting, and how deep the queue may get.
+"""
+
+import math
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class AdmissionRejected(Exception):
+    """The query was not queued; retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class QueryJob:
+    id: str
+    query: str
+    format: str
+    owner_id: Optional[int]
+    no_cache: bool = False
+    # Spark FAIR scheduler pool the job's stages are submitted to
+    pool: Optional[str] = None
+    cache_hit: bool = False
+    # Engine that produced the result: "spark", "fastpath" or "cache"
+    engine: Optional[str] = None
+    status: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result: Any = None
+    # Execution profile filled in by the runner (see profiling.QueryProfile)
+    profile: Any = None
+    future: Optional[Future] = None
+    # Context of the submitting request (request id), the job runs in it
+    context: Optional[contextvars.Context] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "query": self.query,
+            "format": self.format,
+            "cache_hit": self.cache_hit,
+            "engine": self.engine,
+            "pool": self.pool,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class QueryJobManager:
+    """
+    Tracks submitted queries and runs them on a fixed-size worker pool.
+    Finished jobs (and their results) are kept for `result_ttl` seconds.
+    `on_finish(job)` is called once for every job that reaches a final state.
+
+    Each owner has at most `max_running_per_user` jobs on the pool; further
+    jobs wait in a per-owner queue, up to `max_queued_per_user`. Submissions
+    past that, or past `max_queue_depth` waiting jobs overall, are rejected.
+    """
+
+    def __init__(self, max_workers: int, result_ttl: int,
+                 on_finish: Optional[Callable[[QueryJob], None]] = None,
+                 max_running_per_user: int = 0, max_queued_per_user: int = 0,
+                 max_queue_depth: int = 0):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-job")
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.on_finish = on_finish
+        # max_running_per_user=0 disables the per-owner limits,
+        # max_queue_depth=0 the global one
+        self.max_running_per_user = max_running_per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queue_depth = max_queue_depth
+        self._jobs: Dict[str, QueryJob] = {}
+        # Jobs handed to the pool (queued there or running), per owner
+        self._dispatched: Dict[Optional[int], int] = defaultdict(int)
+        # Jobs held back by the per-owner cap, with their runner
+        self._pending: Dict[Optional[int], deque] = defaultdict(deque)
+        self._lock = threading.Lock()
+        # Recent queue waits and run times (seconds) for stats and retry hints
+        self._waits: deque = deque(maxlen=1000)
+        self._runtimes: deque = deque(maxlen=100)
+        self.rejected = 0
+
+    def submit(self, query: str, fmt: str, owner_id: Optional[int],
+               get_spark: Callable, run: Callable, no_cache: bool = False,
+               pool: Optional[str] = None) -> QueryJob:
+        """
+        Queue `run(spark, job)` for execution. Its return value becomes the
+        job result. Raises AdmissionRejected when the owner or the whole
+        queue is at its limit.
+        """
+        self._expire()
+        job = QueryJob(id=uuid.uuid4().hex, query=query, format=fmt,
+                       owner_id=owner_id, no_cache=no_cache, pool=pool,
+                       context=contextvars.copy_context())
+        # Completed by _execute; cancelling it before then skips the job
+        job.future = Future()
+        with self._lock:
+            self._admit(owner_id)
+            self._jobs[job.id] = job
+            if self._can_dispatch(owner_id):
+                self._dispatch(job, get_spark, run)
+            else:
+                self._pending[owner_id].append((job, get_spark, run))
+        return job
+
+    def admission_stats(self) -> Dict[str, Any]:
+        """Queue depth, per-owner load and queue wait percentiles"""
+        with self._lock:
+            unfinished = [j for j in self._jobs.values() if j.status not in FINISHED_STATES]
+            waits = sorted(self._waits)
+            owners = defaultdict(lambda: {"running": 0, "queued": 0})
+            for job in unfinished:
+                owners[job.owner_id]["running" if job.status == RUNNING else "queued"] += 1
+        return {
+            "running": sum(1 for j in unfinished if j.status == RUNNING),
+            "queued": sum(1 for j in unfinished if j.status == QUEUED),
+            "rejected": self.rejected,
+            "limits": {
+                "workers": self.max_workers,
+                "max_running_per_user": self.max_running_per_user,
+                "max_queued_per_user": self.max_queued_per_user,
+                "max_queue_depth": self.max_queue_depth,
+            },
+            "users": {str(owner): load for owner, load in owners.items()},
+            "queue_wait_ms": {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "p50": _percentile_ms(waits, 0.50),
+                "p95": _percentile_ms(waits, 0.95),
+                "max": _percentile_ms(waits, 1.0),
+            },
+        }
+
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def list(self, owner_id: Optional[int] = None) -> List[QueryJob]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if owner_id is not None:
+            jobs = [j for j in jobs if j.owner_id == owner_id]
+        return sorted(jobs, key=lambda j: j.submitted_at, reverse=True)
+
+    def cancel(self, job_id: str, spark) -> Optional[QueryJob]:
+        """Cancel a queued or running job. Finished jobs are left untouched."""
+        job = self.get(job_id)
+        if not job or job.status in FINISHED_STATES:
+            return job
+
+        if job.future and job.future.cancel():
+            # Never started: drop it from the owner's queue (if still there);
+            # the pool skips it otherwise
+            with self._lock:
+                pending = self._pending.get(job.owner_id)
+                if pending:
+                    for entry in list(pending):
+                        if entry[0] is job:
+                            pending.remove(entry)
+            self._finish(job, CANCELLED)
+            return job
+
+        with self._lock:
+            job.status = CANCELLED
+        if spark is not None:
+            # Interrupts tasks of every Spark job started under this group
+            spark.sparkContext.cancelJobGroup(job.id)
+        return job
+
+    def progress(self, job: QueryJob, spark) -> Dict[str, Any]:
+        """Task-level progress of the job's Spark stages from the status tracker"""
+        if job.status != RUNNING or spark is None:
+            done = job.status == SUCCEEDED
+            return {"spark_jobs": 0, "total_tasks": 0, "completed_tasks": 0,
+                    "fraction": 1.0 if done else 0.0}
+
+        tracker = spark.sparkContext.statusTracker()
+        spark_jobs = tracker.getJobIdsForGroup(job.id)
+        total = completed = 0
+        for spark_job_id in spark_jobs:
+            info = tracker.getJobInfo(spark_job_id)
+            if not info:
+                continue
+            for stage_id in info.stageIds:
+                stage = tracker.getStageInfo(stage_id)
+                if stage:
+                    total += stage.numTasks
+                    completed += stage.numCompletedTasks
+        return {
+            "spark_jobs": len(spark_jobs),
+            "total_tasks": total,
+            "completed_tasks": completed,
+            "fraction": round(completed / total, 4) if total else 0.0,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _admit(self, owner_id: Optional[int]):
+        # Caller holds self._lock
+        if self.max_running_per_user:
+            in_flight = sum(
+                1 for j in self._jobs.values()
+                if j.owner_id == owner_id and j.status not in FINISHED_STATES
+            )
+            allowed = self.max_running_per_user + self.max_queued_per_user
+            if in_flight >= allowed:
+                self.rejected += 1
+                raise AdmissionRejected(
+                    f"Too many queries in flight for this user ({in_flight}, limit {allowed})",
+                    self._retry_after(in_flight - self.max_running_per_user + 1),
+                )
+        if self.max_queue_depth:
+            queued = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if queued >= self.max_queue_depth:
+                self.rejected += 1
+                raise AdmissionRejected(
+                    f"Query queue is full ({queued} waiting)",
+                    self._retry_after(queued - self.max_workers + 1),
+                )
+
+    def _retry_after(self, jobs_ahead: int) -> int:
+        """Seconds until roughly `jobs_ahead` jobs have drained, 1..60"""
+        runtime = sum(self._runtimes) / len(self._runtimes) if self._runtimes else 1.0
+        estimate = runtime * max(jobs_ahead, 1) / self.max_workers
+        return min(max(math.ceil(estimate), 1), 60)
+
+    def _can_dispatch(self, owner_id: Optional[int]) -> bool:
+        return not self.max_running_per_user or self._dispatched[owner_id] < self.max_running_per_user
+
+    def _dispatch(self, job: QueryJob, get_spark: Callable, run: Callable):
+        # Caller holds self._lock
+        self._dispatched[job.owner_id] += 1
+        self.executor.submit(job.context.run, self._execute, job, get_spark, run)
+
+    def _release(self, owner_id: Optional[int]):
+        """A dispatched job is done: hand the owner's slot to its next queued job"""
+        with self._lock:
+            self._dispatched[owner_id] -= 1
+            if self._dispatched[owner_id] <= 0:
+                del self._dispatched[owner_id]
+            pending = self._pending.get(owner_id)
+            while pending and self._can_dispatch(owner_id):
+                job, get_spark, run = pending.popleft()
+                if not job.future.cancelled():
+                    self._dispatch(job, get_spark, run)
+            if pending is not None and not pending:
+                del self._pending[owner_id]
+
+    def _execute(self, job: QueryJob, get_spark: Callable, run: Callable):
+        try:
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    self._run(job, get_spark, run)
+                finally:
+                    job.future.set_result(None)
+        finally:
+            self._release(job.owner_id)
+
+    def _run(self, job: QueryJob, get_spark: Callable, run: Callable):
+        with self._lock:
+            # Cancelled after the pool picked the job up, but before it ran
+            cancelled = job.status == CANCELLED
+            if not cancelled:
+                job.status = RUNNING
+        if cancelled:
+            self._finish(job, CANCELLED)
+            return
+        job.started_at = time.time()
+        self._waits.append(job.started_at - job.submitted_at)
+        try:
+            spark = get_spark()
+            sc = spark.sparkContext
+            # Job group and scheduler pool are thread-local properties; set
+            # them on every run since pool threads are reused across jobs.
+            sc.setJobGroup(job.id, job.query[:200], interruptOnCancel=True)
+            sc.setLocalProperty("spark.scheduler.pool", job.pool)
+            try:
+                # A cancel that landed before the group was set had nothing
+                # to cancel: it must not let the query run to completion
+                result = None if job.status == CANCELLED else run(spark, job)
+            finally:
+                sc.setLocalProperty("spark.jobGroup.id", None)
+                sc.setLocalProperty("spark.scheduler.pool", None)
+            if job.status == CANCELLED:
+                self._finish(job, CANCELLED)
+            else:
+                job.result = result
+                self._finish(job, SUCCEEDED)
+        except Exception as e:
+            if job.status == CANCELLED:
+                self._finish(job, CANCELLED)
+            else:
+                logger.error(f"Query job {job.id} failed: {e}")
+                job.error = str(e)
+                self._finish(job, FAILED)
+
+    def _finish(self, job: QueryJob, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        if job.started_at is not None:
+            self._runtimes.append(job.finished_at - job.started_at)
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"Finish hook failed for query job {job.id}: {e}")
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+def _percentile_ms(sorted_seconds: List[float], fraction: float) -> float:
+    if not sorted_seconds:
+        return 0.0
+    index = min(int(fraction * len(sorted_seconds)), len(sorted_seconds) - 1)
+    return round(sorted_seconds[index] * 1000, 1)
@@ -0,0 +1,427 @@
+"""
+Automatic maintenance of catalog Delta tables.
+Every cycle inspects each Delta table's active files through the Delta log
+(no Spark job) and runs whatever is due, one operation at a time:
+- OPTIMIZE when partitions have piled up small files, Z-ordered by the
+  columns that queries in 'query_history' filter on most
+- VACUUM once per interval with the configured retention
+- a log checkpoint when many commits were written since the last one
+Operations run in their own FAIR scheduler pool and are deferred while
+interactive queries are busy. Every run is recorded, with file counts before
+and after, in 'table_maintenance_runs'.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from psycopg2.extras import Json
+from pyarrow import fs as pafs
+from delta.tables import DeltaTable
+
+from .fastpath import DeltaLogReader, TableSnapshot
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZE = "optimize"
+VACUUM = "vacuum"
+CHECKPOINT = "checkpoint"
+# Execution order within one table: compaction commits a new version, which
+# the checkpoint then covers
+OPERATIONS = (OPTIMIZE, CHECKPOINT, VACUUM)
+
+# Declared in fairscheduler.xml
+MAINTENANCE_POOL = "maintenance"
+
+# Queries considered when picking Z-order columns
+ZORDER_HISTORY_DAYS = 7
+ZORDER_HISTORY_QUERIES = 1000
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_WHERE_RE = re.compile(
+    r"\bwhere\b(.*?)(?=\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|\bunion\b|\)|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+@dataclass
+class MaintenancePolicy:
+    # Files below this size count as small
+    small_file_bytes: int = 32 * 1024 * 1024
+    # Compact once this many small files share partitions with other small files
+    min_small_files: int = 50
+    vacuum_retention_hours: int = 168
+    vacuum_interval_hours: int = 24
+    # Commits since the last checkpoint before writing a new one
+    checkpoint_interval: int = 50
+    # 0 disables Z-ordering
+    zorder_max_columns: int = 2
+    # A column must be filtered on by at least this many recent queries
+    zorder_min_queries: int = 5
+
+
+@dataclass
+class TableLayout:
+    version: Optional[int]
+    file_count: int
+    total_bytes: int
+    small_files: int
+    # Small files in partitions holding more than one of them; OPTIMIZE
+    # leaves a partition's single small file alone
+    compactable_files: int
+    checkpoint_version: Optional[int]
+    # File size percentiles in bytes
+    file_size: Dict[str, int] = field(default_factory=dict)
+
+
+def inspect_layout(snapshot: TableSnapshot, small_file_bytes: int) -> TableLayout:
+    """File count and size distribution of a Delta snapshot"""
+    sizes = sorted(f.size for f in snapshot.files)
+    small_per_partition = Counter(
+        tuple(sorted(f.partition_values.items(), key=lambda kv: kv[0]))
+        for f in snapshot.files if f.size < small_file_bytes
+    )
+    return TableLayout(
+        version=snapshot.version,
+        file_count=len(sizes),
+        total_bytes=sum(sizes),
+        small_files=sum(small_per_partition.values()),
+        compactable_files=sum(n for n in small_per_partition.values() if n > 1),
+        checkpoint_version=snapshot.checkpoint_version,
+        file_size={
+            "min": sizes[0] if sizes else 0,
+            "p50": _percentile(sizes, 0.50),
+            "p90": _percentile(sizes, 0.90),
+            "max": sizes[-1] if sizes else 0,
+        },
+    )
+
+
+def _percentile(sorted_values: List[int], fraction: float) -> int:
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def filtered_columns(queries: Iterable[str], columns: Iterable[str]) -> Counter:
+    """
+    How many of `queries` mention each of `columns` in a WHERE clause.
+    A heuristic: identifiers are matched by name, whichever table they
+    belong to.
+    """
+    by_lower = {c.lower(): c for c in columns}
+    counts: Counter = Counter()
+    for query in queries:
+        text = _STRING_LITERAL_RE.sub("''", query)
+        seen = set()
+        for clause in _WHERE_RE.findall(text):
+            for identifier in _IDENTIFIER_RE.findall(clause):
+                column = by_lower.get(identifier.lower())
+                if column:
+                    seen.add(column)
+        counts.update(seen)
+    return counts
+
+
+def _fs_path(uri: str) -> str:
+    """s3a://bucket/key -> bucket/key as pyarrow's S3FileSystem expects"""
+    return uri.split("://", 1)[-1].rstrip("/")
+
+
+def _timestamp(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
+
+
+class MaintenanceScheduler(threading.Thread):
+    """
+    Runs a maintenance cycle over all Delta tables every `interval` seconds,
+    and on-demand runs queued with `request`. `get_spark()` returns the
+    session, or None while Spark is not ready; `is_busy()` tells whether
+    interactive queries should have the cluster to themselves.
+    """
+
+    def __init__(self, connect: Callable, delta_log: DeltaLogReader, get_spark: Callable,
+                 is_busy: Callable[[], bool], policy: MaintenancePolicy, interval: int,
+                 pause: int = 30, max_deferral: int = 600):
+        super().__init__(name="table-maintenance", daemon=True)
+        self.connect = connect
+        self.delta_log = delta_log
+        self.get_spark = get_spark
+        self.is_busy = is_busy
+        self.policy = policy
+        self.interval = interval
+        self.pause = pause
+        self.max_deferral = max_deferral
+        self._requests: deque = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def request(self, table: Dict, operations: Optional[List[str]] = None,
+                zorder_by: Optional[List[str]] = None):
+        """Queue a run for one table; planned operations if none are given"""
+        with self._lock:
+            self._requests.append((table, operations, zorder_by))
+        self._wake.set()
+
+    def pending(self) -> List[int]:
+        with self._lock:
+            return [table["id"] for table, _, _ in self._requests]
+
+    def plan(self, table: Dict, last_runs: Optional[Dict] = None) -> Dict[str, Any]:
+        """Current layout of a table and the operations that are due"""
+        if last_runs is None:
+            last_runs = self._last_runs(table["id"])
+        snapshot = self.delta_log.snapshot(table["location"])
+        operations = []
+        layout = None
+        zorder_by: List[str] = []
+        if snapshot is not None:
+            layout = inspect_layout(snapshot, self.policy.small_file_bytes)
+            if layout.compactable_files >= self.policy.min_small_files:
+                operations.append(OPTIMIZE)
+                zorder_by = self._zorder_columns(table, snapshot)
+            since_checkpoint = layout.version - (layout.checkpoint_version if layout.checkpoint_version is not None else -1)
+            if since_checkpoint >= self.policy.checkpoint_interval:
+                operations.append(CHECKPOINT)
+        last_vacuum = last_runs.get((table["id"], VACUUM))
+        due = datetime.now(timezone.utc) - timedelta(hours=self.policy.vacuum_interval_hours)
+        if last_vacuum is None or last_vacuum < due:
+            operations.append(VACUUM)
+        return {
+            "table_id": table["id"],
+            "name": table["name"],
+            # None when the table uses reader features the log reader skips
+            "layout": asdict(layout) if layout else None,
+            "operations": operations,
+            "zorder_by": zorder_by,
+        }
+
+    def runs(self, table_id: Optional[int], limit: int) -> List[Dict]:
+        """Most recent maintenance runs, optionally for one table"""
+        where = "WHERE table_id = %s" if table_id is not None else ""
+        params = (table_id, limit) if table_id is not None else (limit,)
+        return self._fetch(
+            f"SELECT * FROM table_maintenance_runs {where} ORDER BY started_at DESC LIMIT %s", params
+        )
+
+    def run(self):
+        next_cycle = time.monotonic() + self.interval
+        while not self._stop_event.is_set():
+            self._wake.wait(max(next_cycle - time.monotonic(), 0))
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self._run_requests()
+                if time.monotonic() >= next_cycle:
+                    self.run_cycle()
+                    next_cycle = time.monotonic() + self.interval
+            except Exception as e:
+                logger.error(f"Table maintenance failed: {e}")
+                next_cycle = time.monotonic() + self.interval
+
+    def run_cycle(self):
+        """Run every operation that is due, table by table"""
+        if self.get_spark() is None:
+            logger.info("Skipping table maintenance: Spark is not ready")
+            return
+        tables = self._fetch(
+            "SELECT id, name, location, format FROM data_tables WHERE COALESCE(format, 'delta') = 'delta'"
+        )
+        last_runs = self._last_runs()
+        for table in tables:
+            if self._stop_event.is_set():
+                return
+            try:
+                plan = self.plan(table, last_runs)
+            except Exception as e:
+                logger.warning(f"Could not inspect table '{table['name']}': {e}")
+                continue
+            for operation in plan["operations"]:
+                if not self._wait_until_idle():
+                    logger.info("Interactive load stayed high; deferring remaining maintenance to the next cycle")
+                    return
+                self._execute(table, operation, plan["zorder_by"])
+            # Operations on-demand jump ahead of the rest of the cycle
+            self._run_requests()
+
+    def _run_requests(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                if not self._requests:
+                    return
+                table, operations, zorder_by = self._requests.popleft()
+            if operations is None:
+                plan = self.plan(table)
+                operations = plan["operations"]
+                if zorder_by is None:
+                    zorder_by = plan["zorder_by"]
+            for operation in sorted(operations, key=OPERATIONS.index):
+                if not self._wait_until_idle():
+                    logger.info(f"Interactive load stayed high; maintenance of '{table['name']}' re-queued")
+                    self.request(table, operations, zorder_by)
+                    return
+                self._execute(table, operation, zorder_by or [])
+
+    def _wait_until_idle(self) -> bool:
+        """Wait (at most `max_deferral` seconds) until interactive queries calm down"""
+        deadline = time.monotonic() + self.max_deferral
+        while self.is_busy():
+            if self._stop_event.is_set() or time.monotonic() >= deadline:
+                return False
+            self._stop_event.wait(self.pause)
+        return not self._stop_event.is_set()
+
+    def _zorder_columns(self, table: Dict, snapshot: TableSnapshot) -> List[str]:
+        if self.policy.zorder_max_columns <= 0:
+            return []
+        # Z-ordering needs per-file stats and cannot use partition columns
+        with_stats = set()
+        for data_file in snapshot.files:
+            with_stats.update((data_file.stats or {}).get("minValues") or {})
+        candidates = [c for c in snapshot.columns if c in with_stats and c not in snapshot.partition_columns]
+        if not candidates:
+            return []
+        rows = self._fetch(
+            """
+            SELECT query_text FROM query_history
+            WHERE status = 'succeeded' AND submitted_at > NOW() - make_interval(days => %s)
+              AND query_text ILIKE %s
+            ORDER BY submitted_at DESC LIMIT %s
+            """,
+            (ZORDER_HISTORY_DAYS, f"%{table['name']}%", ZORDER_HISTORY_QUERIES)
+        )
+        counts = filtered_columns((row["query_text"] for row in rows), candidates)
+        return [
+            column for column, n in counts.most_common(self.policy.zorder_max_columns)
+            if n >= self.policy.zorder_min_queries
+        ]
+
+    def _execute(self, table: Dict, operation: str, zorder_by: List[str]):
+        spark = self.get_spark()
+        if spark is None:
+            return
+        before = self._measure(table, operation)
+        started = time.time()
+        status, error, details = "succeeded", None, {}
+        sc = spark.sparkContext
+        sc.setJobGroup(f"maintenance-{table['id']}-{operation}", f"{operation} {table['name']}",
+                       interruptOnCancel=True)
+        sc.setLocalProperty("spark.scheduler.pool", MAINTENANCE_POOL)
+        try:
+            details = self._run_operation(spark, table, operation, zorder_by)
+            logger.info(f"{operation} of '{table['name']}' finished in {time.time() - started:.1f}s: {details}")
+        except Exception as e:
+            status, error = "failed", str(e)
+            logger.error(f"{operation} of '{table['name']}' failed: {e}")
+        finally:
+            sc.setLocalProperty("spark.jobGroup.id", None)
+            sc.setLocalProperty("spark.scheduler.pool", None)
+        after = self._measure(table, operation)
+        self._record(table, operation, status, error, before, after, details, started, time.time())
+
+    def _run_operation(self, spark, table: Dict, operation: str, zorder_by: List[str]) -> Dict[str, Any]:
+        location = table["location"]
+        if operation == OPTIMIZE:
+            builder = DeltaTable.forPath(spark, location).optimize()
+            result = builder.executeZOrderBy(*zorder_by) if zorder_by else builder.executeCompaction()
+            row = result.select("metrics.numFilesAdded", "metrics.numFilesRemoved").first()
+            return {"zorder_by": zorder_by, "files_added": row[0], "files_removed": row[1]}
+        if operation == VACUUM:
+            DeltaTable.forPath(spark, location).vacuum(self.policy.vacuum_retention_hours)
+            return {"retention_hours": self.policy.vacuum_retention_hours}
+        if operation == CHECKPOINT:
+            delta_log = spark._jvm.org.apache.spark.sql.delta.DeltaLog.forTable(spark._jsparkSession, location)
+            delta_log.checkpoint()
+            return {}
+        raise ValueError(f"Unknown maintenance operation '{operation}'")
+
+    def _measure(self, table: Dict, operation: str) -> Dict[str, Optional[int]]:
+        """
+        Files and bytes of a table. VACUUM deletes files the snapshot no
+        longer references, so for it the data files in storage are counted;
+        otherwise the snapshot's active files.
+        """
+        try:
+            snapshot = self.delta_log.snapshot(table["location"])
+            measured = {"version": snapshot.version if snapshot else None, "files": None, "bytes": None}
+            if operation == VACUUM:
+                measured["files"], measured["bytes"] = self._stored_files(table["location"])
+            elif snapshot is not None:
+                measured["files"] = len(snapshot.files)
+                measured["bytes"] = sum(f.size for f in snapshot.files)
+            return measured
+        except Exception as e:
+            logger.warning(f"Could not measure table '{table['name']}': {e}")
+            return {"version": None, "files": None, "bytes": None}
+
+    def _stored_files(self, location: str):
+        root = _fs_path(location)
+        files = size = 0
+        selector = pafs.FileSelector(root, recursive=True, allow_not_found=True)
+        for info in self.delta_log.filesystem.get_file_info(selector):
+            relative = info.path[len(root):].lstrip("/")
+            if info.type != pafs.FileType.File or relative.startswith("_delta_log/"):
+                continue
+            if info.base_name.startswith((".", "_")):
+                continue
+            files += 1
+            size += info.size or 0
+        return files, size
+
+    def _last_runs(self, table_id: Optional[int] = None) -> Dict:
+        """(table_id, operation) -> finish time of the last successful run"""
+        where = "AND table_id = %s" if table_id is not None else ""
+        rows = self._fetch(
+            f"""
+            SELECT table_id, operation, MAX(finished_at) AS finished_at FROM table_maintenance_runs
+            WHERE status = 'succeeded' {where} GROUP BY table_id, operation
+            """,
+            (table_id,) if table_id is not None else ()
+        )
+        return {(row["table_id"], row["operation"]): row["finished_at"] for row in rows}
+
+    def _fetch(self, query: str, params: tuple = ()) -> List[Dict]:
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def _record(self, table: Dict, operation: str, status: str, error: Optional[str],
+                before: Dict, after: Dict, details: Dict, started: float, finished: float):
+        conn = None
+        try:
+            conn = self.connect()
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO table_maintenance_runs
+                    (table_id, operation, status, error_message, version_before, version_after,
+                     files_before, files_after, bytes_before, bytes_after, duration_ms, details,
+                     started_at, finished_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (table["id"], operation, status, error, before["version"], after["version"],
+                 before["files"], after["files"], before["bytes"], after["bytes"],
+                 int((finished - started) * 1000), Json(details), _timestamp(started), _timestamp(finished))
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to record {operation} of '{table['name']}': {e}")
+        finally:
+            if conn:
+                conn.close()
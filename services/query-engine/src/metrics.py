@@ -0,0 +1,242 @@
+"""
+Prometheus metrics and request tracing for the query engine.
+Every request is timed per route and tagged with the gateway's X-Request-Id
+(generated when missing), which is echoed back, added to log lines and
+carried into the query jobs it submits. Database connection waits and query
+runs are recorded as spans of that request: they are summarised in a
+Server-Timing header and logged for slow requests. Spark, job queue and
+pool state is read when /metrics is scraped, not on every call.
+
+Only the metric definitions and their observe_* helpers are specific to
+this service. The request context, spans, StatsCollector, log filter and
+MetricsMiddleware are kept identical on purpose to
+services/storage/metrics.py, since each service's image is built from
+its own directory. Change both together.
+"""
+
+import re
+import time
+import uuid
+import logging
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import REGISTRY, Collector
+
+logger = logging.getLogger(__name__)
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# (name, seconds) for the current request
+_spans_var: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("spans", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 16 * 1024, 128 * 1024, 1024 ** 2, 16 * 1024 ** 2, 128 * 1024 ** 2, 1024 ** 3)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "HTTP response body size", ["method", "route"], buckets=SIZE_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served")
+DB_ACQUIRE_SECONDS = Histogram(
+    "db_pool_acquire_seconds", "Wait for a pooled database connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+QUERY_SECONDS = Histogram(
+    "query_duration_seconds", "Query job run time (excluding queueing)", ["engine", "status"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+QUERY_QUEUE_SECONDS = Histogram(
+    "query_queue_wait_seconds", "Time query jobs waited for a worker",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+QUERY_ROWS = Counter("query_result_rows_total", "Rows returned in query results", ["engine", "format"])
+QUERY_RESULT_BYTES = Counter(
+    "query_result_bytes_total", "Arrow bytes of query results returned", ["engine", "format"],
+)
+
+
+def record_span(name: str, seconds: float):
+    spans = _spans_var.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def observe_db_acquire(seconds: float):
+    DB_ACQUIRE_SECONDS.observe(seconds)
+    record_span("db_acquire", seconds)
+
+
+def observe_job(job):
+    """Called once a query job reaches a final state"""
+    if job.started_at is None:
+        # Cancelled while queued
+        return
+    seconds = job.finished_at - job.started_at
+    QUERY_SECONDS.labels(job.engine or "none", job.status).observe(seconds)
+    QUERY_QUEUE_SECONDS.observe(job.started_at - job.submitted_at)
+    record_span(f"query_{job.engine or 'none'}", seconds)
+
+
+def observe_result(engine: Optional[str], fmt: str, rows: int, nbytes: Optional[int] = None):
+    QUERY_ROWS.labels(engine or "none", fmt).inc(rows)
+    if nbytes is not None:
+        QUERY_RESULT_BYTES.labels(engine or "none", fmt).inc(nbytes)
+
+
+def render():
+    """Body and content type for GET /metrics"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class StatsCollector(Collector):
+    """
+    Gauges and counters read from `stats()` at scrape time. `gauges` and
+    `counters` map metric names to (help, key path into the stats dict).
+    """
+
+    def __init__(self, stats: Callable[[], Dict], gauges: Dict[str, Tuple[str, Tuple[str, ...]]],
+                 counters: Optional[Dict[str, Tuple[str, Tuple[str, ...]]]] = None):
+        self.stats = stats
+        self.gauges = gauges
+        self.counters = counters or {}
+
+    def collect(self) -> Iterable:
+        try:
+            stats = self.stats()
+        except Exception as e:
+            logger.warning(f"Could not read stats for metrics: {e}")
+            return
+        for name, (doc, path) in self.gauges.items():
+            yield GaugeMetricFamily(name, doc, value=_lookup(stats, path))
+        for name, (doc, path) in self.counters.items():
+            yield CounterMetricFamily(name, doc, value=_lookup(stats, path))
+
+
+class SparkCollector(Collector):
+    """Spark session state (one series per state, 1 for the current one) and active Spark jobs"""
+
+    def __init__(self, states: Tuple[str, ...], get_state: Callable[[], str], get_session: Callable):
+        self.states = states
+        self.get_state = get_state
+        self.get_session = get_session
+
+    def collect(self) -> Iterable:
+        current = self.get_state()
+        state = GaugeMetricFamily("spark_session_state", "Spark session state", labels=["state"])
+        for name in self.states:
+            state.add_metric([name], 1.0 if name == current else 0.0)
+        yield state
+        session = self.get_session()
+        if session is None:
+            return
+        try:
+            tracker = session.sparkContext.statusTracker()
+            active_jobs = len(tracker.getActiveJobIds())
+            active_stages = len(tracker.getActiveStageIds())
+        except Exception as e:
+            logger.warning(f"Could not read Spark status for metrics: {e}")
+            return
+        yield GaugeMetricFamily("spark_active_jobs", "Running Spark jobs", value=active_jobs)
+        yield GaugeMetricFamily("spark_active_stages", "Running Spark stages", value=active_stages)
+
+
+def _lookup(stats: Dict, path: Tuple[str, ...]) -> float:
+    value = stats
+    for key in path:
+        value = value[key]
+    return float(value)
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds `request_id` to every log record ("-" outside requests)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+def install_log_context():
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(RequestIdFilter())
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:[%(request_id)s] %(message)s"))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each request under its route template (so path
+    parameters do not multiply the series) and propagating the request id.
+    Requests slower than `slow_request_seconds` are logged with their spans.
+    """
+
+    def __init__(self, app, slow_request_seconds: float = 1.0):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _request_id(scope)
+        spans: List[Tuple[str, float]] = []
+        id_token = request_id_var.set(request_id)
+        spans_token = _spans_var.set(spans)
+        status = 500
+        body_bytes = 0
+        started = time.perf_counter()
+
+        async def send_with_headers(message):
+            nonlocal status, body_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                timing = server_timing(spans)
+                if timing:
+                    headers.append((b"server-timing", timing.encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            HTTP_RESPONSE_BYTES.labels(scope["method"], route).observe(body_bytes)
+            if elapsed >= self.slow_request_seconds:
+                logger.info(
+                    f"Slow request {scope['method']} {route} -> {status} in {elapsed * 1000:.0f}ms; "
+                    f"spans: {server_timing(spans) or 'none'}"
+                )
+            _spans_var.reset(spans_token)
+            request_id_var.reset(id_token)
+
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Server-Timing value with the total time per span name (ms)"""
+    totals: Dict[str, float] = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def _request_id(scope) -> str:
+    for key, value in scope.get("headers", []):
+        if key == b"x-request-id":
+            candidate = value.decode("latin-1")
+            if _VALID_REQUEST_ID.match(candidate):
+                return candidate
+            break
+    return uuid.uuid4().hex
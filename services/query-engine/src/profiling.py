@@ -0,0 +1,287 @@
+"""
+Per-query execution profiles and the persisted query history.
+A profile combines phase timings with the Spark status tracker (jobs, stages,
+tasks of the query's job group) and the SQL metrics of the executed physical
+plan (rows/bytes/files scanned, shuffle bytes). Finished queries are written
+to the 'query_history' table off the query workers.
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2.extras import Json
+
+logger = logging.getLogger(__name__)
+
+# Plans of very wide queries can be huge; keep history rows bounded
+PLAN_MAX_CHARS = 64 * 1024
+
+# Adaptive execution wraps the plan that actually ran; follow these to it
+# instead of children(), which they do not expose
+_PLAN_WRAPPERS = {
+    "AdaptiveSparkPlanExec": "executedPlan",
+    "ShuffleQueryStageExec": "plan",
+    "BroadcastQueryStageExec": "plan",
+    "TableCacheQueryStageExec": "plan",
+}
+
+HISTORY_ORDER_COLUMNS = (
+    "submitted_at", "wall_ms", "planning_ms", "execution_ms",
+    "rows_read", "bytes_read", "shuffle_bytes",
+)
+
+_SUMMARY_COLUMNS = """
+    query_id, user_id, query_text, status, error_message, result_format, cache_hit, engine,
+    rows_returned, queue_ms, wall_ms, planning_ms, execution_ms, spark_jobs, stages,
+    tasks, rows_read, bytes_read, files_read, files_pruned, shuffle_bytes,
+    submitted_at, finished_at
+"""
+
+
+@dataclass
+class QueryProfile:
+    planning_ms: Optional[float] = None
+    execution_ms: Optional[float] = None
+    rows_returned: Optional[int] = None
+    spark_jobs: int = 0
+    stages: int = 0
+    tasks: int = 0
+    rows_read: int = 0
+    bytes_read: int = 0
+    files_read: int = 0
+    # Only known when every scanned catalog table is Delta
+    files_pruned: Optional[int] = None
+    shuffle_bytes: int = 0
+    # Non-zero SQL metrics of every physical plan node
+    nodes: List[Dict[str, Any]] = field(default_factory=list)
+    plan: Optional[str] = None
+
+    @contextmanager
+    def timed(self, phase: str):
+        """Record the duration of the block as `<phase>_ms`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, f"{phase}_ms", round((time.perf_counter() - start) * 1000, 1))
+
+    def capture(self, spark, group_id: str, df=None,
+                tables: Optional[Dict[str, Dict[str, str]]] = None, with_plan: bool = False,
+                delta_log=None):
+        """
+        Fill in counters once `df` has been executed under Spark job group
+        `group_id`. Without `df` (results not collected from one DataFrame)
+        only the job group's stage/task counts are taken. Pruned files are
+        counted against the cached Delta snapshots of `delta_log`.
+        Never raises: a missing metric must not fail the query.
+        """
+        try:
+            self._capture_stages(spark, group_id)
+        except Exception as e:
+            logger.warning(f"Could not read Spark job stats for {group_id}: {e}")
+        if df is None:
+            return
+
+        query_execution = df._jdf.queryExecution()
+        try:
+            self._capture_metrics(query_execution.executedPlan())
+        except Exception as e:
+            logger.warning(f"Could not read SQL metrics for {group_id}: {e}")
+
+        try:
+            self._capture_pruning(delta_log, tables)
+        except Exception as e:
+            logger.warning(f"Could not compute pruned files for {group_id}: {e}")
+
+        if with_plan:
+            try:
+                plan = spark._jvm.PythonSQLUtils.explainString(query_execution, "formatted")
+                self.plan = plan[:PLAN_MAX_CHARS]
+            except Exception as e:
+                logger.warning(f"Could not explain query {group_id}: {e}")
+
+    def _capture_stages(self, spark, group_id: str):
+        tracker = spark.sparkContext.statusTracker()
+        spark_jobs = tracker.getJobIdsForGroup(group_id)
+        stage_ids = set()
+        for spark_job_id in spark_jobs:
+            info = tracker.getJobInfo(spark_job_id)
+            if info:
+                stage_ids.update(info.stageIds)
+        tasks = 0
+        for stage_id in stage_ids:
+            stage = tracker.getStageInfo(stage_id)
+            if stage:
+                tasks += stage.numTasks
+        self.spark_jobs = len(spark_jobs)
+        self.stages = len(stage_ids)
+        self.tasks = tasks
+
+    def _capture_metrics(self, plan):
+        for node in _walk_plan(plan):
+            metrics = _metric_values(node)
+            if not metrics:
+                continue
+            self.nodes.append({"node": node.nodeName(), "metrics": metrics})
+            if "numFiles" in metrics or "filesSize" in metrics:
+                # File source scans (Parquet, and therefore Delta)
+                self.rows_read += metrics.get("numOutputRows", 0)
+                self.bytes_read += metrics.get("filesSize", 0)
+                self.files_read += metrics.get("numFiles", 0)
+            if "shuffleBytesWritten" in metrics:
+                self.shuffle_bytes += metrics["shuffleBytesWritten"]
+            elif "dataSize" in metrics and node.nodeName().startswith("Exchange"):
+                self.shuffle_bytes += metrics["dataSize"]
+
+    def _capture_pruning(self, delta_log, tables: Dict[str, Dict[str, str]]):
+        if delta_log is None or not tables or any(t["format"] != "delta" for t in tables.values()):
+            return
+        total = 0
+        for table in tables.values():
+            snapshot = delta_log.snapshot(table["location"])
+            if snapshot is None:
+                # Reader features the log reader does not support
+                return
+            total += len(snapshot.files)
+        # A table scanned more than once can read more files than it has
+        self.files_pruned = max(total - self.files_read, 0)
+
+
+def _walk_plan(plan):
+    """Every node of an executed physical plan, including subqueries"""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        accessor = _PLAN_WRAPPERS.get(node.getClass().getSimpleName())
+        if accessor:
+            stack.append(getattr(node, accessor)())
+            continue
+        yield node
+        for seq in (node.children(), node.subqueries()):
+            stack.extend(seq.apply(i) for i in range(seq.size()))
+
+
+def _metric_values(node) -> Dict[str, int]:
+    values = {}
+    entries = node.metrics().iterator()
+    while entries.hasNext():
+        entry = entries.next()
+        value = entry._2().value()
+        if value:
+            values[entry._1()] = value
+    return values
+
+
+def _timestamp(epoch: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc) if epoch else None
+
+
+def _millis(start: Optional[float], end: Optional[float]) -> Optional[int]:
+    if start is None or end is None:
+        return None
+    return int((end - start) * 1000)
+
+
+class QueryHistory:
+    """
+    Writes finished query jobs to 'query_history' on a single background
+    thread, so a slow or unavailable database never delays query results.
+    """
+
+    def __init__(self, connect: Callable, enabled: bool = True):
+        self.connect = connect
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-history")
+
+    def record(self, job):
+        if self.enabled:
+            self._executor.submit(self._insert, job)
+
+    def list(self, user_id: Optional[int], limit: int, offset: int,
+             status: Optional[str] = None, order_by: str = "submitted_at") -> List[Dict]:
+        """Newest (or most expensive, per `order_by`) queries first, without plans"""
+        if order_by not in HISTORY_ORDER_COLUMNS:
+            raise ValueError(f"Cannot order query history by '{order_by}'")
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append("user_id = %s")
+            params.append(user_id)
+        if status:
+            conditions.append("status = %s")
+            params.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (
+            f"SELECT {_SUMMARY_COLUMNS} FROM query_history {where} "
+            f"ORDER BY {order_by} DESC NULLS LAST LIMIT %s OFFSET %s"
+        )
+        return self._fetch(query, (*params, limit, offset))
+
+    def get(self, query_id: str) -> Optional[Dict]:
+        """Full history entry including per-node metrics and the plan"""
+        rows = self._fetch("SELECT * FROM query_history WHERE query_id = %s", (query_id,))
+        return rows[0] if rows else None
+
+    def shutdown(self):
+        # Let queued inserts finish so the last queries are not lost
+        self._executor.shutdown(wait=True)
+
+    def _fetch(self, query: str, params: tuple) -> List[Dict]:
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def _insert(self, job):
+        profile = job.profile or QueryProfile()
+        values = {
+            "query_id": job.id,
+            "user_id": job.owner_id,
+            "query_text": job.query,
+            "status": job.status,
+            "error_message": job.error,
+            "result_format": job.format,
+            "cache_hit": job.cache_hit,
+            "engine": job.engine,
+            "rows_returned": profile.rows_returned,
+            "queue_ms": _millis(job.submitted_at, job.started_at),
+            "wall_ms": _millis(job.started_at, job.finished_at),
+            "planning_ms": profile.planning_ms,
+            "execution_ms": profile.execution_ms,
+            "spark_jobs": profile.spark_jobs,
+            "stages": profile.stages,
+            "tasks": profile.tasks,
+            "rows_read": profile.rows_read,
+            "bytes_read": profile.bytes_read,
+            "files_read": profile.files_read,
+            "files_pruned": profile.files_pruned,
+            "shuffle_bytes": profile.shuffle_bytes,
+            "metrics": Json({"nodes": profile.nodes}),
+            "plan": profile.plan,
+            "submitted_at": _timestamp(job.submitted_at),
+            "finished_at": _timestamp(job.finished_at),
+        }
+        columns = ", ".join(values)
+        placeholders = ", ".join(["%s"] * len(values))
+        conn = None
+        try:
+            conn = self.connect()
+            cur = conn.cursor()
+            cur.execute(
+                f"INSERT INTO query_history ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT (query_id) DO NOTHING",
+                tuple(values.values())
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to record query history for {job.id}: {e}")
+        finally:
+            if conn:
+                conn.close()
@@ -0,0 +1,93 @@
+"""
+Result serialization for the query engine.
+Converts Spark DataFrames to Arrow once and renders that Arrow table as
+either an Arrow IPC stream or a columnar JSON payload.
+"""
+
+import io
+from typing import Any, Dict, Iterator, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyspark.sql.pandas.types import to_arrow_schema
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def wants_arrow(accept: str) -> bool:
+    """Return True when the Accept header asks for an Arrow IPC stream"""
+    if not accept:
+        return False
+    return any(
+        part.split(";")[0].strip() == ARROW_STREAM_MEDIA_TYPE
+        for part in accept.split(",")
+    )
+
+
+def collect_arrow(df, limit: int) -> Tuple[pa.Table, bool]:
+    """
+    Collect at most `limit` rows of a DataFrame as an Arrow table.
+    One extra row is fetched so truncation can be detected without a count().
+    """
+    return collect_limited_arrow(df.limit(limit + 1), limit)
+
+
+def collect_limited_arrow(limited, limit: int) -> Tuple[pa.Table, bool]:
+    """
+    Like collect_arrow, for a DataFrame already limited to `limit + 1` rows.
+    Lets the caller keep the exact DataFrame that ran (e.g. for its metrics).
+    """
+    # _collect_as_arrow is the same driver-side path toPandas() uses; it ships
+    # record batches from the executors instead of pickled Row objects.
+    batches = limited._collect_as_arrow()
+    if batches:
+        table = pa.Table.from_batches(batches)
+    else:
+        table = to_arrow_schema(limited.schema).empty_table()
+
+    truncated = table.num_rows > limit
+    if truncated:
+        table = table.slice(0, limit)
+    return table, truncated
+
+
+def iter_arrow_stream(table: pa.Table, max_chunksize: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield an Arrow IPC stream for `table` one record batch at a time"""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        # The schema message is written when the writer is opened
+        yield _drain(sink)
+        for batch in table.to_batches(max_chunksize=max_chunksize):
+            writer.write_batch(batch)
+            yield _drain(sink)
+    # End-of-stream marker written on close
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate(0)
+    return data
+
+
+def _jsonable_column(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """
+    Cast types json.dumps cannot encode (timestamps, dates, decimals, binary)
+    to strings inside Arrow, so no per-value Python conversion is needed.
+    """
+    t = column.type
+    if (pa.types.is_temporal(t) or pa.types.is_decimal(t)
+            or pa.types.is_binary(t) or pa.types.is_large_binary(t)):
+        return pc.cast(column, pa.string())
+    return column
+
+
+def to_columnar(table: pa.Table) -> Dict[str, Any]:
+    """Render an Arrow table as {column_name: [values...]} plus type names"""
+    data = {}
+    types = {}
+    for name, column in zip(table.column_names, table.columns):
+        data[name] = _jsonable_column(column).to_pylist()
+        types[name] = str(column.type)
+    return {"columns": table.column_names, "types": types, "data": data}
@@ -4,19 +4,53 @@ Provides a REST API for executing Spark SQL queries with Delta Lake support.
 """
 
 import os
+import glob
+import time
+import asyncio
 import logging
-from typing import Optional, List, Dict, Any
+import threading
+from typing import Optional, List, Dict, Any, Literal, Union
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Header, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Header, Depends, BackgroundTasks, Query
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from pyarrow import fs as pafs
 from pyspark.sql import SparkSession
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from .cache import (
+    ResultCache,
+    is_cacheable,
+    normalize_sql,
+    referenced_identifiers,
+    table_references,
+)
+from . import metrics
+from .catalog import CatalogSync, CatalogListener, TableResolver
+from .cursors import CursorLimitReached, CursorManager
+from .db import ConnectionPool, PoolTimeout
+from .fastpath import FastPathExecutor, FAST_PATH_ENGINE, SPARK_ENGINE
+from .jobs import AdmissionRejected, QueryJobManager, FAILED, CANCELLED, FINISHED_STATES
+from .profiling import HISTORY_ORDER_COLUMNS, QueryHistory, QueryProfile
+from .ingest import FORMATS as INGEST_FORMATS, TABLE_NAME, IngestSpec, detect_format, ingest
+from .maintenance import OPERATIONS, MaintenancePolicy, MaintenanceScheduler
+from .stats import TableStatsCollector
+from .table_cache import TableCacheManager
+from .results import (
+    ARROW_STREAM_MEDIA_TYPE,
+    collect_limited_arrow,
+    iter_arrow_stream,
+    to_columnar,
+    wants_arrow,
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
+metrics.install_log_context()
 logger = logging.getLogger(__name__)
 
 # Environment configuration
@@ -28,18 +62,226 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "openbricks")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "openbricks123")
 QUERY_ROW_LIMIT = int(os.getenv('QUERY_ROW_LIMIT', '1000'))
+QUERY_WORKERS = int(os.getenv('QUERY_WORKERS', '4'))
+QUERY_JOB_TTL_SECONDS = int(os.getenv('QUERY_JOB_TTL_SECONDS', '3600'))
+# Admission control (0 disables): queries running / waiting per user, total waiting
+QUERY_MAX_RUNNING_PER_USER = int(os.getenv('QUERY_MAX_RUNNING_PER_USER', '2'))
+QUERY_MAX_QUEUED_PER_USER = int(os.getenv('QUERY_MAX_QUEUED_PER_USER', '8'))
+QUERY_MAX_QUEUE_DEPTH = int(os.getenv('QUERY_MAX_QUEUE_DEPTH', '100'))
+# FAIR scheduler pool per "user" (user-<id>) or per "role" (see fairscheduler.xml)
+QUERY_SCHEDULER_POOLS = os.getenv('QUERY_SCHEDULER_POOLS', 'user')
+SPARK_SCHEDULER_ALLOCATION_FILE = os.getenv(
+    'SPARK_SCHEDULER_ALLOCATION_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fairscheduler.xml')
+)
+QUERY_CACHE_MAX_BYTES = int(os.getenv('QUERY_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+QUERY_CURSOR_TTL_SECONDS = int(os.getenv('QUERY_CURSOR_TTL_SECONDS', '900'))
+QUERY_CURSOR_MEMORY_ROWS = int(os.getenv('QUERY_CURSOR_MEMORY_ROWS', '100000'))
+# Open cursors at once (429 past it) and memory shared by in-memory snapshots
+QUERY_MAX_CURSORS = int(os.getenv('QUERY_MAX_CURSORS', '1000'))
+QUERY_CURSOR_MEMORY_BYTES = int(os.getenv('QUERY_CURSOR_MEMORY_BYTES', str(512 * 1024 * 1024)))
+QUERY_MAX_PAGE_SIZE = int(os.getenv('QUERY_MAX_PAGE_SIZE', '10000'))
+# Pooled Postgres connections shared by requests and background threads
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_TIMEOUT_SECONDS', '5'))
+CATALOG_FALLBACK_SYNC_SECONDS = int(os.getenv('CATALOG_FALLBACK_SYNC_SECONDS', '300'))
+# "lazy": register only the tables each query references; "eager": register all at startup
+CATALOG_MODE = os.getenv('CATALOG_MODE', 'lazy')
+CATALOG_RESOLVE_TTL_SECONDS = int(os.getenv('CATALOG_RESOLVE_TTL_SECONDS', '600'))
+CATALOG_NEGATIVE_TTL_SECONDS = int(os.getenv('CATALOG_NEGATIVE_TTL_SECONDS', '30'))
+QUERY_RESULTS_LOCATION = os.getenv('QUERY_RESULTS_LOCATION', 's3a://openbricks-data/_query_results')
+# Pre-resolved Delta/hadoop-aws jars baked into the image; when absent the
+# packages are resolved from Maven at startup (local development)
+SPARK_JARS_DIR = os.getenv('SPARK_JARS_DIR', '/opt/query-engine/jars')
+SPARK_PACKAGES = "io.delta:delta-spark_2.12:3.0.0,org.apache.hadoop:hadoop-aws:3.3.4"
+# Simple single-table scans are served with pyarrow instead of Spark
+QUERY_FASTPATH_ENABLED = os.getenv('QUERY_FASTPATH_ENABLED', 'true').lower() == 'true'
+# Filtered fast-path queries may scan at most this much data after pruning
+QUERY_FASTPATH_MAX_BYTES = int(os.getenv('QUERY_FASTPATH_MAX_BYTES', str(64 * 1024 * 1024)))
+# Log-derived table stats older than this are refreshed in the background
+TABLE_STATS_MAX_AGE_SECONDS = int(os.getenv('TABLE_STATS_MAX_AGE_SECONDS', '3600'))
+# Background OPTIMIZE / VACUUM / checkpointing of catalog Delta tables
+MAINTENANCE_ENABLED = os.getenv('MAINTENANCE_ENABLED', 'true').lower() == 'true'
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv('MAINTENANCE_INTERVAL_SECONDS', '3600'))
+MAINTENANCE_SMALL_FILE_BYTES = int(os.getenv('MAINTENANCE_SMALL_FILE_BYTES', str(32 * 1024 * 1024)))
+MAINTENANCE_MIN_SMALL_FILES = int(os.getenv('MAINTENANCE_MIN_SMALL_FILES', '50'))
+MAINTENANCE_VACUUM_RETENTION_HOURS = int(os.getenv('MAINTENANCE_VACUUM_RETENTION_HOURS', '168'))
+MAINTENANCE_VACUUM_INTERVAL_HOURS = int(os.getenv('MAINTENANCE_VACUUM_INTERVAL_HOURS', '24'))
+MAINTENANCE_CHECKPOINT_INTERVAL = int(os.getenv('MAINTENANCE_CHECKPOINT_INTERVAL', '50'))
+MAINTENANCE_ZORDER_MAX_COLUMNS = int(os.getenv('MAINTENANCE_ZORDER_MAX_COLUMNS', '2'))
+# Maintenance waits while more interactive queries than this are running or queued
+MAINTENANCE_MAX_ACTIVE_QUERIES = int(os.getenv('MAINTENANCE_MAX_ACTIVE_QUERIES', '1'))
+# Concurrent compaction jobs per OPTIMIZE (Delta's default is 15)
+MAINTENANCE_OPTIMIZE_THREADS = int(os.getenv('MAINTENANCE_OPTIMIZE_THREADS', '2'))
+# CSV / JSON ingestion: where new tables are written, target output file
+# size and how many lines are sampled for schema inference
+INGEST_TABLES_LOCATION = os.getenv('INGEST_TABLES_LOCATION', 's3a://openbricks-data/tables')
+INGEST_TARGET_FILE_MB = int(os.getenv('INGEST_TARGET_FILE_MB', '128'))
+INGEST_SAMPLE_ROWS = int(os.getenv('INGEST_SAMPLE_ROWS', '10000'))
+# Spark in-memory caching of the most used tables (TABLE_CACHE_MAX_BYTES=0
+# disables it). Access counts halve every half-life; tables scoring below
+# the minimum are never cached. Sizes are estimated as Parquet size times
+# the memory factor until Spark reports the real one.
+TABLE_CACHE_MAX_BYTES = int(os.getenv('TABLE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+TABLE_CACHE_INTERVAL_SECONDS = int(os.getenv('TABLE_CACHE_INTERVAL_SECONDS', '60'))
+TABLE_CACHE_HALF_LIFE_SECONDS = float(os.getenv('TABLE_CACHE_HALF_LIFE_SECONDS', '1800'))
+TABLE_CACHE_MIN_SCORE = float(os.getenv('TABLE_CACHE_MIN_SCORE', '3'))
+TABLE_CACHE_MEMORY_FACTOR = float(os.getenv('TABLE_CACHE_MEMORY_FACTOR', '2'))
+# Requests slower than this are logged with their timing spans
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '1'))
+QUERY_HISTORY_ENABLED = os.getenv('QUERY_HISTORY_ENABLED', 'true').lower() == 'true'
+# EXPLAIN FORMATTED of every query, stored with its history entry
+QUERY_HISTORY_CAPTURE_PLANS = os.getenv('QUERY_HISTORY_CAPTURE_PLANS', 'true').lower() == 'true'
 
 # Global Spark session
 _spark_session = None
+_spark_lock = threading.Lock()
 
-def get_db_connection():
-    """Get database connection"""
+# Spark readiness: "starting" -> "warming" -> "ready"; "failed" while retrying
+SPARK_STARTING = "starting"
+SPARK_WARMING = "warming"
+SPARK_READY = "ready"
+SPARK_FAILED = "failed"
+_spark_state = {"state": SPARK_STARTING, "error": None, "since": time.time(), "ready_at": None}
+
+# Result cache (QUERY_CACHE_MAX_BYTES=0 disables it)
+result_cache = ResultCache(QUERY_CACHE_MAX_BYTES)
+
+# Direct MinIO access for pyarrow (cursor spills, fast path)
+object_store = pafs.S3FileSystem(
+    access_key=MINIO_ACCESS_KEY,
+    secret_key=MINIO_SECRET_KEY,
+    endpoint_override=MINIO_ENDPOINT,
+    scheme="http",
+)
+
+# Paginated result snapshots; large ones are spilled to MinIO as Parquet
+result_cursors = CursorManager(
+    QUERY_CURSOR_TTL_SECONDS,
+    QUERY_CURSOR_MEMORY_ROWS,
+    QUERY_RESULTS_LOCATION,
+    object_store,
+    max_cursors=QUERY_MAX_CURSORS,
+    max_memory_bytes=QUERY_CURSOR_MEMORY_BYTES,
+)
+
+fast_path = FastPathExecutor(object_store, QUERY_FASTPATH_MAX_BYTES)
+
+
+def open_db_connection():
+    """New dedicated database connection (outside the pool)"""
     return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
 
+db_pool = ConnectionPool(
+    open_db_connection, DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS, on_acquire=metrics.observe_db_acquire
+)
+
+def get_db_connection():
+    """Get a pooled database connection; close() returns it to the pool"""
+    return db_pool.connection()
+
+# Execution profile of every finished query, persisted to 'query_history'
+query_history = QueryHistory(get_db_connection, QUERY_HISTORY_ENABLED)
+
+def on_query_finish(job):
+    metrics.observe_job(job)
+    query_history.record(job)
+
+# Every query (sync or submitted as a job) runs on this bounded pool,
+# never on the event loop
+query_jobs = QueryJobManager(
+    QUERY_WORKERS,
+    QUERY_JOB_TTL_SECONDS,
+    on_finish=on_query_finish,
+    max_running_per_user=QUERY_MAX_RUNNING_PER_USER,
+    max_queued_per_user=QUERY_MAX_QUEUED_PER_USER,
+    max_queue_depth=QUERY_MAX_QUEUE_DEPTH,
+)
+
+# Spark temp views for 'data_tables' entries, kept current by LISTEN/NOTIFY
+catalog = CatalogSync(get_db_connection)
+table_resolver = TableResolver(get_db_connection, CATALOG_RESOLVE_TTL_SECONDS, CATALOG_NEGATIVE_TTL_SECONDS)
+
+# Row counts, sizes and column stats in 'table_stats', from the Delta log
+table_stats = TableStatsCollector(get_db_connection, fast_path.delta_log, TABLE_STATS_MAX_AGE_SECONDS)
+
+def refresh_table_stats():
+    try:
+        table_stats.refresh_stale()
+    except Exception as e:
+        logger.error(f"Table stats refresh failed: {e}")
+
+def on_catalog_change(changes):
+    refresh_table_stats()
+    if CATALOG_MODE == "lazy":
+        # Re-checked on next reference; a new table is no longer a cached miss
+        table_resolver.invalidate(c["name"] for c in changes if c.get("name"))
+    elif _spark_session is not None:
+        catalog.incremental_sync(_spark_session)
+
+def on_catalog_interval():
+    refresh_table_stats()
+    if _spark_session is None:
+        # Nothing to do before Spark is up
+        return
+    if CATALOG_MODE == "lazy":
+        table_resolver.evict(_spark_session)
+    else:
+        catalog.incremental_sync(_spark_session)
+
+# LISTEN holds its connection for good, so it does not take one from the pool
+catalog_listener = CatalogListener(
+    open_db_connection,
+    on_catalog_change,
+    on_catalog_interval,
+    fallback_interval=CATALOG_FALLBACK_SYNC_SECONDS,
+)
+
+def ready_spark_session():
+    """The Spark session once warmed up, else None (never starts it)"""
+    return _spark_session if _spark_state["state"] == SPARK_READY else None
+
+def interactive_queries_busy() -> bool:
+    load = query_jobs.admission_stats()
+    return load["running"] + load["queued"] > MAINTENANCE_MAX_ACTIVE_QUERIES
+
+# Compaction, Z-ordering, VACUUM and checkpoints for catalog Delta tables
+table_maintenance = MaintenanceScheduler(
+    get_db_connection,
+    fast_path.delta_log,
+    ready_spark_session,
+    interactive_queries_busy,
+    MaintenancePolicy(
+        small_file_bytes=MAINTENANCE_SMALL_FILE_BYTES,
+        min_small_files=MAINTENANCE_MIN_SMALL_FILES,
+        vacuum_retention_hours=MAINTENANCE_VACUUM_RETENTION_HOURS,
+        vacuum_interval_hours=MAINTENANCE_VACUUM_INTERVAL_HOURS,
+        checkpoint_interval=MAINTENANCE_CHECKPOINT_INTERVAL,
+        zorder_max_columns=MAINTENANCE_ZORDER_MAX_COLUMNS,
+    ),
+    MAINTENANCE_INTERVAL_SECONDS,
+)
+
+# CACHE TABLE for the tables Spark queries read most
+table_cache = TableCacheManager(
+    fast_path.delta_log,
+    ready_spark_session,
+    interactive_queries_busy,
+    TABLE_CACHE_MAX_BYTES,
+    TABLE_CACHE_INTERVAL_SECONDS,
+    TABLE_CACHE_HALF_LIFE_SECONDS,
+    TABLE_CACHE_MIN_SCORE,
+    TABLE_CACHE_MEMORY_FACTOR,
+)
+
 def get_spark_session():
     """Get or create a Spark session with Delta Lake and S3 support."""
     global _spark_session
-    if _spark_session is None:
+    if _spark_session is not None:
+        return _spark_session
+    with _spark_lock:
+        if _spark_session is not None:
+            return _spark_session
         logger.info("Initializing Spark Session...")
         builder = (SparkSession.builder
             .appName("OpenBricks Query Engine")
@@ -55,58 +297,114 @@ def get_spark_session():
             .config("spark.hadoop.fs.s3a.secret.key", MINIO_SECRET_KEY)
             .config("spark.hadoop.fs.s3a.path.style.access", "true")
             .config("spark.hadoop.fs.s3a.impl", "org.apache.hadoop.fs.s3a.S3AFileSystem")
-            # Packages (Delta + AWS SDK for S3)
-            .config("spark.jars.packages", "io.delta:delta-spark_2.12:3.0.0,org.apache.hadoop:hadoop-aws:3.3.4")
+            # Fair sharing between users' concurrent queries
+            .config("spark.scheduler.mode", "FAIR")
+            .config("spark.scheduler.allocation.file", SPARK_SCHEDULER_ALLOCATION_FILE)
+            # Keep background OPTIMIZE from flooding the scheduler with jobs
+            .config("spark.databricks.delta.optimize.maxThreads", str(MAINTENANCE_OPTIMIZE_THREADS))
+            # Arrow Config (columnar result collection)
+            .config("spark.sql.execution.arrow.pyspark.enabled", "true")
         )
-        _spark_session = builder.getOrCreate()
+        jars = sorted(glob.glob(os.path.join(SPARK_JARS_DIR, "*.jar")))
+        if jars:
+            # Local jars: no Ivy resolution, no network access needed at boot
+            builder = builder.config("spark.jars", ",".join(jars))
+        else:
+            # Packages (Delta + AWS SDK for S3)
+            logger.warning(f"No jars in {SPARK_JARS_DIR}; resolving {SPARK_PACKAGES} from Maven")
+            builder = builder.config("spark.jars.packages", SPARK_PACKAGES)
+        spark = builder.getOrCreate()
         logger.info("Spark Session initialized.")
         
-        # Initial catalog sync
-        sync_catalog(_spark_session)
+        # Initial catalog sync (lazy mode registers tables on first use instead)
+        if CATALOG_MODE != "lazy":
+            sync_catalog(spark)
+        _spark_session = spark
         
     return _spark_session
 
-def sync_catalog(spark):
+def sync_catalog(spark, full: bool = True):
     """
     Syncs tables from Postgres 'data_tables' to Spark Catalog as Temp Views.
     This allows users to query tables by name (e.g. SELECT * FROM my_table).
+    With full=False only tables changed since the last sync are touched.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT name, location, format FROM data_tables")
-        tables = cur.fetchall()
-        conn.close()
-        
-        for table in tables:
-            name = table['name']
-            location = table['location']
-            fmt = table['format'] or 'delta'
-            
-            # Register as temp view
-            # We use CREATE OR REPLACE TEMP VIEW to update if exists
-            # Syntax: CREATE OR REPLACE TEMP VIEW name USING format LOCATION 'path'
-            try:
-                spark.sql(f"CREATE OR REPLACE TEMP VIEW {name} USING {fmt} LOCATION '{location}'")
-                logger.info(f"Registered table '{name}' at '{location}'")
-            except Exception as e:
-                logger.error(f"Failed to register table '{name}': {e}")
-                
+        if full:
+            return catalog.full_sync(spark)
+        return catalog.incremental_sync(spark)
     except Exception as e:
         logger.error(f"Catalog sync failed: {e}")
+        return None
+
+def set_spark_state(state: str, error: Optional[str] = None):
+    _spark_state.update(state=state, error=error, since=time.time())
+    if state == SPARK_READY:
+        _spark_state["ready_at"] = time.time()
+
+def warm_up_spark(max_backoff: int = 60):
+    """
+    Background startup: create the Spark session, then run a small query
+    through the row and Arrow collection paths so the first user query does
+    not pay for executor launch, code generation and JIT warm-up.
+    Retries with backoff until Spark comes up.
+    """
+    backoff = 1
+    while True:
+        try:
+            set_spark_state(SPARK_STARTING)
+            spark = get_spark_session()
+            set_spark_state(SPARK_WARMING)
+            started = time.perf_counter()
+            df = spark.range(0, 100000, numPartitions=4).selectExpr("id", "id % 10 AS k", "CAST(id AS STRING) AS s")
+            df.groupBy("k").count().collect()
+            df.limit(1000)._collect_as_arrow()
+            logger.info(f"Spark warm-up finished in {time.perf_counter() - started:.1f}s")
+            set_spark_state(SPARK_READY)
+            return
+        except Exception as e:
+            logger.error(f"Spark initialization failed: {e}; retrying in {backoff}s")
+            set_spark_state(SPARK_FAILED, str(e))
+            time.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+
+async def expire_cursors_periodically(interval: int = 60):
+    """Background task: drop expired cursors and their spilled files"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = await run_in_threadpool(result_cursors.expire)
+            if expired:
+                logger.info(f"Expired {expired} result cursors")
+        except Exception as e:
+            logger.error(f"Cursor cleanup failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
-    # Startup: Initialize Spark
-    try:
-        get_spark_session()
-    except Exception as e:
-        logger.error(f"Failed to initialize Spark on startup: {e}")
+    # Startup: initialize and warm up Spark without blocking the server;
+    # /ready reports when queries can be served
+    threading.Thread(target=warm_up_spark, name="spark-warmup", daemon=True).start()
+
+    catalog_listener.start()
+    if MAINTENANCE_ENABLED:
+        table_maintenance.start()
+    if table_cache.enabled:
+        table_cache.start()
+    cursor_reaper = asyncio.create_task(expire_cursors_periodically())
     
     yield
     
     # Shutdown
+    cursor_reaper.cancel()
+    catalog_listener.stop()
+    table_maintenance.stop()
+    table_cache.stop()
+    result_cursors.close_all()
+    query_jobs.shutdown()
+    query_history.shutdown()
+    table_stats.shutdown()
+    db_pool.close_all()
     if _spark_session:
         _spark_session.stop()
 
@@ -123,11 +421,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Id", "Server-Timing"],
 )
+app.add_middleware(metrics.MetricsMiddleware, slow_request_seconds=SLOW_REQUEST_SECONDS)
+
+# Read when /metrics is scraped
+metrics.REGISTRY.register(metrics.SparkCollector(
+    (SPARK_STARTING, SPARK_WARMING, SPARK_READY, SPARK_FAILED),
+    lambda: _spark_state["state"],
+    ready_spark_session,
+))
+metrics.REGISTRY.register(metrics.StatsCollector(
+    query_jobs.admission_stats,
+    gauges={
+        "query_jobs_running": ("Query jobs running", ("running",)),
+        "query_jobs_queued": ("Query jobs waiting for a worker", ("queued",)),
+    },
+    counters={"query_jobs_rejected": ("Query jobs rejected by admission control", ("rejected",))},
+))
+metrics.REGISTRY.register(metrics.StatsCollector(
+    db_pool.stats,
+    gauges={
+        "db_pool_connections_open": ("Open pooled database connections", ("open",)),
+        "db_pool_connections_in_use": ("Borrowed pooled database connections", ("in_use",)),
+    },
+    counters={"db_pool_timeouts": ("Borrows that timed out", ("timeouts",))},
+))
+metrics.REGISTRY.register(metrics.StatsCollector(
+    table_cache.stats,
+    gauges={
+        "table_cache_bytes": ("Executor memory held by cached tables", ("cached_bytes",)),
+        "table_cache_tables": ("Tables in Spark's cache", ("cached_tables",)),
+    },
+    counters={
+        "table_cache_hits": ("Spark executions that read a cached table", ("hits",)),
+        "table_cache_invalidations": ("Cached tables dropped after a Delta write", ("invalidations",)),
+    },
+))
+metrics.REGISTRY.register(metrics.StatsCollector(
+    result_cursors.stats,
+    gauges={
+        "query_cursors_open": ("Open result cursors", ("cursors",)),
+        "query_cursors_memory_bytes": ("Memory held by in-memory cursor snapshots", ("memory_bytes",)),
+    },
+    counters={"query_cursors_rejected": ("Cursors rejected at the open cursor limit", ("rejected",))},
+))
+metrics.REGISTRY.register(metrics.StatsCollector(
+    result_cache.stats,
+    gauges={"result_cache_bytes": ("Memory held by cached results", ("bytes",))},
+    counters={
+        "result_cache_hits": ("Queries answered from the result cache", ("hits",)),
+        "result_cache_misses": ("Cacheable queries that had to run", ("misses",)),
+    },
+))
 
 # Models
 class QueryRequest(BaseModel):
     query: str
+    # "rows": list of row objects (default), "columnar": one array per column
+    format: Literal["rows", "columnar"] = "rows"
+    # Bypass the result cache and always run the query
+    no_cache: bool = False
 
 class QueryResponse(BaseModel):
     success: bool
@@ -135,8 +489,65 @@ class QueryResponse(BaseModel):
     data: List[Dict[str, Any]] = []
     row_count: int = 0
     truncated: bool = False
+    cached: bool = False
+    # "spark", "fastpath" or "cache"
+    engine: Optional[str] = None
+    error: Optional[str] = None
+
+class ColumnarQueryResponse(BaseModel):
+    success: bool
+    columns: List[str] = []
+    types: Dict[str, str] = {}
+    data: Dict[str, List[Any]] = {}
+    row_count: int = 0
+    truncated: bool = False
+    cached: bool = False
+    # "spark", "fastpath" or "cache"
+    engine: Optional[str] = None
     error: Optional[str] = None
 
+class IngestRequest(BaseModel):
+    # Uploaded object (or a directory of them) to convert
+    bucket: str
+    path: str
+    table: str
+    database: str = "default"
+    # Detected from the file extension when omitted
+    format: Optional[Literal["csv", "json"]] = None
+    # "error": fail if the table exists, "append" / "overwrite": owner only
+    mode: Literal["error", "append", "overwrite"] = "error"
+    partition_by: List[str] = []
+    target_file_mb: int = Field(default=INGEST_TARGET_FILE_MB, ge=1, le=1024)
+    sample_rows: int = Field(default=INGEST_SAMPLE_ROWS, ge=10, le=1_000_000)
+    # CSV only
+    header: bool = True
+    delimiter: str = Field(default=",", min_length=1, max_length=1)
+
+class CursorRequest(BaseModel):
+    query: str
+    page_size: int = QUERY_ROW_LIMIT
+    format: Literal["rows", "columnar"] = "rows"
+
+class CursorPageResponse(BaseModel):
+    success: bool
+    cursor_id: Optional[str] = None
+    columns: List[str] = []
+    types: Dict[str, str] = {}
+    # List of row objects ("rows") or one array per column ("columnar")
+    data: Any = []
+    offset: int = 0
+    row_count: int = 0
+    total_rows: int = 0
+    next_offset: Optional[int] = None
+    storage: Optional[str] = None
+    expires_at: Optional[float] = None
+    error: Optional[str] = None
+
+@app.exception_handler(PoolTimeout)
+async def database_busy(request, exc: PoolTimeout):
+    """Every pooled connection stayed busy: tell clients to retry shortly"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Auth Dependency
 async def get_current_user(
     x_user_id: Optional[str] = Header(None, alias="X-User-Id"),
@@ -147,78 +558,334 @@ async def get_current_user(
     return {"id": int(x_user_id), "role": x_user_role}
 
 # Routes
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/health")
 async def health():
-    spark_status = "unknown"
-    if _spark_session:
-        spark_status = "active"
-    
-    return {
-        "status": "healthy",
+    """
+    Liveness plus Spark state. Answers 200 while Spark is still starting or
+    warming up (the process is fine) and 503 while Spark cannot be created.
+    """
+    state = _spark_state["state"]
+    body = {
+        "status": "healthy" if state == SPARK_READY else state,
         "service": "query-engine",
-        "spark": spark_status
+        "spark": state,
+        "ready": state == SPARK_READY,
+        "database_pool": db_pool.stats(),
     }
+    if state == SPARK_FAILED:
+        body["error"] = _spark_state["error"]
+        return JSONResponse(status_code=503, content=body)
+    return body
 
-@app.post("/api/query/sync")
-async def trigger_sync(user: Optional[dict] = Depends(get_current_user)):
-    """Manually trigger catalog sync (useful after creating new tables)"""
-    spark = get_spark_session()
-    sync_catalog(spark)
-    return {"message": "Catalog sync triggered"}
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once Spark is up and warmed, 503 until then"""
+    state = _spark_state["state"]
+    body = {
+        "ready": state == SPARK_READY,
+        "state": state,
+        "since": _spark_state["since"],
+        "ready_at": _spark_state["ready_at"],
+        "error": _spark_state["error"],
+    }
+    return JSONResponse(status_code=200 if state == SPARK_READY else 503, content=body)
 
-@app.post("/api/query/sql", response_model=QueryResponse)
-async def execute_sql(
-    request: QueryRequest,
-    background_tasks: BackgroundTasks,
+@app.post("/api/query/sync")
+async def trigger_sync(
+    full: bool = Query(default=False, description="Re-register every table instead of only changed ones"),
     user: Optional[dict] = Depends(get_current_user)
 ):
-    """Execute a Spark SQL query"""
-    try:
-        spark = get_spark_session()
-        
-        # Basic security check: Prevent simple SQL injection or destructive commands
-        # In a real production system, we need a proper SQL parser/validator
-        query_lower = request.query.lower().strip()
-        forbidden_keywords = ["drop", "delete", "truncate", "alter", "insert", "update"]
-        
-        # Allow admins to do anything, restrict users to SELECT
-        if user and user.get("role") != "admin":
-            for keyword in forbidden_keywords:
-                if keyword in query_lower:
-                     # Very naive check, but better than nothing for now
-                     # A real parser is needed to distinguish "SELECT * FROM drop_table" vs "DROP TABLE"
-                     if query_lower.startswith(keyword):
-                         raise HTTPException(status_code=403, detail=f"Operation '{keyword}' not allowed for non-admins")
-
-        # Execute Query
-        logger.info(f"Executing query: {request.query}")
-        df = spark.sql(request.query)
-        
-        # Collect results
-        # Limit rows to prevent OOM
-        rows = df.limit(QUERY_ROW_LIMIT + 1).collect()
-        columns = df.columns
-        
-        data = []
-        truncated = False
+    """
+    Manually trigger catalog sync. Normally unnecessary: changes to
+    data_tables are picked up within seconds via LISTEN/NOTIFY.
+    In lazy mode this only invalidates resolved tables so that each is
+    re-checked on its next reference.
+    """
+    if CATALOG_MODE == "lazy":
+        table_resolver.invalidate()
+        return {"message": "Resolved tables invalidated", "stats": None}
+    spark = await run_in_threadpool(get_spark_session)
+    stats = await run_in_threadpool(sync_catalog, spark, full)
+    return {"message": "Catalog sync triggered", "stats": stats}
+
+def scheduler_pool(user: Optional[dict]) -> str:
+    """FAIR scheduler pool for a user's queries"""
+    if not user:
+        return "default"
+    if QUERY_SCHEDULER_POOLS == "role":
+        return user.get("role") or "user"
+    # Pools not declared in the allocation file are created on first use
+    return f"user-{user['id']}"
+
+def too_busy(e: Union[AdmissionRejected, CursorLimitReached]) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def wait_for_job(job):
+    """Wait without blocking the event loop; returns once the job is finished or cancelled"""
+    await asyncio.wait([asyncio.wrap_future(job.future)])
+
+def check_query_allowed(query: str, user: Optional[dict]):
+    """Basic security check: Prevent simple SQL injection or destructive commands"""
+    # In a real production system, we need a proper SQL parser/validator
+    query_lower = query.lower().strip()
+    forbidden_keywords = ["drop", "delete", "truncate", "alter", "insert", "update"]
+    
+    # Allow admins to do anything, restrict users to SELECT
+    if user and user.get("role") != "admin":
+        for keyword in forbidden_keywords:
+            if keyword in query_lower:
+                 # Very naive check, but better than nothing for now
+                 # A real parser is needed to distinguish "SELECT * FROM drop_table" vs "DROP TABLE"
+                 if query_lower.startswith(keyword):
+                     raise HTTPException(status_code=403, detail=f"Operation '{keyword}' not allowed for non-admins")
+
+def collect_rows(limited) -> QueryResponse:
+    """Collect a DataFrame limited to QUERY_ROW_LIMIT + 1 rows as a list of row dicts"""
+    rows = limited.collect()
+    columns = limited.columns
+    
+    data = []
+    truncated = False
+    
+    for i, row in enumerate(rows):
+        if i >= QUERY_ROW_LIMIT:
+            truncated = True
+            break
+        # Convert Row to dict and handle non-serializable types if needed
+        row_dict = row.asDict()
+        # Convert datetime/date objects to string if needed (FastAPI handles most, but Spark types can be tricky)
+        data.append(row_dict)
         
-        for i, row in enumerate(rows):
-            if i >= QUERY_ROW_LIMIT:
-                truncated = True
-                break
-            # Convert Row to dict and handle non-serializable types if needed
-            row_dict = row.asDict()
-            # Convert datetime/date objects to string if needed (FastAPI handles most, but Spark types can be tricky)
-            data.append(row_dict)
-            
+    return QueryResponse(
+        success=True,
+        columns=columns,
+        data=data,
+        row_count=len(data),
+        truncated=truncated
+    )
+
+def resolve_tables(spark, query: str) -> Dict[str, Dict[str, str]]:
+    """
+    Catalog tables a query may reference (lower-cased name -> location/format),
+    registered as temp views. Any identifier in the query is a candidate, so
+    no referenced table is missed.
+    """
+    identifiers = referenced_identifiers(normalize_sql(query))
+    if CATALOG_MODE == "lazy":
+        try:
+            return table_resolver.resolve(spark, identifiers)
+        except Exception as e:
+            # The query still runs; unresolved names fail in Spark's analyzer
+            logger.error(f"Table resolution failed: {e}")
+            return {}
+    catalog_tables = catalog.by_name
+    return {name: catalog_tables[name] for name in identifiers & catalog_tables.keys()}
+
+def result_cache_key(job, catalog_tables: Dict[str, Dict[str, str]]):
+    """
+    Cache key for a job, or None if its result must not be cached.
+    Includes the current Delta version of each referenced catalog table,
+    read from the Delta log without Spark so fast-path queries stay off the JVM.
+    """
+    normalized = normalize_sql(job.query)
+    identifiers = referenced_identifiers(normalized)
+    if not is_cacheable(normalized, identifiers):
+        return None
+
+    sources = table_references(normalized)
+    if not sources or not sources <= catalog_tables.keys():
+        # Path-based reads, other catalogs, table functions: writes to them
+        # would never change the key
+        return None
+    tables = sorted(identifiers & catalog_tables.keys())
+
+    versions = []
+    for name in tables:
+        table = catalog_tables[name]
+        if table["format"] != "delta":
+            return None
+        version = fast_path.delta_log.version(table["location"])
+        versions.append((name, version))
+
+    # Row and Arrow results are different objects; columnar/arrow share one
+    kind = "rows" if job.format == "rows" else "arrow"
+    return (kind, normalized, tuple(versions))
+
+def result_size(result) -> int:
+    """Approximate in-memory size of a result for the cache byte budget"""
+    if isinstance(result, QueryResponse):
+        return len(result.model_dump_json())
+    table, _ = result
+    return table.nbytes
+
+def result_row_count(result) -> int:
+    if isinstance(result, QueryResponse):
+        return result.row_count
+    table, _ = result
+    return table.num_rows
+
+def run_fast_path(job, tables, profile):
+    """Serve a simple single-table scan with pyarrow; None to use Spark"""
+    try:
+        with profile.timed("execution"):
+            served = fast_path.execute(job.query, tables, QUERY_ROW_LIMIT, profile)
+    except Exception as e:
+        logger.warning(f"Fast path failed, falling back to Spark: {e}")
+        return None
+    if served is None:
+        return None
+
+    job.engine = FAST_PATH_ENGINE
+    logger.info(f"Served query from fast path: {job.query}")
+    table, truncated = served
+    profile.rows_returned = table.num_rows
+    if job.format == "rows":
         return QueryResponse(
             success=True,
-            columns=columns,
-            data=data,
-            row_count=len(data),
+            columns=table.schema.names,
+            data=table.to_pylist(),
+            row_count=table.num_rows,
             truncated=truncated
         )
-        
+    return served
+
+def run_query(spark, job):
+    """Worker-side execution: runs on the query pool under the job's Spark job group"""
+    profile = job.profile = QueryProfile()
+    tables = resolve_tables(spark, job.query)
+    key = None
+    if result_cache.enabled and not job.no_cache:
+        try:
+            key = result_cache_key(job, tables)
+        except Exception as e:
+            logger.warning(f"Could not build cache key, bypassing cache: {e}")
+        if key is not None:
+            cached = result_cache.get(key)
+            if cached is not None:
+                job.cache_hit = True
+                job.engine = "cache"
+                profile.rows_returned = result_row_count(cached)
+                return cached
+
+    if QUERY_FASTPATH_ENABLED:
+        result = run_fast_path(job, tables, profile)
+        if result is not None:
+            if key is not None:
+                result_cache.put(key, result, result_size(result))
+            return result
+
+    job.engine = SPARK_ENGINE
+    logger.info(f"Executing query: {job.query}")
+    if table_cache.enabled:
+        # Cached data of a table written since must not be read
+        table_cache.check_versions(spark, tables)
+    with profile.timed("planning"):
+        # Limit rows to prevent OOM; one extra row detects truncation
+        limited = spark.sql(job.query).limit(QUERY_ROW_LIMIT + 1)
+        # Optimization and physical planning happen here, not in the collect
+        limited._jdf.queryExecution().executedPlan()
+    with profile.timed("execution"):
+        if job.format == "rows":
+            result = collect_rows(limited)
+        else:
+            # Columnar paths: collect record batches via Arrow and skip Row objects
+            result = collect_limited_arrow(limited, QUERY_ROW_LIMIT)
+    profile.rows_returned = result_row_count(result)
+    profile.capture(spark, job.id, limited, tables, QUERY_HISTORY_CAPTURE_PLANS, fast_path.delta_log)
+    if table_cache.enabled:
+        table_cache.record(tables, profile.execution_ms)
+
+    if key is not None:
+        result_cache.put(key, result, result_size(result))
+    return result
+
+def render_result(result, fmt: str, cached: bool = False, engine: Optional[str] = None):
+    """Turn a finished job's result into the HTTP response for `fmt`"""
+    if fmt == "rows":
+        metrics.observe_result(engine, fmt, result.row_count)
+        # Cached objects are shared between requests: copy, never mutate
+        return result.model_copy(update={"cached": cached, "engine": engine})
+
+    table, truncated = result
+    metrics.observe_result(engine, fmt, table.num_rows, table.nbytes)
+    if fmt == "arrow":
+        return StreamingResponse(
+            iter_arrow_stream(table),
+            media_type=ARROW_STREAM_MEDIA_TYPE,
+            headers={
+                "X-Row-Count": str(table.num_rows),
+                "X-Truncated": str(truncated).lower(),
+                "X-Cache": "hit" if cached else "miss",
+                "X-Query-Engine": engine or "",
+            },
+        )
+
+    # model_construct skips validation: re-checking every value in
+    # Python is exactly the per-row cost this path exists to avoid.
+    response = ColumnarQueryResponse.model_construct(
+        success=True,
+        row_count=table.num_rows,
+        truncated=truncated,
+        cached=cached,
+        engine=engine,
+        **to_columnar(table)
+    )
+    return Response(
+        content=response.model_dump_json(),
+        media_type="application/json",
+    )
+
+def failed_result(job) -> QueryResponse:
+    if job.status == CANCELLED:
+        return QueryResponse(success=False, error="Query was cancelled")
+    return QueryResponse(success=False, error=job.error)
+
+@app.post(
+    "/api/query/sql",
+    response_model=QueryResponse,
+    responses={
+        200: {"content": {ARROW_STREAM_MEDIA_TYPE: {}}},
+    },
+)
+async def execute_sql(
+    request: QueryRequest,
+    background_tasks: BackgroundTasks,
+    user: Optional[dict] = Depends(get_current_user),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Execute a Spark SQL query and wait for the result.
+    Send `Accept: application/vnd.apache.arrow.stream` to receive the result as
+    an Arrow IPC stream, or `"format": "columnar"` for column-oriented JSON.
+    Long-running queries should use /api/query/jobs instead.
+    """
+    try:
+        check_query_allowed(request.query, user)
+
+        fmt = "arrow" if wants_arrow(accept) else request.format
+        job = query_jobs.submit(
+            request.query, fmt, user["id"] if user else None,
+            get_spark_session, run_query, no_cache=request.no_cache,
+            pool=scheduler_pool(user)
+        )
+        # Forgotten once it really finishes, not when the client goes away:
+        # a job abandoned by a disconnect still counts for admission control
+        # until its Spark work is done
+        job.future.add_done_callback(lambda _: query_jobs.discard(job.id))
+        await wait_for_job(job)
+
+        if job.status in (FAILED, CANCELLED):
+            return failed_result(job)
+        return render_result(job.result, fmt, cached=job.cache_hit, engine=job.engine)
+
+    except AdmissionRejected as e:
+        raise too_busy(e)
     except Exception as e:
         logger.error(f"Query execution failed: {e}")
         return QueryResponse(
@@ -226,6 +893,508 @@ async def execute_sql(
             error=str(e)
         )
 
+# Query jobs
+def get_job_for_user(job_id: str, user: Optional[dict]):
+    job = query_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Query job not found")
+    if user and user.get("role") != "admin" and job.owner_id != user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to access this query job")
+    return job
+
+@app.post("/api/query/jobs", status_code=202)
+async def submit_query_job(
+    request: QueryRequest,
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """Submit a query for asynchronous execution and return its job id"""
+    check_query_allowed(request.query, user)
+    try:
+        job = query_jobs.submit(
+            request.query, request.format, user["id"] if user else None,
+            get_spark_session, run_query, no_cache=request.no_cache,
+            pool=scheduler_pool(user)
+        )
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    return job.to_dict()
+
+@app.get("/api/query/jobs")
+async def list_query_jobs(user: Optional[dict] = Depends(get_current_user)):
+    """List the caller's query jobs (admins see all)"""
+    owner_id = user["id"] if user and user.get("role") != "admin" else None
+    return {"jobs": [job.to_dict() for job in query_jobs.list(owner_id)]}
+
+@app.get("/api/query/jobs/{job_id}")
+async def get_query_job(job_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """Get job status and Spark task progress"""
+    job = get_job_for_user(job_id, user)
+    status = job.to_dict()
+    status["progress"] = query_jobs.progress(job, _spark_session)
+    return status
+
+@app.get(
+    "/api/query/jobs/{job_id}/result",
+    response_model=QueryResponse,
+    responses={
+        200: {"content": {ARROW_STREAM_MEDIA_TYPE: {}}},
+    },
+)
+async def get_query_job_result(
+    job_id: str,
+    user: Optional[dict] = Depends(get_current_user),
+    accept: Optional[str] = Header(None)
+):
+    """Fetch the result of a finished job in the format it was submitted with"""
+    job = get_job_for_user(job_id, user)
+    if job.status not in FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"Query job is {job.status}")
+    if job.status in (FAILED, CANCELLED):
+        return failed_result(job)
+
+    if job.format == INGEST_JOB_FORMAT:
+        raise HTTPException(status_code=400, detail=f"Ingestion reports are at /api/query/ingest/{job_id}")
+
+    fmt = job.format
+    if fmt != "rows" and wants_arrow(accept):
+        fmt = "arrow"
+    return render_result(job.result, fmt, cached=job.cache_hit, engine=job.engine)
+
+@app.delete("/api/query/jobs/{job_id}")
+async def cancel_query_job(job_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """Cancel a queued or running job; its Spark stages are interrupted"""
+    job = get_job_for_user(job_id, user)
+    query_jobs.cancel(job.id, _spark_session)
+    return job.to_dict()
+
+@app.get("/api/query/admission")
+async def get_admission_stats(user: Optional[dict] = Depends(get_current_user)):
+    """Running/queued queries, admission limits and queue wait percentiles"""
+    stats = query_jobs.admission_stats()
+    if user and user.get("role") != "admin":
+        # Other users' load is not theirs to see
+        stats["users"] = {k: v for k, v in stats["users"].items() if k == str(user["id"])}
+    return stats
+
+# Table statistics
+def get_table_row(table_id: int) -> Dict[str, Any]:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id, name, location, format, owner_id FROM data_tables WHERE id = %s", (table_id,))
+        table = cur.fetchone()
+    finally:
+        conn.close()
+    if not table:
+        raise HTTPException(status_code=404, detail="Table not found")
+    return table
+
+def check_table_owner(table: Dict[str, Any], user: Optional[dict], action: str):
+    if user and user.get("role") != "admin" and table["owner_id"] != user["id"]:
+        raise HTTPException(status_code=403, detail=f"Not authorized to {action} this table")
+
+@app.get("/api/query/stats/{table_id}")
+async def get_table_stats(table_id: int, user: Optional[dict] = Depends(get_current_user)):
+    """Last collected stats of a catalog table"""
+    stats = await run_in_threadpool(table_stats.get, table_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="No statistics collected for this table")
+    return {"stats": stats}
+
+@app.post("/api/query/stats/{table_id}")
+async def collect_table_stats(
+    table_id: int,
+    analyze: bool = Query(default=False, description="Full scan with Spark (adds NDV) instead of reading the Delta log"),
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """
+    Recompute a table's stats now (owner or admin). Without `analyze` they
+    come from the Delta log and no Spark job runs; with it the table is
+    scanned as a query job, subject to admission control.
+    """
+    table = await run_in_threadpool(get_table_row, table_id)
+    check_table_owner(table, user, "analyze")
+
+    if not analyze:
+        try:
+            stats = await run_in_threadpool(table_stats.collect, table)
+        except Exception as e:
+            logger.error(f"Stats collection failed for table {table_id}: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        return {"stats": stats}
+
+    def run_analyze(spark, job):
+        job.engine = SPARK_ENGINE
+        resolve_tables(spark, f"SELECT * FROM {table['name']}")
+        return table_stats.collect(table, spark, table["name"].lower())
+
+    try:
+        job = query_jobs.submit(
+            f"ANALYZE TABLE {table['name']} COMPUTE STATISTICS FOR ALL COLUMNS", "stats",
+            user["id"] if user else None, get_spark_session, run_analyze,
+            pool=scheduler_pool(user)
+        )
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    try:
+        await wait_for_job(job)
+    finally:
+        query_jobs.discard(job.id)
+    if job.status in (FAILED, CANCELLED):
+        raise HTTPException(status_code=500, detail=job.error or "Analyze was cancelled")
+    return {"stats": job.result}
+
+# Ingestion
+INGEST_JOB_FORMAT = "ingest"
+
+def get_table_by_name(database: str, name: str) -> Optional[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, name, location, format, owner_id FROM data_tables WHERE database = %s AND name = %s",
+            (database, name)
+        )
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+@app.post("/api/query/ingest", status_code=202)
+async def ingest_file(
+    request: IngestRequest,
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """
+    Convert an uploaded CSV or JSON-lines file into a Delta table and
+    register it, as a query job. The schema is inferred from a sample;
+    poll /api/query/ingest/{job_id} for progress and the report.
+    """
+    for name in (request.table, request.database):
+        if not TABLE_NAME.match(name):
+            raise HTTPException(status_code=400, detail=f"Invalid table or database name: {name}")
+    fmt = request.format or detect_format(request.path)
+    if fmt not in INGEST_FORMATS:
+        raise HTTPException(status_code=400, detail="Cannot tell the format from the file name; pass format")
+
+    existing = await run_in_threadpool(get_table_by_name, request.database, request.table)
+    location = f"{INGEST_TABLES_LOCATION.rstrip('/')}/{request.database}/{request.table}"
+    if existing:
+        if request.mode == "error":
+            raise HTTPException(status_code=409, detail=f"Table {request.database}.{request.table} already exists")
+        check_table_owner(existing, user, "write to")
+        if (existing["format"] or "delta") != "delta" or not existing["location"]:
+            raise HTTPException(status_code=400, detail="Can only ingest into Delta tables")
+        location = existing["location"]
+
+    spec = IngestSpec(
+        source=f"s3a://{request.bucket}/{request.path.lstrip('/')}",
+        format=fmt,
+        database=request.database,
+        table=request.table,
+        location=location,
+        owner_id=user["id"] if user else None,
+        mode=request.mode,
+        partition_by=request.partition_by,
+        target_file_bytes=request.target_file_mb * 1024 * 1024,
+        sample_rows=request.sample_rows,
+        header=request.header,
+        delimiter=request.delimiter,
+    )
+
+    def run_ingest(spark, job):
+        job.engine = SPARK_ENGINE
+        report = ingest(spark, spec, object_store, get_db_connection)
+        try:
+            report["stats"] = table_stats.collect(report["table"])
+        except Exception as e:
+            # The table is usable; stats catch up on the next refresh
+            logger.error(f"Stats collection failed for ingested table {spec.table}: {e}")
+        return report
+
+    try:
+        job = query_jobs.submit(
+            f"INGEST {spec.source} INTO {spec.database}.{spec.table}", INGEST_JOB_FORMAT,
+            spec.owner_id, get_spark_session, run_ingest, pool=scheduler_pool(user)
+        )
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    status = job.to_dict()
+    status["location"] = location
+    return status
+
+@app.get("/api/query/ingest/{job_id}")
+async def get_ingest_job(job_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """Progress of an ingestion job and, once it succeeded, what was written"""
+    job = get_job_for_user(job_id, user)
+    if job.format != INGEST_JOB_FORMAT:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    status = job.to_dict()
+    status["progress"] = query_jobs.progress(job, _spark_session)
+    status["report"] = job.result if job.status not in (FAILED, CANCELLED) else None
+    return status
+
+# Table maintenance
+@app.get("/api/query/maintenance/runs")
+async def list_maintenance_runs(
+    table_id: Optional[int] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """Recorded OPTIMIZE / VACUUM / checkpoint runs, newest first"""
+    if table_id is None:
+        if user and user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Only admins can list maintenance runs of all tables")
+    else:
+        check_table_owner(await run_in_threadpool(get_table_row, table_id), user, "inspect")
+    try:
+        runs = await run_in_threadpool(table_maintenance.runs, table_id, limit)
+    except Exception as e:
+        logger.error(f"Error listing maintenance runs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"runs": runs}
+
+@app.get("/api/query/maintenance/{table_id}")
+async def get_maintenance_plan(table_id: int, user: Optional[dict] = Depends(get_current_user)):
+    """File layout of a table and the maintenance operations currently due"""
+    table = await run_in_threadpool(get_table_row, table_id)
+    check_table_owner(table, user, "inspect")
+    if (table["format"] or "delta") != "delta":
+        raise HTTPException(status_code=400, detail="Maintenance only applies to Delta tables")
+    try:
+        plan = await run_in_threadpool(table_maintenance.plan, table)
+    except Exception as e:
+        logger.error(f"Error planning maintenance for table {table_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    plan["queued"] = table_id in table_maintenance.pending()
+    return plan
+
+@app.post("/api/query/maintenance/{table_id}", status_code=202)
+async def run_maintenance(
+    table_id: int,
+    operations: Optional[str] = Query(default=None, description=f"Comma-separated: {', '.join(OPERATIONS)}; default: whatever is due"),
+    zorder_by: Optional[str] = Query(default=None, description="Comma-separated columns to Z-order by when optimizing"),
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """
+    Queue maintenance of one table ahead of the regular cycle (owner or
+    admin). It still waits for interactive queries to calm down.
+    """
+    table = await run_in_threadpool(get_table_row, table_id)
+    check_table_owner(table, user, "maintain")
+    if (table["format"] or "delta") != "delta":
+        raise HTTPException(status_code=400, detail="Maintenance only applies to Delta tables")
+    if not MAINTENANCE_ENABLED:
+        raise HTTPException(status_code=409, detail="Table maintenance is disabled")
+    requested = [op.strip() for op in operations.split(",") if op.strip()] if operations else None
+    if requested and any(op not in OPERATIONS for op in requested):
+        raise HTTPException(status_code=400, detail=f"operations must be among: {', '.join(OPERATIONS)}")
+    columns = [c.strip() for c in zorder_by.split(",") if c.strip()] if zorder_by else None
+    table_maintenance.request(table, requested, columns)
+    return {"table_id": table_id, "operations": requested, "zorder_by": columns, "status": "queued"}
+
+# Result cache
+@app.get("/api/query/cache")
+async def get_cache_stats(user: Optional[dict] = Depends(get_current_user)):
+    """Result cache hit/miss/eviction counters and memory usage"""
+    return result_cache.stats()
+
+@app.delete("/api/query/cache")
+async def clear_cache(user: Optional[dict] = Depends(get_current_user)):
+    """Drop every cached result (admin only)"""
+    if user and user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can clear the result cache")
+    result_cache.clear()
+    return {"message": "Result cache cleared"}
+
+# Table cache
+@app.get("/api/query/table-cache")
+async def get_table_cache(user: Optional[dict] = Depends(get_current_user)):
+    """Tables in Spark's cache, access scores and the execution time the cache saved"""
+    return table_cache.stats()
+
+@app.delete("/api/query/table-cache")
+async def clear_table_cache(user: Optional[dict] = Depends(get_current_user)):
+    """Uncache every table until the next rebalance (admin only)"""
+    if user and user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can clear the table cache")
+    await run_in_threadpool(table_cache.uncache_all)
+    return {"message": "Table cache cleared"}
+
+# Query history
+@app.get("/api/query/history")
+async def list_query_history(
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    status: Optional[str] = Query(default=None),
+    order_by: str = Query(default="submitted_at", description=f"One of: {', '.join(HISTORY_ORDER_COLUMNS)}"),
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """
+    Profiles of finished queries, newest first. Order by wall_ms, bytes_read,
+    shuffle_bytes etc. to find the most expensive ones. Non-admins only see
+    their own queries.
+    """
+    if order_by not in HISTORY_ORDER_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"order_by must be one of: {', '.join(HISTORY_ORDER_COLUMNS)}")
+    user_id = user["id"] if user and user.get("role") != "admin" else None
+    try:
+        entries = await run_in_threadpool(query_history.list, user_id, limit, offset, status, order_by)
+    except Exception as e:
+        logger.error(f"Error listing query history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"queries": entries}
+
+@app.get("/api/query/history/{query_id}")
+async def get_query_history(query_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """One query's profile, per-node SQL metrics and EXPLAIN FORMATTED plan"""
+    try:
+        entry = await run_in_threadpool(query_history.get, query_id)
+    except Exception as e:
+        logger.error(f"Error getting query history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not entry:
+        raise HTTPException(status_code=404, detail="Query not found in history")
+    if user and user.get("role") != "admin" and entry["user_id"] != user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to access this query")
+    return entry
+
+# Paginated results
+def check_page_size(size: int):
+    if size < 1 or size > QUERY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Page size must be between 1 and {QUERY_MAX_PAGE_SIZE}")
+
+def get_cursor_for_user(cursor_id: str, user: Optional[dict]):
+    cursor = result_cursors.get(cursor_id)
+    if not cursor:
+        raise HTTPException(status_code=404, detail="Cursor not found or expired")
+    if user and user.get("role") != "admin" and cursor.owner_id != user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to access this cursor")
+    return cursor
+
+def materialize_cursor(spark, job):
+    """Worker-side: run the query once and snapshot the full result"""
+    profile = job.profile = QueryProfile()
+    resolve_tables(spark, job.query)
+    job.engine = SPARK_ENGINE
+    logger.info(f"Materializing query: {job.query}")
+    with profile.timed("planning"):
+        df = spark.sql(job.query)
+    with profile.timed("execution"):
+        cursor = result_cursors.materialize(df, job.query, job.owner_id)
+    profile.rows_returned = cursor.total_rows
+    # The probe and the spill are separate DataFrames: job-level counts only
+    profile.capture(spark, job.id)
+    return cursor
+
+def render_page(cursor, table, offset: int, fmt: str):
+    next_offset = offset + table.num_rows
+    if next_offset >= cursor.total_rows:
+        next_offset = None
+    metrics.observe_result("cursor", fmt, table.num_rows, table.nbytes)
+
+    if fmt == "arrow":
+        return StreamingResponse(
+            iter_arrow_stream(table),
+            media_type=ARROW_STREAM_MEDIA_TYPE,
+            headers={
+                "X-Cursor-Id": cursor.id,
+                "X-Total-Rows": str(cursor.total_rows),
+                "X-Next-Offset": "" if next_offset is None else str(next_offset),
+            },
+        )
+
+    if fmt == "columnar":
+        columnar = to_columnar(table)
+        data, types = columnar["data"], columnar["types"]
+    else:
+        data, types = table.to_pylist(), {}
+
+    page = CursorPageResponse.model_construct(
+        success=True,
+        cursor_id=cursor.id,
+        columns=cursor.schema.names,
+        types=types,
+        data=data,
+        offset=offset,
+        row_count=table.num_rows,
+        total_rows=cursor.total_rows,
+        next_offset=next_offset,
+        storage=cursor.storage,
+        expires_at=cursor.expires_at,
+    )
+    return Response(content=page.model_dump_json(), media_type="application/json")
+
+@app.post(
+    "/api/query/cursors",
+    response_model=CursorPageResponse,
+    responses={
+        200: {"content": {ARROW_STREAM_MEDIA_TYPE: {}}},
+    },
+)
+async def create_cursor(
+    request: CursorRequest,
+    user: Optional[dict] = Depends(get_current_user),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Run a query once, snapshot its full result and return the first page.
+    Further pages come from GET /api/query/cursors/{cursor_id} without
+    re-running the query. Not subject to QUERY_ROW_LIMIT; 429 while
+    QUERY_MAX_CURSORS cursors are open.
+    """
+    check_query_allowed(request.query, user)
+    check_page_size(request.page_size)
+
+    try:
+        with result_cursors.reserved():
+            job = query_jobs.submit(
+                request.query, "cursor", user["id"] if user else None,
+                get_spark_session, materialize_cursor, pool=scheduler_pool(user)
+            )
+            try:
+                await wait_for_job(job)
+            finally:
+                query_jobs.discard(job.id)
+    except (AdmissionRejected, CursorLimitReached) as e:
+        raise too_busy(e)
+    if job.status in (FAILED, CANCELLED):
+        return CursorPageResponse(success=False, error=job.error or "Query was cancelled")
+
+    cursor = job.result
+    table = await run_in_threadpool(result_cursors.page, cursor, 0, request.page_size)
+    fmt = "arrow" if wants_arrow(accept) else request.format
+    return render_page(cursor, table, 0, fmt)
+
+@app.get(
+    "/api/query/cursors/{cursor_id}",
+    response_model=CursorPageResponse,
+    responses={
+        200: {"content": {ARROW_STREAM_MEDIA_TYPE: {}}},
+    },
+)
+async def fetch_cursor_page(
+    cursor_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=QUERY_ROW_LIMIT),
+    format: Literal["rows", "columnar"] = Query(default="rows"),
+    user: Optional[dict] = Depends(get_current_user),
+    accept: Optional[str] = Header(None)
+):
+    """Fetch rows [offset, offset + limit) from a cursor's snapshot"""
+    check_page_size(limit)
+    cursor = get_cursor_for_user(cursor_id, user)
+    # Spilled pages are read from object storage: keep that off the event loop
+    table = await run_in_threadpool(result_cursors.page, cursor, offset, limit)
+    fmt = "arrow" if wants_arrow(accept) else format
+    return render_page(cursor, table, offset, fmt)
+
+@app.delete("/api/query/cursors/{cursor_id}")
+async def close_cursor(cursor_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """Release a cursor and any spilled result files before its TTL"""
+    cursor = get_cursor_for_user(cursor_id, user)
+    await run_in_threadpool(result_cursors.close, cursor.id)
+    return {"message": f"Cursor '{cursor.id}' closed"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8003)
@@ -0,0 +1,240 @@
+"""
+Table statistics for the data catalog.
+Row counts, sizes, file counts and per-column min/max/null counts are
+derived from the Delta log (add-file stats) without running a Spark job.
+An "analyze" pass scans the table with Spark instead, which also yields
+approximate distinct counts (NDV). Results are stored in 'table_stats'.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2.extras import Json
+from pyspark.sql import functions as F
+
+from .fastpath import DeltaLogReader, TableSnapshot, coerce_value
+
+logger = logging.getLogger(__name__)
+
+DELTA_LOG_SOURCE = "delta_log"
+ANALYZE_SOURCE = "analyze"
+
+
+def delta_log_stats(snapshot: TableSnapshot) -> Dict[str, Any]:
+    """Aggregate the per-file stats of a Delta snapshot into table stats"""
+    row_count: Optional[int] = 0
+    size = 0
+    columns: Dict[str, Dict[str, Any]] = {}
+    for data_file in snapshot.files:
+        size += data_file.size
+        stats = data_file.stats or {}
+        if row_count is not None:
+            # One file without stats makes the total unknown
+            row_count = row_count + stats["numRecords"] if "numRecords" in stats else None
+        for name, value in (stats.get("minValues") or {}).items():
+            _merge(columns, name, "min", value, min)
+        for name, value in (stats.get("maxValues") or {}).items():
+            _merge(columns, name, "max", value, max)
+        for name, value in (stats.get("nullCount") or {}).items():
+            if isinstance(value, int):
+                _merge(columns, name, "null_count", value, lambda a, b: a + b)
+
+    for name in snapshot.partition_columns:
+        columns[name] = _partition_stats(snapshot, name)
+
+    return {
+        "table_version": snapshot.version,
+        "row_count": row_count,
+        "size_bytes": size,
+        "file_count": len(snapshot.files),
+        "column_stats": columns,
+        "source": DELTA_LOG_SOURCE,
+    }
+
+
+def _partition_stats(snapshot: TableSnapshot, name: str) -> Dict[str, Any]:
+    """Partition values are exact per file, so NDV is known too"""
+    arrow_type = snapshot.columns.get(name)
+    values = set()
+    null_count: Optional[int] = 0
+    for data_file in snapshot.files:
+        raw = data_file.partition_values.get(name)
+        if raw is not None:
+            values.add(coerce_value(raw, arrow_type).as_py() if arrow_type is not None else raw)
+        elif null_count is not None:
+            records = (data_file.stats or {}).get("numRecords")
+            null_count = null_count + records if records is not None else None
+    return {
+        "ndv": len(values),
+        "min": _jsonable(min(values)) if values else None,
+        "max": _jsonable(max(values)) if values else None,
+        "null_count": null_count,
+    }
+
+
+def _merge(columns: Dict[str, Dict[str, Any]], name: str, key: str, value: Any, combine: Callable):
+    # Nested columns have nested stats; only top-level ones are kept
+    if isinstance(value, dict) or value is None:
+        return
+    column = columns.setdefault(name, {})
+    try:
+        column[key] = value if key not in column else combine(column[key], value)
+    except TypeError:
+        # Mixed value types across files (e.g. after a type change)
+        column.pop(key, None)
+
+
+def analyze_stats(spark, view: str) -> Dict[str, Any]:
+    """
+    Stats from a full scan of `view`: one aggregation computing count(*) and,
+    per column, approx_count_distinct, min, max and null count.
+    """
+    df = spark.table(view)
+    names = [f.name for f in df.schema.fields if _comparable(f.dataType.typeName())]
+    aggregates = [F.count(F.lit(1)).alias("__rows")]
+    for i, name in enumerate(names):
+        column = F.col(f"`{name}`")
+        aggregates += [
+            F.approx_count_distinct(column).alias(f"ndv_{i}"),
+            F.min(column).alias(f"min_{i}"),
+            F.max(column).alias(f"max_{i}"),
+            F.count(column).alias(f"count_{i}"),
+        ]
+    row = df.agg(*aggregates).first()
+    row_count = row["__rows"]
+    columns = {}
+    for i, name in enumerate(names):
+        columns[name] = {
+            "ndv": row[f"ndv_{i}"],
+            "min": _jsonable(row[f"min_{i}"]),
+            "max": _jsonable(row[f"max_{i}"]),
+            "null_count": row_count - row[f"count_{i}"],
+        }
+    return {"row_count": row_count, "column_stats": columns, "source": ANALYZE_SOURCE}
+
+
+def _comparable(type_name: str) -> bool:
+    return type_name not in ("struct", "array", "map", "binary")
+
+
+def _jsonable(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class TableStatsCollector:
+    """
+    Computes and persists stats for 'data_tables' entries. Refreshes run on
+    one background thread so they never compete with query workers for
+    more than a single core.
+    """
+
+    def __init__(self, connect: Callable, delta_log: DeltaLogReader, max_age: int):
+        self.connect = connect
+        self.delta_log = delta_log
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="table-stats")
+        self._scheduled = set()
+        self._lock = threading.Lock()
+
+    def collect(self, table: Dict, spark=None, view: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Compute stats for a data_tables row and store them. With `spark` and
+        a registered `view`, the table is analyzed with a full scan; otherwise
+        stats come from the Delta log.
+        """
+        stats: Dict[str, Any] = {}
+        if (table["format"] or "delta") == "delta":
+            snapshot = self.delta_log.snapshot(table["location"])
+            if snapshot is not None:
+                stats = delta_log_stats(snapshot)
+        if spark is not None and view is not None:
+            analyzed = analyze_stats(spark, view)
+            # Exact scan results win; sizes and file counts stay from the log
+            for name, column in analyzed.pop("column_stats").items():
+                stats.setdefault("column_stats", {}).setdefault(name, {}).update(column)
+            stats.update(analyzed)
+        if not stats:
+            raise ValueError(f"No statistics available for table '{table['name']}' without analyze")
+        self._save(table["id"], stats)
+        return stats
+
+    def schedule(self, tables: List[Dict]):
+        """Refresh log-derived stats for `tables` in the background"""
+        for table in tables:
+            with self._lock:
+                if table["id"] in self._scheduled:
+                    continue
+                self._scheduled.add(table["id"])
+            self._executor.submit(self._refresh, table)
+
+    def refresh_stale(self):
+        """Queue a refresh of every Delta table whose stats are missing or old"""
+        rows = self._fetch(
+            """
+            SELECT t.id, t.name, t.location, t.format FROM data_tables t
+            LEFT JOIN table_stats s ON s.table_id = t.id
+            WHERE COALESCE(t.format, 'delta') = 'delta'
+              AND (s.computed_at IS NULL OR s.computed_at < NOW() - make_interval(secs => %s)
+                   OR s.computed_at < t.updated_at)
+            """,
+            (self.max_age,)
+        )
+        self.schedule(rows)
+        return len(rows)
+
+    def get(self, table_id: int) -> Optional[Dict]:
+        rows = self._fetch("SELECT * FROM table_stats WHERE table_id = %s", (table_id,))
+        return rows[0] if rows else None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _refresh(self, table: Dict):
+        started = time.perf_counter()
+        try:
+            self.collect(table)
+            logger.info(f"Refreshed stats for '{table['name']}' in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logger.warning(f"Could not refresh stats for '{table['name']}': {e}")
+        finally:
+            with self._lock:
+                self._scheduled.discard(table["id"])
+
+    def _fetch(self, query: str, params: tuple) -> List[Dict]:
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def _save(self, table_id: int, stats: Dict[str, Any]):
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO table_stats
+                    (table_id, table_version, row_count, size_bytes, file_count, column_stats, source, computed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+                ON CONFLICT (table_id) DO UPDATE SET
+                    table_version = EXCLUDED.table_version,
+                    row_count = EXCLUDED.row_count,
+                    size_bytes = EXCLUDED.size_bytes,
+                    file_count = EXCLUDED.file_count,
+                    column_stats = EXCLUDED.column_stats,
+                    source = EXCLUDED.source,
+                    computed_at = EXCLUDED.computed_at
+                """,
+                (table_id, stats.get("table_version"), stats.get("row_count"), stats.get("size_bytes"),
+                 stats.get("file_count"), Json(stats.get("column_stats") or {}), stats["source"])
+            )
+            conn.commit()
+        finally:
+            conn.close()
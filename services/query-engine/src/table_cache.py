@@ -0,0 +1,312 @@
+"""
+Spark in-memory caching of the most used catalog tables.
+Every query Spark executes counts as an access to the catalog tables it
+references. Counts decay with a half-life, so a table's score reflects both
+how often and how recently it was read. Every interval the highest scoring
+tables are cached with CACHE TABLE until the memory budget is used, and
+cached tables that fell out of that set are uncached. A cached table whose
+Delta version advanced is uncached before the next query reads it, so
+queries never see stale data from memory. Queries answered by the fast path
+or the result cache do not touch Spark's cache and are not counted.
+"""
+
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .fastpath import DeltaLogReader
+from .maintenance import MAINTENANCE_POOL
+
+logger = logging.getLogger(__name__)
+
+# Name Spark gives the RDD behind CACHE TABLE <name>
+_RDD_NAME_PREFIX = "In-memory table "
+
+# Entries of tables not cached and scoring below this are forgotten
+_FORGET_SCORE = 0.01
+
+
+@dataclass
+class TableUsage:
+    name: str
+    location: str
+    score: float = 0.0
+    accesses: int = 0
+    last_access: float = 0.0
+    cached: bool = False
+    cached_version: Optional[int] = None
+    cached_at: Optional[float] = None
+    # Measured once cached, estimated from the Parquet files before
+    memory_bytes: Optional[int] = None
+    # Spark executions of queries on the table while cached / not cached
+    hits: int = 0
+    hit_ms: float = 0.0
+    misses: int = 0
+    miss_ms: float = 0.0
+
+    def decayed_score(self, now: float, half_life: float) -> float:
+        return self.score * 0.5 ** ((now - self.last_access) / half_life)
+
+    def to_dict(self, now: float, half_life: float) -> Dict[str, Any]:
+        avg_hit = self.hit_ms / self.hits if self.hits else None
+        avg_miss = self.miss_ms / self.misses if self.misses else None
+        saved = None
+        if avg_hit is not None and avg_miss is not None:
+            saved = round(max(avg_miss - avg_hit, 0) * self.hits, 1)
+        return {
+            "name": self.name,
+            "location": self.location,
+            "score": round(self.decayed_score(now, half_life), 3),
+            "accesses": self.accesses,
+            "last_access": self.last_access,
+            "cached": self.cached,
+            "cached_version": self.cached_version,
+            "cached_at": self.cached_at,
+            "memory_bytes": self.memory_bytes,
+            "hits": self.hits,
+            "avg_hit_ms": round(avg_hit, 1) if avg_hit is not None else None,
+            "misses": self.misses,
+            "avg_miss_ms": round(avg_miss, 1) if avg_miss is not None else None,
+            # Execution time saved by the cache, estimated from the averages
+            "estimated_saved_ms": saved,
+        }
+
+
+class TableCacheManager(threading.Thread):
+    """
+    Keeps the hottest catalog tables in Spark's cache within `max_bytes`.
+    Tables scoring below `min_score` are never cached. Before a table is
+    first cached its in-memory size is estimated as `memory_factor` times
+    its Parquet size; the size Spark reports is used from then on.
+    `get_spark()` returns the session or None; new tables are not loaded
+    while `is_busy()`.
+    """
+
+    def __init__(self, delta_log: DeltaLogReader, get_spark: Callable, is_busy: Callable[[], bool],
+                 max_bytes: int, interval: int, half_life: float, min_score: float, memory_factor: float):
+        super().__init__(name="table-cache", daemon=True)
+        self.delta_log = delta_log
+        self.get_spark = get_spark
+        self.is_busy = is_busy
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.half_life = half_life
+        self.min_score = min_score
+        self.memory_factor = memory_factor
+        self._tables: Dict[str, TableUsage] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.loads = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.last_rebalance: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def record(self, tables: Dict[str, Dict[str, str]], execution_ms: Optional[float]):
+        """Count a Spark execution of a query on `tables` (name -> location/format)"""
+        now = time.time()
+        with self._lock:
+            for name, table in tables.items():
+                if table["format"] != "delta":
+                    continue
+                usage = self._tables.get(name)
+                if usage is None or usage.location != table["location"]:
+                    usage = self._tables[name] = TableUsage(name, table["location"])
+                usage.score = usage.decayed_score(now, self.half_life) + 1
+                usage.last_access = now
+                usage.accesses += 1
+                if execution_ms is None:
+                    continue
+                if usage.cached:
+                    usage.hits += 1
+                    usage.hit_ms += execution_ms
+                else:
+                    usage.misses += 1
+                    usage.miss_ms += execution_ms
+
+    def check_versions(self, spark, tables: Iterable[str]):
+        """Uncache any of `tables` whose Delta version moved past the cached one"""
+        with self._lock:
+            usages = [self._tables.get(name) for name in tables]
+            cached = [(u.name, u.location, u.cached_version) for u in usages if u is not None and u.cached]
+        for name, location, version in cached:
+            try:
+                current = self._version(location)
+            except Exception as e:
+                logger.warning(f"Could not read the Delta version of '{name}': {e}")
+                current = None
+            if current is None or current != version:
+                logger.info(f"Table '{name}' changed (version {version} -> {current}); uncaching")
+                self._uncache(spark, name)
+                with self._lock:
+                    self.invalidations += 1
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.rebalance()
+            except Exception as e:
+                logger.error(f"Table cache rebalance failed: {e}")
+
+    def rebalance(self):
+        """Cache the highest scoring tables that fit the budget and uncache the rest"""
+        spark = self.get_spark()
+        if spark is None:
+            return
+        now = time.time()
+        with self._lock:
+            for name in [n for n, u in self._tables.items()
+                         if not u.cached and u.decayed_score(now, self.half_life) < _FORGET_SCORE]:
+                del self._tables[name]
+            usages = sorted(self._tables.values(), key=lambda u: u.decayed_score(now, self.half_life), reverse=True)
+            cached = [u.name for u in usages if u.cached]
+
+        # Views replaced or dropped by the catalog lose their cached data too
+        for name in cached:
+            if not _is_cached(spark, name):
+                self._mark_uncached(name)
+        self.check_versions(spark, cached)
+
+        wanted: List[Tuple[TableUsage, int]] = []
+        budget = self.max_bytes
+        for usage in usages:
+            if usage.decayed_score(now, self.half_life) < self.min_score:
+                break
+            size = self._estimate(usage)
+            if size is not None and size <= budget:
+                wanted.append((usage, size))
+                budget -= size
+        wanted_names = {usage.name for usage, _ in wanted}
+
+        for usage in usages:
+            if usage.cached and usage.name not in wanted_names:
+                logger.info(f"Uncaching '{usage.name}': no longer among the hottest tables")
+                self._uncache(spark, usage.name)
+                with self._lock:
+                    self.evictions += 1
+        for usage, _ in wanted:
+            if usage.cached:
+                continue
+            if self.is_busy():
+                logger.info("Interactive queries are busy; loading tables into the cache next time")
+                break
+            self._load(spark, usage)
+
+        sizes = _memory_sizes(spark)
+        with self._lock:
+            for usage in self._tables.values():
+                if usage.cached and usage.name in sizes:
+                    usage.memory_bytes = sizes[usage.name]
+            self.last_rebalance = time.time()
+
+    def uncache_all(self):
+        spark = self.get_spark()
+        with self._lock:
+            cached = [u.name for u in self._tables.values() if u.cached]
+        for name in cached:
+            if spark is not None:
+                self._uncache(spark, name)
+            else:
+                self._mark_uncached(name)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            tables = sorted((u.to_dict(now, self.half_life) for u in self._tables.values()),
+                            key=lambda t: t["score"], reverse=True)
+            return {
+                "enabled": self.enabled,
+                "max_bytes": self.max_bytes,
+                "cached_bytes": sum(t["memory_bytes"] or 0 for t in tables if t["cached"]),
+                "cached_tables": sum(1 for t in tables if t["cached"]),
+                "hits": sum(t["hits"] for t in tables),
+                "estimated_saved_ms": round(sum(t["estimated_saved_ms"] or 0 for t in tables), 1),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "last_rebalance": self.last_rebalance,
+                "tables": tables,
+            }
+
+    def _estimate(self, usage: TableUsage) -> Optional[int]:
+        if usage.memory_bytes is not None:
+            # Measured the last time it was cached
+            return usage.memory_bytes
+        try:
+            snapshot = self.delta_log.snapshot(usage.location)
+        except Exception as e:
+            logger.warning(f"Could not read the Delta log of '{usage.name}': {e}")
+            return None
+        if snapshot is None:
+            return None
+        return int(sum(f.size for f in snapshot.files) * self.memory_factor)
+
+    def _version(self, location: str) -> Optional[int]:
+        snapshot = self.delta_log.snapshot(location)
+        return snapshot.version if snapshot else None
+
+    def _load(self, spark, usage: TableUsage):
+        try:
+            version = self._version(usage.location)
+        except Exception as e:
+            logger.warning(f"Could not read the Delta version of '{usage.name}': {e}")
+            return
+        sc = spark.sparkContext
+        sc.setJobGroup(f"table-cache-{usage.name}", f"CACHE TABLE {usage.name}", interruptOnCancel=True)
+        sc.setLocalProperty("spark.scheduler.pool", MAINTENANCE_POOL)
+        started = time.perf_counter()
+        try:
+            spark.sql(f"CACHE TABLE {usage.name}")
+        except Exception as e:
+            logger.error(f"Failed to cache table '{usage.name}': {e}")
+            return
+        finally:
+            sc.setLocalProperty("spark.jobGroup.id", None)
+            sc.setLocalProperty("spark.scheduler.pool", None)
+        logger.info(f"Cached table '{usage.name}' (version {version}) in {time.perf_counter() - started:.1f}s")
+        with self._lock:
+            usage.cached = True
+            usage.cached_version = version
+            usage.cached_at = time.time()
+            self.loads += 1
+
+    def _uncache(self, spark, name: str):
+        try:
+            spark.sql(f"UNCACHE TABLE IF EXISTS {name}")
+        except Exception as e:
+            logger.error(f"Failed to uncache table '{name}': {e}")
+        self._mark_uncached(name)
+
+    def _mark_uncached(self, name: str):
+        with self._lock:
+            usage = self._tables.get(name)
+            if usage is not None:
+                usage.cached = False
+                usage.cached_version = None
+                usage.cached_at = None
+
+
+def _is_cached(spark, name: str) -> bool:
+    try:
+        return spark.catalog.isCached(name)
+    except Exception:
+        # The view is gone
+        return False
+
+
+def _memory_sizes(spark) -> Dict[str, int]:
+    """Bytes held in executor memory per cached table name"""
+    sizes = {}
+    for info in spark.sparkContext._jsc.sc().getRDDStorageInfo():
+        rdd_name = info.name()
+        if rdd_name.startswith(_RDD_NAME_PREFIX):
+            sizes[rdd_name[len(_RDD_NAME_PREFIX):].strip("`").lower()] = info.memSize()
+    return sizes
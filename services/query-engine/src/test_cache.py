@@ -0,0 +1,81 @@
+from src.cache import ResultCache, is_cacheable, normalize_sql, referenced_identifiers, table_references
+
+
+def test_normalize_sql_collapses_whitespace_comments_and_case():
+    query = """
+        SELECT  Id, Name  -- the columns
+        FROM /* catalog */ Sales
+        WHERE region = 'EU' ;
+    """
+    assert normalize_sql(query) == "select id, name from sales where region = 'EU'"
+
+
+def test_normalize_sql_keeps_literals_verbatim():
+    # Literals differing only in case or spacing are different queries
+    assert normalize_sql("select * from t where a = 'X  y'") != normalize_sql("select * from t where a = 'x y'")
+    assert normalize_sql("SELECT '--not a comment' FROM t") == "select '--not a comment' from t"
+    assert normalize_sql("select 'it''s' from t") == "select 'it''s' from t"
+
+
+def test_normalize_sql_equal_for_equivalent_spellings():
+    assert normalize_sql("select a from t;") == normalize_sql("SELECT a\n\tFROM T")
+
+
+def test_referenced_identifiers_include_quoted_names_but_not_literals():
+    names = referenced_identifiers(normalize_sql("SELECT x FROM `My``Table` WHERE y = 'orders'"))
+    assert {"select", "x", "from", "my`table", "where", "y"} == names
+
+
+def test_is_cacheable():
+    def cacheable(query):
+        normalized = normalize_sql(query)
+        return is_cacheable(normalized, referenced_identifiers(normalized))
+
+    assert cacheable("SELECT * FROM sales")
+    assert cacheable("WITH s AS (SELECT 1) SELECT * FROM s")
+    assert not cacheable("INSERT INTO sales VALUES (1)")
+    assert not cacheable("SELECT rand() FROM sales")
+    assert not cacheable("SELECT * FROM sales WHERE ts < current_timestamp()")
+    # Only a string: not a call
+    assert cacheable("SELECT * FROM sales WHERE note = 'rand'")
+
+
+def test_table_references():
+    def refs(query):
+        return table_references(normalize_sql(query))
+
+    assert refs("SELECT * FROM Sales") == {"sales"}
+    assert refs("SELECT s.id FROM sales AS s JOIN dim d ON s.id = d.id LEFT JOIN `Region` r ON 1 = 1") == {
+        "sales", "dim", "region"
+    }
+    assert refs("SELECT * FROM sales s, dim, region WHERE s.id = dim.id") == {"sales", "dim", "region"}
+    assert refs("SELECT * FROM delta.`s3a://data/raw/events` e") == {"delta.s3a://data/raw/events"}
+    assert refs("SELECT * FROM db.sales") == {"db.sales"}
+    assert refs("WITH a AS (SELECT * FROM sales), b AS (SELECT * FROM a) SELECT * FROM b") == {"sales"}
+    assert refs("SELECT * FROM (SELECT id FROM sales) t") == {"sales"}
+    assert refs("SELECT * FROM range(10)") == {"range()"}
+    # Columns and literals are not table references
+    assert refs("SELECT id, 'from x' FROM sales WHERE region = 'EU'") == {"sales"}
+
+def test_result_cache_evicts_least_recently_used_within_budget():
+    cache = ResultCache(max_bytes=100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"
+    cache.put("c", "C", 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_result_cache_skips_entries_over_budget_and_disabled_cache():
+    cache = ResultCache(max_bytes=10)
+    cache.put("big", "X", 11)
+    assert cache.get("big") is None
+
+    disabled = ResultCache(max_bytes=0)
+    assert not disabled.enabled
+    disabled.put("a", "A", 1)
+    assert disabled.get("a") is None
@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from src.catalog import TableResolver
+
+ROW = {"id": 1, "name": "Sales", "location": "s3a://data/sales", "format": "delta",
+       "updated_at": datetime(2024, 5, 1)}
+
+
+def make_resolver(rows, delay=0.0, on_lookup=None):
+    """Resolver over a fake catalog; returns it and the list of looked-up name batches"""
+    lookups = []
+
+    def connect():
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        wanted = []
+
+        def execute(query, params):
+            wanted[:] = sorted(params[0])
+            lookups.append(list(wanted))
+            if on_lookup:
+                on_lookup(wanted)
+            time.sleep(delay)
+        cursor.execute.side_effect = execute
+        cursor.fetchall.side_effect = lambda: [r for r in rows if r["name"].lower() in wanted]
+        return conn
+
+    return TableResolver(connect, ttl=300, negative_ttl=30), lookups
+
+
+def test_resolve_registers_tables_and_caches_negatives():
+    resolver, lookups = make_resolver([ROW])
+    spark = MagicMock()
+
+    assert resolver.resolve(spark, {"sales", "region"}) == {
+        "sales": {"location": "s3a://data/sales", "format": "delta"}
+    }
+    assert resolver.resolve(spark, {"sales", "region"}) == {
+        "sales": {"location": "s3a://data/sales", "format": "delta"}
+    }
+    assert lookups == [["region", "sales"]]
+    spark.sql.assert_called_once()
+    assert "CREATE OR REPLACE TEMP VIEW Sales" in spark.sql.call_args[0][0]
+
+
+def test_concurrent_resolves_look_up_a_name_once():
+    resolver, lookups = make_resolver([ROW], delay=0.2)
+    spark = MagicMock()
+    results = []
+
+    def run():
+        results.append(resolver.resolve(spark, {"sales"}))
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert lookups == [["sales"]]
+    assert spark.sql.call_count == 1
+    assert all("sales" in r for r in results)
+
+
+def test_other_names_resolve_while_a_lookup_is_in_flight():
+    other = dict(ROW, id=2, name="orders", location="s3a://data/orders")
+    sales_started = threading.Event()
+    release_sales = threading.Event()
+
+    def on_lookup(names):
+        if names == ["sales"]:
+            sales_started.set()
+            release_sales.wait(5)
+
+    resolver, lookups = make_resolver([ROW, other], on_lookup=on_lookup)
+    spark = MagicMock()
+
+    slow = threading.Thread(target=resolver.resolve, args=(spark, {"sales"}))
+    slow.start()
+    assert sales_started.wait(5)
+    resolved = resolver.resolve(spark, {"orders"})
+
+    # The first lookup is still blocked: they did not queue behind one lock
+    assert slow.is_alive()
+    release_sales.set()
+    slow.join(5)
+    assert resolved == {"orders": {"location": "s3a://data/orders", "format": "delta"}}
+    assert sorted(lookups) == [["orders"], ["sales"]]
+
+
+def test_invalidate_forces_a_new_lookup():
+    resolver, lookups = make_resolver([ROW])
+    spark = MagicMock()
+
+    resolver.resolve(spark, {"sales"})
+    resolver.invalidate(["Sales"])
+    resolver.resolve(spark, {"sales"})
+
+    assert lookups == [["sales"], ["sales"]]
+    # Unchanged row: the view is not registered again
+    spark.sql.assert_called_once()
@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock
+
+import pyarrow as pa
+import pytest
+
+from src.cursors import CursorLimitReached, CursorManager
+
+
+def make_df(rows):
+    df = MagicMock()
+    df.persist.return_value = df
+    df.limit.return_value._collect_as_arrow.return_value = pa.table({"x": rows}).to_batches()
+    return df
+
+
+def make_manager(**kwargs):
+    filesystem = MagicMock()
+    filesystem.get_file_info.return_value = []
+    return CursorManager(60, 100, "s3a://bucket/results", filesystem, **kwargs)
+
+
+def test_reserved_rejects_past_max_cursors():
+    manager = make_manager(max_cursors=2)
+    manager.materialize(make_df([1]), "SELECT 1", 1)
+
+    with manager.reserved():
+        with pytest.raises(CursorLimitReached) as rejected:
+            with manager.reserved():
+                pass
+    # The slot is free again once materializing finished
+    with manager.reserved():
+        pass
+
+    assert 1 <= rejected.value.retry_after <= 60
+    assert manager.stats()["rejected"] == 1
+
+
+def test_results_past_the_memory_budget_are_spilled():
+    first = pa.table({"x": list(range(10))})
+    manager = make_manager(max_memory_bytes=first.nbytes)
+
+    kept = manager.materialize(make_df(list(range(10))), "SELECT 1", 1)
+    spilled = manager.materialize(make_df(list(range(10))), "SELECT 2", 1)
+
+    assert (kept.storage, spilled.storage) == ("memory", "parquet")
+    assert manager.stats()["memory_bytes"] == first.nbytes
+    manager.close(kept.id)
+    assert manager.stats()["memory_bytes"] == 0
@@ -0,0 +1,157 @@
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from pyarrow import fs as pafs
+
+from src.fastpath import DeltaLogReader, Predicate, SimpleScan, parse_simple_scan
+
+SCHEMA = {"type": "struct", "fields": [
+    {"name": "id", "type": "long", "nullable": True, "metadata": {}},
+    {"name": "region", "type": "string", "nullable": True, "metadata": {}},
+]}
+
+
+def test_parse_select_star_with_limit():
+    assert parse_simple_scan("SELECT * FROM Sales LIMIT 10;") == SimpleScan("sales", None, [], 10)
+
+
+def test_parse_columns_and_predicates():
+    scan = parse_simple_scan(
+        "select Id, `Region` from sales where id >= 5 and region = 'EU' and note is not null"
+    )
+    assert scan == SimpleScan("sales", ["id", "region"], [
+        Predicate("id", ">=", 5),
+        Predicate("region", "=", "EU"),
+        Predicate("note", "not_null"),
+    ], None)
+
+
+def test_parse_literal_types():
+    scan = parse_simple_scan("SELECT * FROM t WHERE a = -1.5 AND b <> true AND c IS NULL")
+    assert scan.predicates == [Predicate("a", "=", -1.5), Predicate("b", "<>", True), Predicate("c", "is_null")]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT a FROM t JOIN u ON t.id = u.id",
+    "SELECT count(*) FROM t",
+    "SELECT a FROM t WHERE a = 1 OR b = 2",
+    "SELECT a FROM t WHERE a = b",
+    "SELECT a FROM t WHERE a = NULL",
+    "SELECT a FROM t ORDER BY a",
+    "SELECT DISTINCT a FROM t",
+    "SELECT a FROM db.t",
+    "SELECT a FROM t LIMIT 1.5",
+    "SELECT a FROM t; DROP TABLE t",
+    "WITH s AS (SELECT 1) SELECT * FROM s",
+    "INSERT INTO t VALUES (1)",
+    # Spark reads adjacent literals as one ('it''s' is 'its'), not as an escape
+    "SELECT a FROM t WHERE b = 'it''s'",
+    "SELECT a FROM t WHERE b = 'it' 's'",
+])
+def test_parse_rejects_anything_but_a_simple_scan(query):
+    assert parse_simple_scan(query) is None
+
+
+def write_commit(log_dir, version, *actions):
+    with open(log_dir / f"{version:020d}.json", "w") as f:
+        for action in actions:
+            f.write(json.dumps(action) + "\n")
+
+
+def add(path, size, **stats):
+    return {"add": {"path": path, "size": size, "partitionValues": {}, "dataChange": True,
+                    "stats": json.dumps(stats) if stats else None}}
+
+
+@pytest.fixture
+def table(tmp_path):
+    log_dir = tmp_path / "sales" / "_delta_log"
+    log_dir.mkdir(parents=True)
+    write_commit(log_dir, 0,
+                 {"protocol": {"minReaderVersion": 1, "minWriterVersion": 2}},
+                 {"metaData": {"id": "x", "schemaString": json.dumps(SCHEMA), "partitionColumns": []}},
+                 add("part-0.parquet", 100, numRecords=10))
+    return f"file://{tmp_path}/sales", log_dir
+
+
+def test_delta_log_snapshot_rolls_forward(table):
+    location, log_dir = table
+    reader = DeltaLogReader(pafs.LocalFileSystem())
+
+    snapshot = reader.snapshot(location)
+    assert snapshot.version == 0
+    assert snapshot.columns == {"id": pa.int64(), "region": pa.string()}
+    assert [f.size for f in snapshot.files] == [100]
+    assert snapshot.files[0].stats == {"numRecords": 10}
+
+    write_commit(log_dir, 1, {"remove": {"path": "part-0.parquet"}}, add("part-1.parquet", 200))
+    snapshot = reader.snapshot(location)
+    assert snapshot.version == 1
+    assert [f.path.rsplit("/", 1)[-1] for f in snapshot.files] == ["part-1.parquet"]
+    assert reader.version(location) == 1
+
+
+CHECKPOINT_SCHEMA = pa.schema([
+    ("add", pa.struct([("path", pa.string()), ("size", pa.int64()),
+                       ("partitionValues", pa.map_(pa.string(), pa.string())),
+                       ("dataChange", pa.bool_()), ("stats", pa.string())])),
+    ("remove", pa.struct([("path", pa.string())])),
+    ("metaData", pa.struct([("id", pa.string()), ("schemaString", pa.string()),
+                            ("partitionColumns", pa.list_(pa.string()))])),
+    ("protocol", pa.struct([("minReaderVersion", pa.int32()), ("minWriterVersion", pa.int32())])),
+])
+
+
+def write_checkpoint(log_dir, version, *actions):
+    rows = [{"add": None, "remove": None, "metaData": None, "protocol": None, **a} for a in actions]
+    pq.write_table(pa.Table.from_pylist(rows, schema=CHECKPOINT_SCHEMA),
+                   log_dir / f"{version:020d}.checkpoint.parquet")
+
+
+def test_delta_log_rebuilds_from_checkpoint_after_log_cleanup(table):
+    location, log_dir = table
+    reader = DeltaLogReader(pafs.LocalFileSystem())
+    assert reader.snapshot(location).version == 0
+
+    for version in range(1, 12):
+        write_commit(log_dir, version, add(f"part-{version}.parquet", version))
+    write_checkpoint(
+        log_dir, 10,
+        {"protocol": {"minReaderVersion": 1, "minWriterVersion": 2}},
+        {"metaData": {"id": "x", "schemaString": json.dumps(SCHEMA), "partitionColumns": []}},
+        *[{"add": {"path": f"part-{v}.parquet", "size": v, "partitionValues": [], "dataChange": True,
+                   "stats": None}} for v in range(0, 11)],
+    )
+    # Cleanup drops the commits the checkpoint covers
+    for version in range(0, 10):
+        (log_dir / f"{version:020d}.json").unlink()
+
+    snapshot = reader.snapshot(location)
+    assert snapshot.version == 11
+    assert snapshot.checkpoint_version == 10
+    assert len(snapshot.files) == 12
+
+
+def test_delta_log_unsupported_reader_features(table):
+    location, log_dir = table
+    write_commit(log_dir, 1, {"protocol": {"minReaderVersion": 3, "minWriterVersion": 7}})
+    reader = DeltaLogReader(pafs.LocalFileSystem())
+
+    assert reader.snapshot(location) is None
+    # The version is known regardless
+    assert reader.version(location) == 1
+
+
+def test_delta_log_missing_commit(table):
+    location, log_dir = table
+    write_commit(log_dir, 2, add("part-2.parquet", 1))
+
+    with pytest.raises(FileNotFoundError):
+        DeltaLogReader(pafs.LocalFileSystem()).snapshot(location)
+
+
+def test_delta_log_not_a_table(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        DeltaLogReader(pafs.LocalFileSystem()).version(f"file://{tmp_path}/missing")
@@ -0,0 +1,117 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.jobs import (
+    CANCELLED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    AdmissionRejected,
+    QueryJob,
+    QueryJobManager,
+)
+
+
+def wait_finished(manager, job):
+    job.future.result(timeout=5)
+    return manager.get(job.id)
+
+
+def test_job_runs_and_succeeds():
+    finished = []
+    manager = QueryJobManager(max_workers=2, result_ttl=60, on_finish=finished.append)
+    spark = MagicMock()
+
+    job = manager.submit("SELECT 1", "rows", 1, lambda: spark, lambda s, j: "result")
+    job = wait_finished(manager, job)
+
+    assert job.status == SUCCEEDED
+    assert job.result == "result"
+    assert finished == [job]
+    spark.sparkContext.setJobGroup.assert_called_once()
+
+
+def test_cancel_after_pickup_finishes_the_job():
+    finished = []
+    manager = QueryJobManager(max_workers=1, result_ttl=60, on_finish=finished.append)
+    job = QueryJob(id="j1", query="SELECT 1", format="rows", owner_id=1, status=CANCELLED)
+    run = MagicMock()
+
+    manager._run(job, MagicMock, run)
+
+    run.assert_not_called()
+    assert job.status == CANCELLED
+    assert job.finished_at is not None
+    assert finished == [job]
+
+
+def test_cancel_before_job_group_is_set_skips_the_query():
+    manager = QueryJobManager(max_workers=1, result_ttl=60)
+    job = QueryJob(id="j1", query="SELECT 1", format="rows", owner_id=1)
+    spark = MagicMock()
+    # The cancel lands after the job started, before its group existed
+    spark.sparkContext.setJobGroup.side_effect = lambda *a, **k: setattr(job, "status", CANCELLED)
+    run = MagicMock()
+
+    manager._run(job, lambda: spark, run)
+
+    run.assert_not_called()
+    assert job.status == CANCELLED
+    assert job.finished_at is not None
+
+
+def test_cancel_running_job_cancels_its_group():
+    manager = QueryJobManager(max_workers=1, result_ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def run(spark, job):
+        started.set()
+        release.wait(5)
+        return "late"
+
+    job = manager.submit("SELECT 1", "rows", 1, MagicMock, run)
+    started.wait(5)
+    assert job.status == RUNNING
+    spark = MagicMock()
+    manager.cancel(job.id, spark)
+    release.set()
+    job = wait_finished(manager, job)
+
+    spark.sparkContext.cancelJobGroup.assert_called_once_with(job.id)
+    assert job.status == CANCELLED
+    assert job.result is None
+
+
+def test_admission_rejects_past_per_user_limit():
+    manager = QueryJobManager(max_workers=4, result_ttl=60,
+                              max_running_per_user=1, max_queued_per_user=1)
+    release = threading.Event()
+
+    def run(spark, job):
+        release.wait(5)
+
+    first = manager.submit("SELECT 1", "rows", 1, MagicMock, run)
+    second = manager.submit("SELECT 2", "rows", 1, MagicMock, run)
+    assert second.status == QUEUED
+    with pytest.raises(AdmissionRejected) as rejected:
+        manager.submit("SELECT 3", "rows", 1, MagicMock, run)
+    # Other users are not affected
+    other = manager.submit("SELECT 4", "rows", 2, MagicMock, run)
+
+    release.set()
+    for job in (first, second, other):
+        wait_finished(manager, job)
+    assert rejected.value.retry_after >= 1
+    assert manager.admission_stats()["rejected"] == 1
+
+
+def test_retry_after_scales_with_runtime_and_is_bounded():
+    manager = QueryJobManager(max_workers=2, result_ttl=60)
+    assert manager._retry_after(0) == 1
+
+    manager._runtimes.extend([4.0, 6.0])
+    assert manager._retry_after(3) == 8
+    assert manager._retry_after(1000) == 60
@@ -0,0 +1,50 @@
+from src.fastpath import DataFile, TableSnapshot
+from src.maintenance import filtered_columns, inspect_layout
+
+MB = 1024 * 1024
+
+
+def snapshot(*files):
+    return TableSnapshot(version=7, columns={}, partition_columns=["day"], files=list(files),
+                         checkpoint_version=5)
+
+
+def test_inspect_layout_counts_compactable_small_files_per_partition():
+    layout = inspect_layout(snapshot(
+        DataFile("a", 1 * MB, {"day": "1"}),
+        DataFile("b", 2 * MB, {"day": "1"}),
+        # The only small file of its partition: OPTIMIZE leaves it alone
+        DataFile("c", 3 * MB, {"day": "2"}),
+        DataFile("d", 64 * MB, {"day": "2"}),
+    ), small_file_bytes=32 * MB)
+
+    assert layout.version == 7
+    assert layout.checkpoint_version == 5
+    assert layout.file_count == 4
+    assert layout.total_bytes == 70 * MB
+    assert layout.small_files == 3
+    assert layout.compactable_files == 2
+    assert layout.file_size == {"min": 1 * MB, "p50": 3 * MB, "p90": 64 * MB, "max": 64 * MB}
+
+
+def test_inspect_layout_of_empty_table():
+    layout = inspect_layout(snapshot(), small_file_bytes=32 * MB)
+
+    assert layout.file_count == 0
+    assert layout.compactable_files == 0
+    assert layout.file_size == {"min": 0, "p50": 0, "p90": 0, "max": 0}
+
+
+def test_filtered_columns_counts_where_clauses_once_per_query():
+    queries = [
+        "SELECT region, amount FROM sales WHERE Day = '2024-01-01' AND region = 'EU'",
+        "select * from sales where day > '2024' and day < '2025' order by amount",
+        "SELECT amount FROM sales",
+        # Column names inside literals are not references
+        "SELECT * FROM sales WHERE note = 'region'",
+        "SELECT * FROM (SELECT * FROM sales WHERE amount > 5) s GROUP BY region",
+    ]
+
+    counts = filtered_columns(queries, ["day", "region", "amount", "note"])
+
+    assert counts == {"day": 2, "region": 1, "amount": 1, "note": 1}
@@ -0,0 +1,50 @@
+import pyarrow as pa
+
+from src.fastpath import DataFile, TableSnapshot
+from src.stats import DELTA_LOG_SOURCE, delta_log_stats
+
+
+def test_delta_log_stats_aggregates_file_stats():
+    snapshot = TableSnapshot(
+        version=3,
+        columns={"id": pa.int64(), "day": pa.date32()},
+        partition_columns=["day"],
+        files=[
+            DataFile("a", 100, {"day": "2024-01-01"},
+                     {"numRecords": 10, "minValues": {"id": 5}, "maxValues": {"id": 50}, "nullCount": {"id": 1}}),
+            DataFile("b", 200, {"day": "2024-01-02"},
+                     {"numRecords": 20, "minValues": {"id": 1}, "maxValues": {"id": 40}, "nullCount": {"id": 0}}),
+            DataFile("c", 50, {"day": None}, {"numRecords": 5}),
+        ],
+    )
+
+    stats = delta_log_stats(snapshot)
+
+    assert stats["table_version"] == 3
+    assert stats["row_count"] == 35
+    assert stats["size_bytes"] == 350
+    assert stats["file_count"] == 3
+    assert stats["source"] == DELTA_LOG_SOURCE
+    assert stats["column_stats"]["id"] == {"min": 1, "max": 50, "null_count": 1}
+    assert stats["column_stats"]["day"] == {"ndv": 2, "min": "2024-01-01", "max": "2024-01-02", "null_count": 5}
+
+
+def test_row_count_unknown_when_a_file_has_no_stats():
+    snapshot = TableSnapshot(version=1, columns={"id": pa.int64()}, partition_columns=[], files=[
+        DataFile("a", 100, {}, {"numRecords": 10, "minValues": {"id": 1}}),
+        DataFile("b", 100, {}, None),
+    ])
+
+    stats = delta_log_stats(snapshot)
+
+    assert stats["row_count"] is None
+    assert stats["column_stats"]["id"] == {"min": 1}
+
+
+def test_mixed_value_types_drop_the_bound():
+    snapshot = TableSnapshot(version=1, columns={"v": None}, partition_columns=[], files=[
+        DataFile("a", 1, {}, {"numRecords": 1, "minValues": {"v": 1, "nested": {"x": 1}}}),
+        DataFile("b", 1, {}, {"numRecords": 1, "minValues": {"v": "a"}}),
+    ])
+
+    assert delta_log_stats(snapshot)["column_stats"] == {"v": {}}
@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.table_cache import TableCacheManager, TableUsage
+
+DELTA = {"location": "s3a://data/sales", "format": "delta"}
+
+
+def make_manager():
+    return TableCacheManager(MagicMock(), MagicMock(), lambda: False, max_bytes=1024, interval=60,
+                             half_life=3600, min_score=1.0, memory_factor=2.0)
+
+
+def test_score_halves_every_half_life():
+    usage = TableUsage("sales", "s3a://data/sales", score=8.0, last_access=1000.0)
+
+    assert usage.decayed_score(1000.0, 3600) == 8.0
+    assert usage.decayed_score(1000.0 + 3600, 3600) == pytest.approx(4.0)
+    assert usage.decayed_score(1000.0 + 3 * 3600, 3600) == pytest.approx(1.0)
+
+
+def test_record_decays_previous_accesses():
+    manager = make_manager()
+    with patch("src.table_cache.time.time", return_value=1000.0):
+        manager.record({"sales": DELTA}, 50.0)
+        manager.record({"sales": DELTA}, 50.0)
+    with patch("src.table_cache.time.time", return_value=1000.0 + 3600):
+        manager.record({"sales": DELTA, "raw": {"location": "s3a://raw", "format": "parquet"}}, None)
+
+    usage = manager._tables["sales"]
+    assert usage.score == pytest.approx(2.0)
+    assert usage.accesses == 3
+    assert usage.misses == 2
+    # Only Delta tables can be checked for staleness, so only they are tracked
+    assert "raw" not in manager._tables
+
+
+def test_moved_table_starts_over():
+    manager = make_manager()
+    manager.record({"sales": DELTA}, None)
+    manager.record({"sales": dict(DELTA, location="s3a://data/sales_v2")}, None)
+
+    usage = manager._tables["sales"]
+    assert usage.location == "s3a://data/sales_v2"
+    assert usage.accesses == 1
+
+
+def test_saved_time_estimated_from_averages():
+    usage = TableUsage("sales", "s3a://data/sales", hits=4, hit_ms=400.0, misses=2, miss_ms=1000.0)
+
+    stats = usage.to_dict(now=0.0, half_life=3600)
+    assert stats["avg_hit_ms"] == 100.0
+    assert stats["avg_miss_ms"] == 500.0
+    assert stats["estimated_saved_ms"] == 1600.0
+    assert TableUsage("t", "s3a://t", hits=1, hit_ms=5.0).to_dict(0.0, 3600)["estimated_saved_ms"] is None
@@ -0,0 +1,389 @@
+"""
+Streaming ingestion of tar, tar.gz and zip archives into a bucket.
+The archive is unpacked while the request body is still arriving, so it is
+never held in memory or spooled to disk. Entries up to `buffer_bytes` are
+read into memory and written by at most `parallel` concurrent put_object
+calls on the I/O pool while unpacking continues; larger entries are
+streamed to MinIO from the unpacking thread as they are read, so a slow
+client never holds an I/O pool worker. Zip archives are read from their local
+file headers: the central directory at the end cannot be reached without
+buffering the whole archive.
+"""
+
+import io
+import time
+import zlib
+import struct
+import asyncio
+import logging
+import tarfile
+import mimetypes
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 64 * 1024
+
+ZIP_MAGIC = b"PK\x03\x04"
+EMPTY_ZIP_MAGIC = b"PK\x05\x06"
+
+
+class ArchiveError(ValueError):
+    """The body is not a readable tar, tar.gz or zip archive"""
+
+
+class BodyReader:
+    """
+    Blocking source over an async byte iterator (the request body), for the
+    thread that unpacks the archive. `read()` returns the next chunk, b"" at
+    the end; the event loop only fetches a chunk when one is asked for.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+
+    def read(self, size: int = -1) -> bytes:
+        return asyncio.run_coroutine_threadsafe(self._next(), self._loop).result()
+
+    async def _next(self) -> bytes:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+
+class PushbackReader:
+    """Reads exactly `size` bytes (fewer only at the end) and takes bytes back"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self.raw.read(READ_CHUNK)
+            if not chunk:
+                self._eof = True
+                break
+            self._buffer += chunk
+            self.bytes_read += len(chunk)
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def unread(self, data: bytes):
+        self._buffer[:0] = data
+
+
+def object_key(prefix: str, name: str) -> Optional[str]:
+    """Object name of an archive entry under `prefix`; None if it would escape it"""
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    prefix = prefix.strip("/")
+    return "/".join([prefix] + parts if prefix else parts)
+
+
+# Entries: (name, reader or None if not a regular file, size if known)
+Entry = Tuple[str, Optional[Any], Optional[int]]
+
+
+def iter_entries(stream: PushbackReader) -> Iterator[Entry]:
+    """Entries of the archive in `stream`, whose format is detected from its first bytes"""
+    magic = stream.read(4)
+    stream.unread(magic)
+    if magic in (ZIP_MAGIC, EMPTY_ZIP_MAGIC):
+        return iter_zip(stream)
+    return iter_tar(stream)
+
+
+def iter_tar(stream: PushbackReader) -> Iterator[Entry]:
+    try:
+        # Stream mode reads forward only, detecting gzip/bz2/xz compression
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, tar.extractfile(member), member.size
+                else:
+                    yield member.name, None, None
+    except (tarfile.TarError, EOFError, zlib.error) as e:
+        raise ArchiveError(f"Not a readable tar archive: {e}")
+
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_END_MAGICS = (b"PK\x01\x02", EMPTY_ZIP_MAGIC, b"PK\x06\x06")
+_DESCRIPTOR_MAGIC = b"PK\x07\x08"
+_ZIP64_EXTRA = 0x0001
+_STORED, _DEFLATED = 0, 8
+_FLAG_ENCRYPTED, _FLAG_DESCRIPTOR, _FLAG_UTF8 = 0x1, 0x8, 0x800
+
+
+def iter_zip(stream: PushbackReader) -> Iterator[Entry]:
+    while True:
+        magic = stream.read(4)
+        if len(magic) < 4 or magic in _END_MAGICS:
+            return
+        if magic != ZIP_MAGIC:
+            raise ArchiveError("Corrupt zip archive: expected a local file header")
+        (_, _, flags, method, _, _, crc, compressed_size, size,
+         name_length, extra_length) = _LOCAL_HEADER.unpack(magic + _read_exact(stream, _LOCAL_HEADER.size - 4))
+        name = _read_exact(stream, name_length).decode("utf-8" if flags & _FLAG_UTF8 else "cp437")
+        zip64 = _zip64_sizes(_read_exact(stream, extra_length), size, compressed_size)
+        if zip64 is not None:
+            size, compressed_size = zip64
+        if flags & _FLAG_ENCRYPTED:
+            raise ArchiveError(f"Zip entry '{name}' is encrypted")
+        if method not in (_STORED, _DEFLATED):
+            raise ArchiveError(f"Zip entry '{name}' uses unsupported compression method {method}")
+        if flags & _FLAG_DESCRIPTOR:
+            if method == _STORED:
+                # Nothing marks where the data ends
+                raise ArchiveError(f"Zip entry '{name}' is stored without its size; it cannot be streamed")
+            entry = ZipEntryReader(stream, name, method, None, None, None, zip64 is not None)
+        else:
+            entry = ZipEntryReader(stream, name, method, compressed_size, size, crc, False)
+        yield name, (None if name.endswith("/") else entry), entry.size
+        entry.close()
+
+
+def _zip64_sizes(extra: bytes, size: int, compressed_size: int) -> Optional[Tuple[int, int]]:
+    """(size, compressed size) from a zip64 extra field, None without one"""
+    offset = 0
+    while offset + 4 <= len(extra):
+        field, length = struct.unpack_from("<HH", extra, offset)
+        if field == _ZIP64_EXTRA:
+            data = extra[offset + 4:offset + 4 + length]
+            values = list(struct.unpack_from(f"<{len(data) // 8}Q", data))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed_size == 0xFFFFFFFF and values:
+                compressed_size = values.pop(0)
+            return size, compressed_size
+        offset += 4 + length
+    return None
+
+
+def _read_exact(stream: PushbackReader, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise ArchiveError("Truncated zip archive")
+    return data
+
+
+class ZipEntryReader:
+    """
+    The data of one zip entry, read from the archive stream. Sizes and CRC
+    missing from the local header are taken from the data descriptor after
+    the data; deflate streams mark their own end. The CRC is checked once
+    the entry has been read.
+    """
+
+    def __init__(self, stream: PushbackReader, name: str, method: int, compressed_size: Optional[int],
+                 size: Optional[int], crc: Optional[int], zip64: bool):
+        self.stream = stream
+        self.name = name
+        self.size = size
+        self._remaining = compressed_size
+        self._inflater = zlib.decompressobj(-15) if method == _DEFLATED else None
+        self._input = b""
+        self._expected_crc = crc
+        self._zip64 = zip64
+        self._crc = 0
+        self._written = 0
+        self._done = False
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        wanted = size
+        while wanted != 0:
+            data = self._read_some(READ_CHUNK if wanted < 0 else min(wanted, READ_CHUNK))
+            if not data:
+                break
+            chunks.append(data)
+            if wanted > 0:
+                wanted -= len(data)
+        return b"".join(chunks)
+
+    def close(self):
+        """Skip what is left of the entry, so the stream is at the next header"""
+        while self._read_some(READ_CHUNK):
+            pass
+
+    def _read_some(self, size: int) -> bytes:
+        while not self._done:
+            data = self._inflate(size) if self._inflater else self._copy(size)
+            if data:
+                self._crc = zlib.crc32(data, self._crc)
+                self._written += len(data)
+                return data
+            if self._finished():
+                self._finish()
+        return b""
+
+    def _copy(self, size: int) -> bytes:
+        if not self._remaining:
+            return b""
+        data = self.stream.read(min(size, self._remaining))
+        if not data:
+            raise ArchiveError(f"Truncated zip entry '{self.name}'")
+        self._remaining -= len(data)
+        return data
+
+    def _inflate(self, size: int) -> bytes:
+        if self._inflater.eof:
+            return b""
+        if not self._input and self._remaining != 0:
+            want = READ_CHUNK if self._remaining is None else min(READ_CHUNK, self._remaining)
+            self._input = self.stream.read(want)
+            if not self._input:
+                raise ArchiveError(f"Truncated zip entry '{self.name}'")
+            if self._remaining is not None:
+                self._remaining -= len(self._input)
+        try:
+            data = self._inflater.decompress(self._input, size)
+        except zlib.error as e:
+            raise ArchiveError(f"Corrupt zip entry '{self.name}': {e}")
+        self._input = self._inflater.unconsumed_tail
+        if self._inflater.eof:
+            if self._remaining is None:
+                # Read past the end of the entry: the rest is the next header
+                self.stream.unread(self._inflater.unused_data)
+            elif self._remaining:
+                self.stream.read(self._remaining)
+                self._remaining = 0
+        elif not data and not self._input and self._remaining == 0:
+            raise ArchiveError(f"Truncated zip entry '{self.name}'")
+        return data
+
+    def _finished(self) -> bool:
+        return self._inflater.eof if self._inflater else not self._remaining
+
+    def _finish(self):
+        self._done = True
+        if self._expected_crc is None:
+            magic = _read_exact(self.stream, 4)
+            crc = _read_exact(self.stream, 4) if magic == _DESCRIPTOR_MAGIC else magic
+            self._expected_crc = struct.unpack("<I", crc)[0]
+            # Compressed size, then size
+            sizes = _read_exact(self.stream, 16 if self._zip64 else 8)
+            self.size = struct.unpack("<QQ" if self._zip64 else "<II", sizes)[1]
+        if self._crc != self._expected_crc or (self.size is not None and self._written != self.size):
+            raise ArchiveError(f"Zip entry '{self.name}' failed its CRC check")
+
+
+class _Joined:
+    """`head` followed by the rest of `tail`, as one stream for put_object"""
+
+    def __init__(self, head: bytes, tail):
+        self._head = io.BytesIO(head)
+        self._tail = tail
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._head.read(size)
+        if size < 0:
+            data += self._tail.read()
+        elif len(data) < size:
+            data += self._tail.read(size - len(data))
+        self.bytes_read += len(data)
+        return data
+
+
+# An unreadable archive, as opposed to a failed write
+_ARCHIVE_ERRORS = (ArchiveError, tarfile.TarError, EOFError, zlib.error)
+
+
+def ingest(client, io_pool, bucket: str, prefix: str, raw, parallel: int, buffer_bytes: int,
+           part_size: int, max_files: int) -> Dict[str, Any]:
+    """
+    Write every file of the archive read from `raw` under `prefix` in
+    `bucket`. Returns the manifest (path, size, ETag or error per file) and
+    the throughput. Raises ArchiveError once the writes already started
+    have finished if the archive turns out to be unreadable.
+    """
+    started = time.perf_counter()
+    stream = PushbackReader(raw)
+    slots = threading.BoundedSemaphore(parallel)
+    files: List[Dict[str, Any]] = []
+    pending: List[Tuple[Dict[str, Any], Future]] = []
+    skipped: List[Dict[str, str]] = []
+    try:
+        for name, entry, size in iter_entries(stream):
+            key = object_key(prefix, name)
+            if entry is None or key is None:
+                skipped.append({"name": name, "reason": "not a file" if entry is None else "path outside the prefix"})
+                continue
+            if len(files) >= max_files:
+                raise ArchiveError(f"Archives are limited to {max_files} files")
+            record = {"path": key, "size": None, "etag": None}
+            files.append(record)
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+            head = entry.read(buffer_bytes + 1)
+            if len(head) <= buffer_bytes:
+                record["size"] = len(head)
+                slots.acquire()
+                future = io_pool.submit("put_object", client.put_object, bucket, key, io.BytesIO(head),
+                                        len(head), content_type=content_type)
+                future.add_done_callback(lambda _: slots.release())
+                pending.append((record, future))
+                continue
+
+            # Too large to hold: the archive is not read past it until it is
+            # written. Streamed from this thread, not the I/O pool: the upload
+            # goes at the client's pace and must not hold a pool worker.
+            data = _Joined(head, entry)
+            try:
+                result = io_pool.call_inline("put_object", client.put_object, bucket, key, data,
+                                             size if size is not None else -1, content_type=content_type,
+                                             part_size=part_size)
+                record["etag"] = result.etag
+            except _ARCHIVE_ERRORS:
+                raise
+            except Exception as e:
+                # S3Error, or a connection error from the HTTP client
+                record["error"] = str(e)
+            record["size"] = data.bytes_read
+    except _ARCHIVE_ERRORS as e:
+        # Also raised while reading a tar entry's data
+        _wait(pending)
+        written = sum(1 for f in files if f["etag"])
+        raise ArchiveError(f"{e} ({written} files were written before the error)")
+    _wait(pending)
+
+    seconds = time.perf_counter() - started
+    total_bytes = sum(f["size"] or 0 for f in files if f["etag"])
+    failed = [f["path"] for f in files if not f["etag"]]
+    if failed:
+        logger.warning(f"Archive into {bucket}/{prefix}: {len(failed)} of {len(files)} files failed")
+    return {
+        "bucket": bucket,
+        "prefix": prefix,
+        "files": files,
+        "skipped": skipped,
+        "written": len(files) - len(failed),
+        "failed": len(failed),
+        "bytes": total_bytes,
+        "archive_bytes": stream.bytes_read,
+        "seconds": round(seconds, 3),
+        "throughput_bytes_per_second": round(total_bytes / seconds) if seconds > 0 else None,
+        "files_per_second": round((len(files) - len(failed)) / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def _wait(pending: List[Tuple[Dict[str, Any], Future]]):
+    for record, future in pending:
+        try:
+            record["etag"] = future.result().etag
+        except Exception as e:
+            record["error"] = str(e)
@@ -0,0 +1,139 @@
+"""
+Benchmark: storage endpoint throughput with parallel clients
+
+Fires GET /api/storage/files/<bucket> (or uploads, with --endpoint upload)
+from 1..N concurrent clients and reports requests/s and latency for each
+level, once per I/O mode:
+
+  inline    MinIO calls made on the event loop (how the endpoints used to work)
+  pool=<n>  MinIO calls on the IOPool with n threads (STORAGE_IO_WORKERS)
+
+By default the app runs in-process against a simulated MinIO client whose
+calls block for --latency-ms, like network round trips of the real client,
+so no MinIO or Postgres is needed. With --url the clients hit a running
+storage service instead (only the configured pool size is measured then).
+
+Usage (from services/storage):
+    python -m benchmarks.bench_io_concurrency --clients 1,4,16,64 --workers 4,16
+    python -m benchmarks.bench_io_concurrency --url http://localhost:8002 --bucket openbricks-data
+"""
+
+import io
+import time
+import asyncio
+import argparse
+import statistics
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+
+import main
+from io_pool import IOPool
+
+
+class SimulatedMinio:
+    """Blocking stand-in for the MinIO client with fixed per-call latency"""
+
+    def __init__(self, latency: float, objects: int):
+        self.latency = latency
+        self.objects = [
+            SimpleNamespace(object_name=f"data/part-{i:05d}.parquet", size=1024 * 1024,
+                            last_modified=None, is_dir=False)
+            for i in range(objects)
+        ]
+
+    def list_objects(self, bucket, prefix="", recursive=False, start_after=None):
+        # Lazy like the real client: the request is made on first iteration
+        time.sleep(self.latency)
+        yield from self.objects
+
+    def put_object(self, bucket, name, data, length, content_type=None):
+        data.read()
+        time.sleep(self.latency)
+        return SimpleNamespace(etag="0" * 32)
+
+
+class InlineIO(IOPool):
+    """Runs calls directly on the caller, i.e. on the event loop"""
+
+    def __init__(self):
+        super().__init__(1)
+
+    async def run(self, op, fn, *args, **kwargs):
+        return self._timed(op, fn, args, kwargs, time.perf_counter())()
+
+
+async def client_loop(client: httpx.AsyncClient, args, latencies):
+    for i in range(args.requests):
+        start = time.perf_counter()
+        if args.endpoint == "upload":
+            files = {"file": (f"bench-{i}.bin", io.BytesIO(b"x" * args.size_kb * 1024))}
+            response = await client.post(f"/api/storage/files/{args.bucket}", params={"path": "_bench"}, files=files)
+        else:
+            response = await client.get(f"/api/storage/files/{args.bucket}", params={"prefix": "data/"})
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_level(transport_kwargs, clients: int, args):
+    latencies = []
+    async with httpx.AsyncClient(timeout=120, **transport_kwargs) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, args, latencies) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+    }
+
+
+def report(mode: str, clients: int, result, baseline):
+    print(f"{mode:>10} {clients:>8} {result['rps']:>10.1f} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+          f"{result['rps'] / baseline:>7.1f}x")
+
+
+async def run(args):
+    levels = [int(c) for c in args.clients.split(",")]
+    print(f"{'mode':>10} {'clients':>8} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'scaling':>8}")
+
+    if args.url:
+        baseline = None
+        for clients in levels:
+            result = await run_level({"base_url": args.url}, clients, args)
+            baseline = baseline or result["rps"]
+            report("remote", clients, result, baseline)
+        return
+
+    transport = {"transport": httpx.ASGITransport(app=main.app), "base_url": "http://storage"}
+    modes = [("inline", InlineIO())] + [(f"pool={n}", IOPool(n)) for n in (int(w) for w in args.workers.split(","))]
+    fake = SimulatedMinio(args.latency_ms / 1000, args.objects)
+    with patch.object(main, "minio_client", fake):
+        for mode, pool in modes:
+            baseline = None
+            with patch.object(main, "storage_io", pool):
+                for clients in levels:
+                    result = await run_level(transport, clients, args)
+                    baseline = baseline or result["rps"]
+                    report(mode, clients, result, baseline)
+            pool.shutdown()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", default="1,2,4,8,16,32", help="comma-separated concurrent client counts")
+    parser.add_argument("--workers", default="4,16", help="comma-separated IOPool sizes to compare")
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--endpoint", choices=("list", "upload"), default="list")
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated MinIO call latency")
+    parser.add_argument("--objects", type=int, default=100, help="objects per simulated listing")
+    parser.add_argument("--size-kb", type=int, default=64, help="upload size")
+    parser.add_argument("--bucket", default="bench")
+    parser.add_argument("--url", help="benchmark a running storage service instead")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,196 @@
+"""
+Bulk object deletion as background jobs.
+Objects under a prefix are listed lazily and removed with S3 multi-object
+delete, up to 1000 keys per request, with several batches in flight on the
+I/O pool. Jobs report progress while they run and keep a report of the
+objects that could not be deleted.
+"""
+
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from minio.deleteobjects import DeleteObject
+
+from io_pool import IOPool
+
+logger = logging.getLogger(__name__)
+
+# S3 multi-object delete limit
+BATCH_SIZE = 1000
+# Failed objects listed in a job's report (all are counted)
+MAX_REPORTED_ERRORS = 1000
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+# Finished, but some objects could not be deleted
+PARTIAL = "partial"
+FAILED = "failed"
+
+FINISHED_STATES = (SUCCEEDED, PARTIAL, FAILED)
+
+
+@dataclass
+class DeletionJob:
+    id: str
+    bucket: str
+    prefix: str
+    owner_id: Optional[int]
+    # Deleted after the listing, e.g. directory markers
+    extra_keys: List[str] = field(default_factory=list)
+    # Remove the bucket itself once it is empty
+    remove_bucket: bool = False
+    status: str = QUEUED
+    listed: int = 0
+    deleted: int = 0
+    failed: int = 0
+    batches: int = 0
+    errors: List[Dict[str, str]] = field(default_factory=list)
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self, with_errors: bool = True) -> Dict[str, Any]:
+        job = {
+            "job_id": self.id,
+            "bucket": self.bucket,
+            "prefix": self.prefix,
+            "remove_bucket": self.remove_bucket,
+            "status": self.status,
+            "listed": self.listed,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "batches": self.batches,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if with_errors:
+            job["errors"] = list(self.errors)
+        return job
+
+
+class DeletionJobManager:
+    """
+    Runs up to `max_jobs` deletions at once, each with at most
+    `parallel_batches` delete requests in flight. Finished jobs are kept
+    for `result_ttl` seconds.
+    """
+
+    def __init__(self, io: IOPool, get_client: Callable, max_jobs: int,
+                 parallel_batches: int, result_ttl: int):
+        self.io = io
+        self.get_client = get_client
+        self.parallel_batches = parallel_batches
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="bulk-delete")
+        self._jobs: Dict[str, DeletionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, bucket: str, prefix: str, owner_id: Optional[int],
+               extra_keys: Optional[List[str]] = None, remove_bucket: bool = False) -> DeletionJob:
+        """Delete every object under `prefix` (the whole bucket if empty) in the background"""
+        self._expire()
+        job = DeletionJob(id=uuid.uuid4().hex, bucket=bucket, prefix=prefix, owner_id=owner_id,
+                          extra_keys=list(extra_keys or []), remove_bucket=remove_bucket)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[DeletionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, owner_id: Optional[int] = None) -> List[DeletionJob]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if owner_id is not None:
+            jobs = [j for j in jobs if j.owner_id == owner_id]
+        return sorted(jobs, key=lambda j: j.submitted_at, reverse=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: DeletionJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        client = self.get_client()
+        in_flight: deque = deque()
+        try:
+            batch: List[str] = []
+            for obj in client.list_objects(job.bucket, prefix=job.prefix, recursive=True):
+                batch.append(obj.object_name)
+                job.listed += 1
+                if len(batch) == BATCH_SIZE:
+                    self._submit_batch(job, client, batch, in_flight)
+                    batch = []
+            for key in job.extra_keys:
+                batch.append(key)
+                if len(batch) == BATCH_SIZE:
+                    self._submit_batch(job, client, batch, in_flight)
+                    batch = []
+            if batch:
+                self._submit_batch(job, client, batch, in_flight)
+            while in_flight:
+                self._collect(job, *in_flight.popleft())
+            if job.remove_bucket and not job.failed:
+                self.io.call("remove_bucket", client.remove_bucket, job.bucket)
+            job.status = PARTIAL if job.failed else SUCCEEDED
+        except Exception as e:
+            while in_flight:
+                self._collect(job, *in_flight.popleft())
+            logger.error(f"Deleting {job.bucket}/{job.prefix} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+        logger.info(
+            f"Deletion job {job.id} {job.status}: {job.deleted} deleted, {job.failed} failed "
+            f"in {job.finished_at - job.started_at:.1f}s"
+        )
+
+    def _submit_batch(self, job: DeletionJob, client, keys: List[str], in_flight: deque):
+        # Bounded window: wait for the oldest batch before sending another
+        if len(in_flight) >= self.parallel_batches:
+            self._collect(job, *in_flight.popleft())
+        in_flight.append((self.io.submit("remove_objects", _delete_batch, client, job.bucket, keys), keys))
+
+    def _collect(self, job: DeletionJob, future, keys: List[str]):
+        try:
+            errors = future.result()
+        except Exception as e:
+            errors = [{"key": key, "code": "RequestFailed", "message": str(e)} for key in keys]
+        job.batches += 1
+        job.deleted += len(keys) - len(errors)
+        job.failed += len(errors)
+        room = MAX_REPORTED_ERRORS - len(job.errors)
+        if room > 0:
+            job.errors.extend(errors[:room])
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [i for i, j in self._jobs.items() if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+
+def _delete_batch(client, bucket: str, keys: List[str]) -> List[Dict[str, str]]:
+    """One multi-object delete request; returns the keys that failed"""
+    return [
+        {"key": error.name, "code": error.code, "message": error.message}
+        for error in client.remove_objects(bucket, [DeleteObject(key) for key in keys])
+    ]
+
+
+def is_empty(client, bucket: str, prefix: str = "") -> bool:
+    """True if nothing is stored under `prefix`; stops at the first object"""
+    return next(iter(client.list_objects(bucket, prefix=prefix, recursive=True)), None) is None
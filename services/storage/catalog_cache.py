@@ -0,0 +1,177 @@
+"""
+In-process cache for catalog reads.
+Table listings and table details are served from memory for up to `ttl`
+seconds and dropped as soon as this service changes the catalog. Each entry
+carries a validator (ETag) and Last-Modified derived from the rows'
+updated_at, so clients can revalidate with a 304 instead of refetching.
+Changes made by other services (e.g. query-engine ingestion) arrive through
+the data_tables NOTIFY trigger, and new table stats through the table_stats
+one.
+"""
+
+import json
+import time
+import select
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Must match the channels used by the data_tables and table_stats triggers
+# in 01-schema.sql
+CATALOG_CHANNEL = "data_tables_changed"
+STATS_CHANNEL = "table_stats_changed"
+
+
+@dataclass
+class CachedCatalog:
+    body: Any
+    etag: str
+    last_modified: Optional[datetime]
+    expires_at: float
+
+
+def validators(parts: Iterable, times: Iterable[Optional[datetime]]):
+    """ETag over `parts` and the latest of `times` as Last-Modified"""
+    digest = hashlib.sha1(repr(list(parts)).encode()).hexdigest()[:32]
+    last_modified = max((t for t in times if t is not None), default=None)
+    return digest, last_modified
+
+
+class CatalogCache:
+    """
+    LRU of at most `max_entries` responses. Listings are keyed by database
+    and visibility, details by table id. A lookup that raced with an
+    invalidation is not stored (see `generation`).
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, CachedCatalog]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Read before querying; pass to put() so stale results are discarded"""
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[CachedCatalog]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, body: Any, etag: str, last_modified: Optional[datetime],
+            generation: int) -> CachedCatalog:
+        entry = CachedCatalog(body, etag, last_modified, time.monotonic() + self.ttl)
+        with self._lock:
+            if generation != self._generation:
+                # The catalog changed while this was being read
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, table_id: Optional[int] = None, listings: bool = True):
+        """Drop the details of `table_id` and, unless told not to, every listing"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            for key in [k for k in self._entries
+                        if (listings and k[0] == "tables") or k == ("table", table_id)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class CatalogChangeListener(threading.Thread):
+    """
+    LISTENs on CATALOG_CHANNEL and STATS_CHANNEL and invalidates `cache` for
+    every changed table. Stats only appear in table details, so a stats
+    change leaves the listings cached.
+    """
+
+    def __init__(self, connect: Callable, cache: CatalogCache):
+        super().__init__(name="catalog-cache-listener", daemon=True)
+        self.connect = connect
+        self.cache = cache
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = 1
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+                backoff = 1
+            except Exception as e:
+                logger.warning(f"Catalog cache listener disconnected: {e}; retrying in {backoff}s")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _listen(self):
+        conn = self.connect()
+        try:
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CATALOG_CHANNEL}; LISTEN {STATS_CHANNEL}")
+            # Changes missed while not listening
+            self.cache.clear()
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([conn], [], [], 1.0)
+                if readable:
+                    conn.poll()
+                    for notify in conn.notifies:
+                        self.apply(notify.channel, notify.payload)
+                    conn.notifies.clear()
+        finally:
+            conn.close()
+
+    def apply(self, channel: str, payload: str):
+        """Invalidate the cache for one notification"""
+        try:
+            table_id = json.loads(payload).get("id")
+        except ValueError:
+            table_id = None
+        self.cache.invalidate(table_id, listings=channel != STATS_CHANNEL or table_id is None)
+
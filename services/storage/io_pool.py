@@ -0,0 +1,132 @@
+"""
+Bounded thread pool for blocking object-store calls.
+The MinIO client is synchronous; calling it from an `async def` endpoint
+stalls the event loop for every request in the worker. Calls go through
+IOPool instead, which runs them on at most `max_workers` threads and keeps
+per-operation latency and queueing metrics.
+Calls run in a copy of the caller's context, so request-scoped context
+variables (the request id) are visible to them.
+"""
+
+import time
+import asyncio
+import threading
+import contextvars
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Latency samples kept per operation
+SAMPLES = 1000
+
+
+class _OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        # seconds
+        self.latencies: deque = deque(maxlen=SAMPLES)
+        self.queue_waits: deque = deque(maxlen=SAMPLES)
+
+
+class IOPool:
+    """
+    Runs blocking calls on a fixed number of threads and times them per
+    operation. `observer(op, seconds, failed)` is called after every call.
+    """
+
+    def __init__(self, max_workers: int, observer: Optional[Callable[[str, float, bool], None]] = None):
+        self.max_workers = max_workers
+        self.observer = observer
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage-io")
+        self._stats: Dict[str, _OperationStats] = defaultdict(_OperationStats)
+        self._lock = threading.Lock()
+
+    async def run(self, op: str, fn: Callable, *args, **kwargs) -> Any:
+        """Await `fn(*args, **kwargs)` run on the pool, recorded under `op`"""
+        loop = asyncio.get_running_loop()
+        timed = self._timed(op, fn, args, kwargs, time.perf_counter())
+        return await loop.run_in_executor(self._executor, contextvars.copy_context().run, timed)
+
+    def call(self, op: str, fn: Callable, *args, **kwargs) -> Any:
+        """Blocking variant for code already running on a worker thread"""
+        return self.submit(op, fn, *args, **kwargs).result()
+
+    def call_inline(self, op: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run on the calling thread, recorded under `op` like a pooled call.
+        For calls paced by a client (e.g. streaming its request body), which
+        would otherwise hold a pool worker for as long as the client takes.
+        """
+        return self._timed(op, fn, args, kwargs, time.perf_counter())()
+
+    def submit(self, op: str, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule `fn` without waiting for it"""
+        timed = self._timed(op, fn, args, kwargs, time.perf_counter())
+        return self._executor.submit(contextvars.copy_context().run, timed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-operation call counts, errors and latency percentiles (ms)"""
+        with self._lock:
+            snapshot = {
+                op: (s.calls, s.errors, s.in_flight, sorted(s.latencies), sorted(s.queue_waits))
+                for op, s in self._stats.items()
+            }
+        return {
+            "max_workers": self.max_workers,
+            "operations": {
+                op: {
+                    "calls": calls,
+                    "errors": errors,
+                    "in_flight": in_flight,
+                    "latency_ms": _summary(latencies),
+                    "queue_wait_ms": _summary(waits),
+                }
+                for op, (calls, errors, in_flight, latencies, waits) in snapshot.items()
+            },
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _timed(self, op: str, fn: Callable, args: tuple, kwargs: dict, submitted: float) -> Callable:
+        def run():
+            started = time.perf_counter()
+            with self._lock:
+                stats = self._stats[op]
+                stats.in_flight += 1
+                stats.queue_waits.append(started - submitted)
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    stats.calls += 1
+                    stats.in_flight -= 1
+                    stats.latencies.append(elapsed)
+                    if failed:
+                        stats.errors += 1
+                if self.observer:
+                    self.observer(op, elapsed, failed)
+        return run
+
+
+def _summary(sorted_seconds: List[float]) -> Dict[str, float]:
+    if not sorted_seconds:
+        return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "avg": round(sum(sorted_seconds) / len(sorted_seconds) * 1000, 2),
+        "p50": _percentile_ms(sorted_seconds, 0.50),
+        "p95": _percentile_ms(sorted_seconds, 0.95),
+        "max": _percentile_ms(sorted_seconds, 1.0),
+    }
+
+
+def _percentile_ms(sorted_seconds: List[float], fraction: float) -> float:
+    index = min(int(len(sorted_seconds) * fraction), len(sorted_seconds) - 1)
+    return round(sorted_seconds[index] * 1000, 2)
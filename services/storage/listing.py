@@ -0,0 +1,99 @@
+"""
+Object listings that never hold a whole bucket in memory.
+MinIO's listing is a lazy generator over 1000-key pages; these helpers take
+bounded slices of it for paginated responses, and fold it into per-prefix
+counts and sizes in a single pass for aggregation.
+"""
+
+import json
+import base64
+import binascii
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class InvalidContinuationToken(ValueError):
+    """Token is malformed or belongs to a different listing"""
+
+
+def encode_token(bucket: str, prefix: str, recursive: bool, after: str) -> str:
+    """Opaque token for the listing that continues after key `after`"""
+    payload = json.dumps({"b": bucket, "p": prefix, "r": recursive, "a": after}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str, bucket: str, prefix: str, recursive: bool) -> str:
+    """The key a token continues after; it must come from the same listing"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        after = payload["a"]
+        same_listing = (payload["b"], payload["p"], payload["r"]) == (bucket, prefix, recursive)
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidContinuationToken("Malformed continuation token")
+    if not same_listing or not isinstance(after, str):
+        raise InvalidContinuationToken("Continuation token does not match this listing")
+    return after
+
+
+def describe(obj) -> Dict[str, Any]:
+    return {
+        "name": obj.object_name,
+        "size": obj.size,
+        "last_modified": obj.last_modified.isoformat() if obj.last_modified else None,
+        "is_dir": obj.is_dir,
+    }
+
+
+def after_key(objects: Iterator, after: Optional[str]) -> Iterator:
+    """
+    Skip entries up to and including `after`. S3 start_after is exclusive
+    for keys, but a directory entry ("dir/") rolled up from keys after it
+    would be listed again on the next page.
+    """
+    if not after:
+        return objects
+    return (obj for obj in objects if obj.object_name > after)
+
+
+def take(objects: Iterator, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """Up to `limit` entries and whether more follow"""
+    page = [describe(obj) for obj in islice(objects, limit + 1)]
+    return page[:limit], len(page) > limit
+
+
+def group_of(name: str, prefix: str) -> str:
+    """The child prefix of `prefix` that `name` is under (`prefix` for direct children)"""
+    rest = name[len(prefix):]
+    slash = rest.find("/")
+    return prefix if slash < 0 else prefix + rest[:slash + 1]
+
+
+class PrefixTotals:
+    """Object count and size per child prefix, folded in as objects are listed"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.objects = 0
+        self.size = 0
+        self._groups: Dict[str, List[int]] = {}
+
+    def add(self, obj):
+        if obj.is_dir:
+            return
+        size = obj.size or 0
+        self.objects += 1
+        self.size += size
+        group = self._groups.setdefault(group_of(obj.object_name, self.prefix), [0, 0])
+        group[0] += 1
+        group[1] += size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "prefix": self.prefix,
+            "objects": self.objects,
+            "size": self.size,
+            "prefixes": [
+                {"prefix": group, "objects": count, "size": size}
+                for group, (count, size) in sorted(self._groups.items())
+            ],
+        }
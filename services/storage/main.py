@@ -3,22 +3,42 @@ OpenBricks Storage Service
 Manages Delta Lake tables and object storage
 """
 
+import io
 import os
+import json
+import time
+import asyncio
 import logging
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from typing import List, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Header, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Header, Depends, Request
+from starlette.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from minio import Minio
 from minio.error import S3Error
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+import archive_ingest
+import listing
+import metrics
+from catalog_cache import CatalogCache, CatalogChangeListener, validators
+import multipart_uploads
+from bulk_delete import DeletionJobManager, is_empty
+from db import ConnectionPool, PoolTimeout
+from io_pool import IOPool
+from usage_index import BUCKET_ROOT, UsageIndex, UsageIndexer
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
+metrics.install_log_context()
 logger = logging.getLogger(__name__)
 
 # Environment configuration
@@ -27,6 +47,49 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "openbricks")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "openbricks123")
 SPARK_MASTER_URL = os.getenv("SPARK_MASTER_URL", "spark://localhost:7077")
+# Pooled Postgres connections; requests wait at most the timeout for one
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "5"))
+# Threads for blocking MinIO calls (at most this many run concurrently)
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "16"))
+# Chunked uploads: suggested part size, largest part accepted through the
+# service, and how long an unfinished upload is kept before it is aborted
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(16 * 1024 * 1024)))
+UPLOAD_MAX_PART_BYTES = int(os.getenv("UPLOAD_MAX_PART_BYTES", str(128 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+# Presigned URLs are signed for the endpoint clients reach MinIO on
+MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT", MINIO_ENDPOINT)
+MINIO_PUBLIC_SECURE = os.getenv("MINIO_PUBLIC_SECURE", "false").lower() == "true"
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+UPLOAD_PRESIGN_EXPIRY_SECONDS = int(os.getenv("UPLOAD_PRESIGN_EXPIRY_SECONDS", "3600"))
+# Archive ingestion: entries up to ARCHIVE_BUFFER_ENTRY_BYTES are written
+# ARCHIVE_PARALLEL_WRITES at a time, larger ones streamed one by one
+ARCHIVE_PARALLEL_WRITES = int(os.getenv("ARCHIVE_PARALLEL_WRITES", "8"))
+ARCHIVE_BUFFER_ENTRY_BYTES = int(os.getenv("ARCHIVE_BUFFER_ENTRY_BYTES", str(8 * 1024 * 1024)))
+ARCHIVE_MAX_FILES = int(os.getenv("ARCHIVE_MAX_FILES", "100000"))
+# Downloads are streamed from MinIO in chunks of this size
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Catalog reads (table listings and details) are cached for this long;
+# changes made through this service invalidate them immediately
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "30"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024"))
+# Object listings: entries per page by default and at most
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "1000"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "10000"))
+# Requests slower than this are logged with their timing spans
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1"))
+
+# Usage index: sizes per bucket / prefix / table from MinIO notifications,
+# with a full rescan of every bucket at this interval
+USAGE_INDEX_ENABLED = os.getenv("USAGE_INDEX_ENABLED", "true").lower() == "true"
+USAGE_RECONCILE_INTERVAL_SECONDS = int(os.getenv("USAGE_RECONCILE_INTERVAL_SECONDS", str(6 * 3600)))
+# Deeper prefixes are only counted in their ancestors
+USAGE_MAX_PREFIX_DEPTH = int(os.getenv("USAGE_MAX_PREFIX_DEPTH", "16"))
+# Bulk deletions: jobs run at once, delete requests in flight per job, and
+# how long finished jobs stay queryable
+BULK_DELETE_MAX_JOBS = int(os.getenv("BULK_DELETE_MAX_JOBS", "2"))
+BULK_DELETE_PARALLEL_BATCHES = int(os.getenv("BULK_DELETE_PARALLEL_BATCHES", "4"))
+BULK_DELETE_JOB_TTL_SECONDS = int(os.getenv("BULK_DELETE_JOB_TTL_SECONDS", "3600"))
 
 # Initialize MinIO client
 minio_client = Minio(
@@ -36,13 +99,59 @@ minio_client = Minio(
     secure=False
 )
 
+# Signs presigned URLs only; a fixed region keeps signing free of network calls
+presign_client = Minio(
+    MINIO_PUBLIC_ENDPOINT,
+    access_key=MINIO_ACCESS_KEY,
+    secret_key=MINIO_SECRET_KEY,
+    secure=MINIO_PUBLIC_SECURE,
+    region=MINIO_REGION
+)
+
 # Default bucket name
 DEFAULT_BUCKET = "openbricks-data"
 
+# Every MinIO call runs here, never on the event loop
+storage_io = IOPool(STORAGE_IO_WORKERS, observer=metrics.observe_object_store)
+
+# Table data and bucket contents are removed in the background
+deletions = DeletionJobManager(
+    storage_io,
+    lambda: minio_client,
+    BULK_DELETE_MAX_JOBS,
+    BULK_DELETE_PARALLEL_BATCHES,
+    BULK_DELETE_JOB_TTL_SECONDS,
+)
+
+
+catalog_cache = CatalogCache(CATALOG_CACHE_MAX_ENTRIES, CATALOG_CACHE_TTL_SECONDS)
+
+
+db_pool = ConnectionPool(
+    lambda: psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor),
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    on_acquire=metrics.observe_db_acquire,
+)
+
 
 def get_db_connection():
-    """Get database connection"""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    """Get a pooled database connection; close() returns it to the pool"""
+    return db_pool.connection()
+
+
+# LISTEN holds its connection for good, so it does not take one from the pool
+catalog_listener = CatalogChangeListener(
+    lambda: psycopg2.connect(DATABASE_URL), catalog_cache
+)
+
+
+# Rescans hold their transaction for a whole bucket listing: not from the pool
+usage_index = UsageIndex(
+    lambda: get_db_connection(), USAGE_MAX_PREFIX_DEPTH,
+    connect_rescan=lambda: psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor),
+)
+usage_indexer = UsageIndexer(minio_client, usage_index, USAGE_RECONCILE_INTERVAL_SECONDS)
 
 
 async def get_current_user(
@@ -73,16 +182,26 @@ async def lifespan(app: FastAPI):
     
     # Ensure default bucket exists
     try:
-        if not minio_client.bucket_exists(DEFAULT_BUCKET):
-            minio_client.make_bucket(DEFAULT_BUCKET)
+        if not await storage_io.run("bucket_exists", minio_client.bucket_exists, DEFAULT_BUCKET):
+            await storage_io.run("make_bucket", minio_client.make_bucket, DEFAULT_BUCKET)
             logger.info(f"Created default bucket: {DEFAULT_BUCKET}")
     except S3Error as e:
         logger.warning(f"Could not create default bucket: {e}")
+    upload_reaper = asyncio.create_task(abort_stale_uploads_periodically())
+    catalog_listener.start()
+    if USAGE_INDEX_ENABLED:
+        usage_indexer.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down OpenBricks Storage Service")
+    upload_reaper.cancel()
+    catalog_listener.stop()
+    usage_indexer.stop()
+    db_pool.close_all()
+    deletions.shutdown()
+    storage_io.shutdown()
 
 
 app = FastAPI(
@@ -99,7 +218,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Id", "Server-Timing"],
 )
+app.add_middleware(metrics.MetricsMiddleware, slow_request_seconds=SLOW_REQUEST_SECONDS)
+
+# Read when /metrics is scraped
+metrics.REGISTRY.register(metrics.StatsCollector(
+    db_pool.stats,
+    gauges={
+        "db_pool_connections_open": ("Open pooled database connections", ("open",)),
+        "db_pool_connections_in_use": ("Borrowed pooled database connections", ("in_use",)),
+    },
+    counters={
+        "db_pool_timeouts": ("Borrows that timed out", ("timeouts",)),
+    },
+))
+metrics.REGISTRY.register(metrics.StatsCollector(
+    lambda: {"in_flight": sum(op["in_flight"] for op in storage_io.stats()["operations"].values())},
+    gauges={"object_store_calls_in_flight": ("MinIO calls running on the I/O pool", ("in_flight",))},
+))
+metrics.REGISTRY.register(metrics.StatsCollector(
+    catalog_cache.stats,
+    gauges={"catalog_cache_entries": ("Cached catalog responses", ("entries",))},
+    counters={
+        "catalog_cache_hits": ("Catalog reads served from the cache", ("hits",)),
+        "catalog_cache_misses": ("Catalog reads that went to the database", ("misses",)),
+    },
+))
+
+metrics.REGISTRY.register(metrics.StatsCollector(
+    usage_indexer.stats,
+    gauges={"usage_index_listeners": ("Buckets whose notifications are being applied", ("listeners",))},
+    counters={"usage_index_events": ("Object events applied to the usage index", ("events",))},
+))
+
+
+@app.exception_handler(PoolTimeout)
+async def database_busy(request, exc: PoolTimeout):
+    """Every pooled connection stayed busy: tell clients to retry shortly"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 
 # Pydantic models
@@ -132,7 +289,35 @@ class FileUploadResponse(BaseModel):
     etag: str
 
 
+class UploadInitiate(BaseModel):
+    bucket: str
+    path: str = ""
+    filename: str
+    content_type: Optional[str] = None
+    # Total size, if known: sizes the parts and (presigned) pre-signs them all
+    size: Optional[int] = None
+    # Parts are PUT straight to MinIO instead of through the service
+    presigned: bool = False
+
+
+class CompletedPart(BaseModel):
+    part_number: int
+    etag: str
+
+
+class UploadComplete(BaseModel):
+    # Defaults to every part uploaded so far
+    parts: Optional[List[CompletedPart]] = None
+
+
 # Health check
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -144,7 +329,7 @@ async def health_check():
         "checks": {}
     }
     
-    # Check database
+    # Check database (a pooled connection, pinged if it sat idle)
     try:
         conn = get_db_connection()
         conn.close()
@@ -152,10 +337,13 @@ async def health_check():
     except Exception as e:
         health_status["checks"]["database"] = f"unhealthy: {str(e)}"
         health_status["status"] = "degraded"
+    health_status["database_pool"] = db_pool.stats()
+    health_status["object_store_io"] = storage_io.stats()
+    health_status["catalog_cache"] = catalog_cache.stats()
     
     # Check MinIO
     try:
-        minio_client.list_buckets()
+        await storage_io.run("list_buckets", minio_client.list_buckets)
         health_status["checks"]["minio"] = "healthy"
     except Exception as e:
         health_status["checks"]["minio"] = f"unhealthy: {str(e)}"
@@ -164,12 +352,18 @@ async def health_check():
     return health_status
 
 
+@app.get("/api/storage/io/stats")
+async def io_stats():
+    """Per-operation MinIO call counts and latency percentiles"""
+    return storage_io.stats()
+
+
 # Bucket management
 @app.get("/api/storage/buckets")
 async def list_buckets():
     """List all storage buckets"""
     try:
-        buckets = minio_client.list_buckets()
+        buckets = await storage_io.run("list_buckets", minio_client.list_buckets)
         return {
             "buckets": [
                 {
@@ -187,55 +381,155 @@ async def list_buckets():
 async def create_bucket(bucket: BucketCreate):
     """Create a new storage bucket"""
     try:
-        if minio_client.bucket_exists(bucket.name):
+        if await storage_io.run("bucket_exists", minio_client.bucket_exists, bucket.name):
             raise HTTPException(status_code=409, detail="Bucket already exists")
         
-        minio_client.make_bucket(bucket.name)
+        await storage_io.run("make_bucket", minio_client.make_bucket, bucket.name)
         return {"message": f"Bucket '{bucket.name}' created successfully"}
     except S3Error as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.delete("/api/storage/buckets/{bucket_name}")
-async def delete_bucket(bucket_name: str):
+async def delete_bucket(
+    bucket_name: str,
+    force: bool = Query(default=False, description="Delete the bucket's objects first (admin only)"),
+    user: Optional[dict] = Depends(get_current_user)
+):
     """Delete a storage bucket"""
     try:
         # Check if bucket is empty
-        objects = list(minio_client.list_objects(bucket_name, recursive=True))
-        if objects:
-            raise HTTPException(status_code=400, detail="Bucket is not empty")
+        if not await storage_io.run("list_objects", is_empty, minio_client, bucket_name):
+            if not force:
+                raise HTTPException(status_code=400, detail="Bucket is not empty")
+            # Emptying a bucket can wipe the data behind every catalog table
+            if not user or user.get("role") != "admin":
+                raise HTTPException(status_code=403, detail="Only admins can force-delete a bucket")
+            job = deletions.submit(bucket_name, "", user["id"], remove_bucket=True)
+            return JSONResponse(status_code=202, content={
+                "message": f"Deleting bucket '{bucket_name}' and its contents",
+                "deletion_job": job.to_dict(with_errors=False),
+            })
         
-        minio_client.remove_bucket(bucket_name)
+        await storage_io.run("remove_bucket", minio_client.remove_bucket, bucket_name)
         return {"message": f"Bucket '{bucket_name}' deleted successfully"}
     except S3Error as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/storage/deletions")
+async def list_deletions(user: Optional[dict] = Depends(get_current_user)):
+    """Recent bulk deletion jobs (all of them for admins)"""
+    owner_id = user["id"] if user and user.get("role") != "admin" else None
+    return {"jobs": [job.to_dict(with_errors=False) for job in deletions.list(owner_id)]}
+
+
+@app.get("/api/storage/deletions/{job_id}")
+async def get_deletion(job_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """Progress of a bulk deletion job and the objects it could not delete"""
+    job = deletions.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    if user and user.get("role") != "admin" and job.owner_id != user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to view this deletion job")
+    return job.to_dict()
+
+
 # File management
 @app.get("/api/storage/files/{bucket_name}")
 async def list_files(
     bucket_name: str,
     prefix: str = Query(default="", description="Path prefix to filter files"),
-    recursive: bool = Query(default=False, description="List files recursively")
+    recursive: bool = Query(default=False, description="List files recursively"),
+    limit: Optional[int] = Query(default=None, ge=1, le=LIST_MAX_PAGE_SIZE, description="Entries per page"),
+    continuation_token: Optional[str] = Query(default=None, description="next_continuation_token of the previous page"),
+    start_after: Optional[str] = Query(default=None, description="List keys after this one"),
+    format: str = Query(default="json", pattern="^(json|ndjson)$", description="ndjson streams one entry per line"),
+    aggregate: bool = Query(default=False, description="Object count and size per child prefix")
 ):
-    """List files in a bucket"""
+    """
+    List files in a bucket, one page at a time. With format=ndjson entries
+    are streamed as they are listed (all of them unless `limit` is given);
+    aggregate=true totals the prefix recursively in the same pass.
+    """
+    if aggregate:
+        recursive = True
     try:
-        objects = minio_client.list_objects(bucket_name, prefix=prefix, recursive=recursive)
+        after = (
+            listing.decode_token(continuation_token, bucket_name, prefix, recursive)
+            if continuation_token else start_after
+        )
+    except listing.InvalidContinuationToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        objects = listing.after_key(
+            minio_client.list_objects(bucket_name, prefix=prefix, recursive=recursive, start_after=after),
+            after
+        )
+        if format == "ndjson":
+            # Fetch the first entries here so a missing bucket is still an error status
+            batch = await storage_io.run("list_objects", take_objects, objects, LIST_PAGE_SIZE)
+            return StreamingResponse(
+                stream_listing(objects, batch, bucket_name, prefix, recursive, limit, aggregate),
+                media_type="application/x-ndjson"
+            )
+        if aggregate:
+            totals = listing.PrefixTotals(prefix)
+            while True:
+                batch = await storage_io.run("list_objects", take_objects, objects, LIST_PAGE_SIZE)
+                if not batch:
+                    break
+                for obj in batch:
+                    totals.add(obj)
+            return totals.to_dict()
+
+        files, truncated = await storage_io.run("list_objects", listing.take, objects, limit or LIST_PAGE_SIZE)
         return {
-            "files": [
-                {
-                    "name": obj.object_name,
-                    "size": obj.size,
-                    "last_modified": obj.last_modified.isoformat() if obj.last_modified else None,
-                    "is_dir": obj.is_dir
-                }
-                for obj in objects
-            ]
+            "files": files,
+            "is_truncated": truncated,
+            "next_continuation_token": (
+                listing.encode_token(bucket_name, prefix, recursive, files[-1]["name"]) if truncated else None
+            ),
         }
     except S3Error as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def take_objects(objects, count: int) -> list:
+    """The next `count` entries of a lazy listing (the next page requests run here)"""
+    return list(islice(objects, count))
+
+
+async def stream_listing(objects, batch: list, bucket_name: str, prefix: str, recursive: bool,
+                         limit: Optional[int], aggregate: bool):
+    """NDJSON lines for each entry, then a continuation token or totals line if asked for"""
+    totals = listing.PrefixTotals(prefix) if aggregate else None
+    sent = 0
+    last = None
+    try:
+        while batch:
+            for obj in batch:
+                if limit is not None and sent == limit:
+                    yield json.dumps({
+                        "next_continuation_token": listing.encode_token(bucket_name, prefix, recursive, last)
+                    }) + "\n"
+                    return
+                if totals is not None:
+                    totals.add(obj)
+                yield json.dumps(listing.describe(obj)) + "\n"
+                last = obj.object_name
+                sent += 1
+            batch = await storage_io.run("list_objects", take_objects, objects, LIST_PAGE_SIZE)
+    except S3Error as e:
+        # The status line is already sent: report the failure in the stream
+        logger.error(f"Listing {bucket_name}/{prefix} failed after {sent} entries: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+        return
+    if totals is not None:
+        yield json.dumps({"summary": totals.to_dict()}) + "\n"
+
+
 @app.post("/api/storage/files/{bucket_name}")
 async def upload_file(
     bucket_name: str,
@@ -251,13 +545,17 @@ async def upload_file(
         file_size = file.file.tell()
         file.file.seek(0)
         
-        result = minio_client.put_object(
+        started = time.perf_counter()
+        result = await storage_io.run(
+            "put_object",
+            minio_client.put_object,
             bucket_name,
             object_name,
             file.file,
             file_size,
             content_type=file.content_type
         )
+        metrics.observe_upload("put_object", file_size, time.perf_counter() - started)
         
         return FileUploadResponse(
             path=object_name,
@@ -268,24 +566,494 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/storage/archives/{bucket_name}")
+async def upload_archive(
+    bucket_name: str,
+    request: Request,
+    prefix: str = Query(default="", description="Path within the bucket the archive is unpacked under")
+):
+    """
+    Unpack a tar, tar.gz or zip archive sent as the raw request body into a
+    bucket, as it arrives. Returns every file written with its size and
+    ETag (or error), files skipped, and the overall throughput.
+    """
+    try:
+        if not await storage_io.run("bucket_exists", minio_client.bucket_exists, bucket_name):
+            raise HTTPException(status_code=404, detail="Bucket not found")
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    body = archive_ingest.BodyReader(request.stream(), asyncio.get_running_loop())
+    try:
+        report = await run_in_threadpool(
+            archive_ingest.ingest, minio_client, storage_io, bucket_name, prefix, body,
+            ARCHIVE_PARALLEL_WRITES, ARCHIVE_BUFFER_ENTRY_BYTES, UPLOAD_PART_SIZE, ARCHIVE_MAX_FILES
+        )
+    except archive_ingest.ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    metrics.observe_upload("archive", report["bytes"], report["seconds"])
+    return report
+
+
+def parse_range(header: Optional[str], size: int):
+    """
+    (start, end) inclusive for a single-range "bytes=" header, None to serve
+    the whole object (no header, or several ranges). Raises 416 if unsatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes (e.g. a Parquet footer)
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [t.strip().removeprefix("W/").strip('"') for t in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def stream_object(response, chunk_size: int):
+    """Yield an object's body chunk by chunk, reading on the I/O pool"""
+    chunks = response.stream(chunk_size)
+    try:
+        while True:
+            chunk = await storage_io.run("get_object_read", next, chunks, None)
+            if chunk is None:
+                break
+            metrics.count_bytes("get_object", "out", len(chunk))
+            yield chunk
+    finally:
+        response.close()
+        response.release_conn()
+
+
+@app.api_route("/api/storage/files/{bucket_name}/{file_path:path}", methods=["GET", "HEAD"])
+async def download_file(
+    bucket_name: str,
+    file_path: str,
+    request: Request,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    if_range: Optional[str] = Header(None, alias="If-Range")
+):
+    """
+    Stream a file without buffering it. Supports single byte ranges (206),
+    If-Range and If-None-Match (304), so readers such as Parquet clients can
+    fetch just the footer and the row groups they need.
+    """
+    try:
+        stat = await storage_io.run("stat_object", minio_client.stat_object, bucket_name, file_path)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchBucket"):
+            raise HTTPException(status_code=404, detail="File not found")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"ETag": f'"{stat.etag}"', "Accept-Ranges": "bytes"}
+    if stat.last_modified:
+        headers["Last-Modified"] = stat.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    if etag_matches(if_none_match, stat.etag):
+        return Response(status_code=304, headers=headers)
+
+    # A range is only valid for the version the client saw (If-Range)
+    byte_range = None
+    if not if_range or etag_matches(if_range, stat.etag):
+        byte_range = parse_range(range_header, stat.size)
+    status_code = 200
+    offset, length = 0, stat.size
+    if byte_range:
+        status_code = 206
+        offset, length = byte_range[0], byte_range[1] - byte_range[0] + 1
+        headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{stat.size}"
+    headers["Content-Length"] = str(length)
+    media_type = stat.content_type or "application/octet-stream"
+
+    if request.method == "HEAD" or length == 0:
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    try:
+        response = await storage_io.run(
+            "get_object", minio_client.get_object, bucket_name, file_path, offset=offset, length=length
+        )
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        stream_object(response, DOWNLOAD_CHUNK_BYTES),
+        status_code=status_code, headers=headers, media_type=media_type
+    )
+
+
 @app.delete("/api/storage/files/{bucket_name}/{file_path:path}")
 async def delete_file(bucket_name: str, file_path: str):
     """Delete a file from a bucket"""
     try:
-        minio_client.remove_object(bucket_name, file_path)
+        await storage_io.run("remove_object", minio_client.remove_object, bucket_name, file_path)
         return {"message": f"File '{file_path}' deleted successfully"}
     except S3Error as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Chunked (multipart) uploads
+# Parts go straight into an S3 multipart upload and can be sent in parallel;
+# after a failure GET /uploads/{id} lists the parts already stored so only
+# the missing ones are re-sent. Sessions are tracked in 'upload_sessions'.
+UPLOADING = "uploading"
+COMPLETED = "completed"
+ABORTED = "aborted"
+
+# Presigned part URLs returned with the initiate response
+PRESIGN_BATCH = 100
+
+
+def fetch_upload(upload_id: str) -> Optional[dict]:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM upload_sessions WHERE upload_id = %s", (upload_id,))
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def save_upload(upload_id: str, bucket: str, object_name: str, content_type: Optional[str],
+                part_size: int, presigned: bool, owner_id: Optional[int]) -> dict:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO upload_sessions
+                (upload_id, bucket, object_name, content_type, part_size, presigned, owner_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            RETURNING *
+            """,
+            (upload_id, bucket, object_name, content_type, part_size, presigned, owner_id)
+        )
+        session = cur.fetchone()
+        conn.commit()
+        return session
+    finally:
+        conn.close()
+
+
+def update_upload(upload_id: str, status: Optional[str] = None,
+                  size_bytes: Optional[int] = None, etag: Optional[str] = None):
+    """Record progress (refreshes updated_at) or the final status"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE upload_sessions SET
+                status = COALESCE(%s, status),
+                size_bytes = COALESCE(%s, size_bytes),
+                etag = COALESCE(%s, etag),
+                completed_at = CASE WHEN %s = 'completed' THEN NOW() ELSE completed_at END,
+                updated_at = NOW()
+            WHERE upload_id = %s
+            """,
+            (status, size_bytes, etag, status, upload_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def get_upload_for_user(upload_id: str, user: Optional[dict], active: bool = True) -> dict:
+    session = await run_in_threadpool(fetch_upload, upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if user and user.get("role") != "admin" and session["owner_id"] != user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to access this upload")
+    if active and session["status"] != UPLOADING:
+        raise HTTPException(status_code=409, detail=f"Upload is {session['status']}")
+    return session
+
+
+def check_part_number(part_number: int):
+    if part_number < 1 or part_number > multipart_uploads.MAX_PARTS:
+        raise HTTPException(status_code=400, detail=f"part_number must be between 1 and {multipart_uploads.MAX_PARTS}")
+
+
+def presigned_urls(session: dict, part_numbers) -> dict:
+    expires = timedelta(seconds=UPLOAD_PRESIGN_EXPIRY_SECONDS)
+    return {
+        str(n): multipart_uploads.presigned_part_url(
+            presign_client, session["bucket"], session["object_name"], session["upload_id"], n, expires
+        )
+        for n in part_numbers
+    }
+
+
+def abort_stale_uploads() -> int:
+    """Abort uploads without activity for UPLOAD_SESSION_TTL_HOURS"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM upload_sessions WHERE status = %s AND updated_at < NOW() - make_interval(hours => %s)",
+            (UPLOADING, UPLOAD_SESSION_TTL_HOURS)
+        )
+        stale = cur.fetchall()
+    finally:
+        conn.close()
+    for session in stale:
+        try:
+            storage_io.call("abort_multipart_upload", multipart_uploads.abort, minio_client,
+                            session["bucket"], session["object_name"], session["upload_id"])
+        except S3Error as e:
+            # Already gone from MinIO (e.g. aborted there); just close the session
+            if e.code != "NoSuchUpload":
+                logger.error(f"Failed to abort stale upload {session['upload_id']}: {e}")
+                continue
+        update_upload(session["upload_id"], status=ABORTED)
+    return len(stale)
+
+
+async def abort_stale_uploads_periodically(interval: int = 3600):
+    """Background task: abort abandoned multipart uploads and their parts"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            aborted = await run_in_threadpool(abort_stale_uploads)
+            if aborted:
+                logger.info(f"Aborted {aborted} stale uploads")
+        except Exception as e:
+            logger.error(f"Stale upload cleanup failed: {e}")
+
+
+@app.post("/api/storage/uploads")
+async def initiate_upload(
+    upload: UploadInitiate,
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """
+    Start a chunked upload. Returns the upload id and part size; in presigned
+    mode also URLs to PUT the first parts to directly (more from /urls).
+    """
+    object_name = f"{upload.path}/{upload.filename}".lstrip("/")
+    part_size = multipart_uploads.part_size_for(upload.size, UPLOAD_PART_SIZE)
+    if upload.size and upload.size > part_size * multipart_uploads.MAX_PARTS:
+        raise HTTPException(status_code=400, detail="File is too large for a multipart upload")
+    try:
+        upload_id = await storage_io.run(
+            "create_multipart_upload", multipart_uploads.initiate, minio_client,
+            upload.bucket, object_name, upload.content_type
+        )
+        session = await run_in_threadpool(
+            save_upload, upload_id, upload.bucket, object_name, upload.content_type,
+            part_size, upload.presigned, user["id"] if user else None
+        )
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    response = {
+        "upload_id": upload_id,
+        "bucket": upload.bucket,
+        "object_name": object_name,
+        "part_size": part_size,
+        "part_count": -(-upload.size // part_size) if upload.size else None,
+        "presigned": upload.presigned,
+    }
+    if upload.presigned:
+        count = min(response["part_count"] or 1, PRESIGN_BATCH)
+        response["part_urls"] = presigned_urls(session, range(1, count + 1))
+    return response
+
+
+@app.get("/api/storage/uploads/{upload_id}")
+async def get_upload(upload_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """Upload status and the parts already stored (to resume after a failure)"""
+    session = await get_upload_for_user(upload_id, user, active=False)
+    parts = []
+    if session["status"] == UPLOADING:
+        try:
+            parts = await storage_io.run(
+                "list_parts", multipart_uploads.list_parts, minio_client,
+                session["bucket"], session["object_name"], upload_id
+            )
+        except S3Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    return {"upload": session, "parts": parts, "uploaded_bytes": sum(p["size"] or 0 for p in parts)}
+
+
+@app.put("/api/storage/uploads/{upload_id}/parts/{part_number}")
+async def upload_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """
+    Store one part from the raw request body. Parts may be sent in parallel
+    and in any order; re-sending a part number replaces it. A Content-MD5
+    header is checked by MinIO.
+    """
+    check_part_number(part_number)
+    session = await get_upload_for_user(upload_id, user)
+
+    # Buffered in memory (never on disk), bounded by the upload's part size.
+    # The MinIO client signs and sends the part from a single bytes object;
+    # BytesIO.getvalue() hands over its buffer without copying it again.
+    limit = min(session.get("part_size") or UPLOAD_MAX_PART_BYTES, UPLOAD_MAX_PART_BYTES)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail=f"Parts of this upload are limited to {limit} bytes")
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    async for chunk in request.stream():
+        buffer.write(chunk)
+        if buffer.tell() > limit:
+            raise HTTPException(status_code=413, detail=f"Parts of this upload are limited to {limit} bytes")
+    body = buffer.getvalue()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty part")
+
+    try:
+        etag = await storage_io.run(
+            "upload_part", multipart_uploads.upload_part, minio_client,
+            session["bucket"], session["object_name"], upload_id, part_number,
+            body, request.headers.get("content-md5")
+        )
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    metrics.observe_upload("upload_part", len(body), time.perf_counter() - started)
+    await run_in_threadpool(update_upload, upload_id)
+    return {"part_number": part_number, "etag": etag, "size": len(body)}
+
+
+@app.get("/api/storage/uploads/{upload_id}/urls")
+async def get_upload_urls(
+    upload_id: str,
+    parts: str = Query(..., description="Part numbers, e.g. 1-8 or 3,5,9"),
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """Presigned URLs to PUT the given parts to MinIO directly"""
+    session = await get_upload_for_user(upload_id, user)
+    ranges = []
+    try:
+        for item in parts.split(","):
+            first, _, last = item.strip().partition("-")
+            ranges.append((int(first), int(last or first)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="parts must be numbers or ranges like 1-8")
+    # Validated before expanding, so a huge range cannot build a huge list
+    for first, last in ranges:
+        check_part_number(first)
+        check_part_number(last)
+        if first > last:
+            raise HTTPException(status_code=400, detail=f"Invalid part range {first}-{last}")
+    if sum(last - first + 1 for first, last in ranges) > PRESIGN_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {PRESIGN_BATCH} parts per request")
+    numbers = [number for first, last in ranges for number in range(first, last + 1)]
+    return {"upload_id": upload_id, "part_urls": presigned_urls(session, numbers)}
+
+
+@app.post("/api/storage/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    body: Optional[UploadComplete] = None,
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """Assemble the object from its parts (all uploaded parts by default)"""
+    session = await get_upload_for_user(upload_id, user)
+    parts = [(p.part_number, p.etag) for p in body.parts] if body and body.parts else None
+    try:
+        result = await storage_io.run(
+            "complete_multipart_upload", multipart_uploads.complete, minio_client,
+            session["bucket"], session["object_name"], upload_id, parts
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    await run_in_threadpool(update_upload, upload_id, COMPLETED, result["size"], result["etag"])
+    return FileUploadResponse(path=session["object_name"], size=result["size"], etag=result["etag"])
+
+
+@app.delete("/api/storage/uploads/{upload_id}")
+async def abort_upload(upload_id: str, user: Optional[dict] = Depends(get_current_user)):
+    """Abort an upload and discard its stored parts"""
+    session = await get_upload_for_user(upload_id, user)
+    try:
+        await storage_io.run(
+            "abort_multipart_upload", multipart_uploads.abort, minio_client,
+            session["bucket"], session["object_name"], upload_id
+        )
+    except S3Error as e:
+        if e.code != "NoSuchUpload":
+            raise HTTPException(status_code=500, detail=str(e))
+    await run_in_threadpool(update_upload, upload_id, ABORTED)
+    return {"message": f"Upload '{upload_id}' aborted"}
+
+
+def catalog_response(entry, if_none_match: Optional[str], if_modified_since: Optional[str]):
+    """The cached body with its validators, or 304 if the client's copy is current"""
+    headers = {"ETag": f'"{entry.etag}"', "Cache-Control": "private, no-cache"}
+    last_modified = None
+    if entry.last_modified:
+        # HTTP dates have whole seconds
+        last_modified = entry.last_modified.astimezone(timezone.utc).replace(microsecond=0)
+        headers["Last-Modified"] = last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present
+        not_modified = etag_matches(if_none_match, entry.etag)
+    else:
+        not_modified = last_modified is not None and not_modified_since(if_modified_since, last_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(entry.body), headers=headers)
+
+
+def not_modified_since(header: Optional[str], last_modified: datetime) -> bool:
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+
 # Table management (Delta Lake catalog)
+# These handlers are sync so FastAPI runs them on its threadpool: psycopg2
+# calls would otherwise block the event loop.
 @app.get("/api/storage/tables")
-async def list_tables(
+def list_tables(
     database: str = Query(default="default"),
-    user: Optional[dict] = Depends(get_current_user)
+    user: Optional[dict] = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    if_modified_since: Optional[str] = Header(None, alias="If-Modified-Since")
 ):
     """List all Delta Lake tables"""
+    if user and user.get("role") == "admin":
+        scope = "admin"
+    else:
+        scope = ("user", user["id"]) if user else "public"
+    key = ("tables", database, scope)
+    cached = catalog_cache.get(key)
+    if cached:
+        return catalog_response(cached, if_none_match, if_modified_since)
+
+    conn = None
     try:
+        generation = catalog_cache.generation
         conn = get_db_connection()
         cur = conn.cursor()
         
@@ -307,18 +1075,27 @@ async def list_tables(
         
         cur.execute(query, tuple(params))
         tables = cur.fetchall()
-        conn.close()
-        return {"tables": tables}
+        etag, last_modified = validators(
+            [(t["id"], t["updated_at"]) for t in tables], [t["updated_at"] for t in tables]
+        )
+        entry = catalog_cache.put(key, {"tables": tables}, etag, last_modified, generation)
+        return catalog_response(entry, if_none_match, if_modified_since)
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
 
 
 @app.post("/api/storage/tables")
-async def create_table(
+def create_table(
     table: TableCreate,
     user: Optional[dict] = Depends(get_current_user)
 ):
     """Register a new Delta Lake table"""
+    conn = None
     try:
         location = table.location or f"s3a://{DEFAULT_BUCKET}/tables/{table.database}/{table.name}"
         owner_id = user["id"] if user else None
@@ -337,40 +1114,68 @@ async def create_table(
         )
         new_table = cur.fetchone()
         conn.commit()
-        conn.close()
+        catalog_cache.invalidate(new_table["id"])
         
         return {"table": new_table}
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
 
 
 @app.get("/api/storage/tables/{table_id}")
-async def get_table(table_id: int):
+def get_table(
+    table_id: int,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    if_modified_since: Optional[str] = Header(None, alias="If-Modified-Since")
+):
     """Get table details"""
+    cached = catalog_cache.get(("table", table_id))
+    if cached:
+        return catalog_response(cached, if_none_match, if_modified_since)
+
+    conn = None
     try:
+        generation = catalog_cache.generation
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute("SELECT * FROM data_tables WHERE id = %s", (table_id,))
         table = cur.fetchone()
-        conn.close()
+        if table:
+            # Collected by the query engine; None until the first refresh
+            cur.execute("SELECT * FROM table_stats WHERE table_id = %s", (table_id,))
+            table["stats"] = cur.fetchone()
         
         if not table:
             raise HTTPException(status_code=404, detail="Table not found")
         
-        return {"table": table}
-    except HTTPException:
+        # Stats are written by the query engine: they count as a change too
+        computed_at = table["stats"]["computed_at"] if table["stats"] else None
+        etag, last_modified = validators(
+            [(table["id"], table["updated_at"], computed_at)], [table["updated_at"], computed_at]
+        )
+        entry = catalog_cache.put(("table", table_id), {"table": table}, etag, last_modified, generation)
+        return catalog_response(entry, if_none_match, if_modified_since)
+    except (HTTPException, PoolTimeout):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
 
 
 @app.delete("/api/storage/tables/{table_id}")
-async def delete_table(
+def delete_table(
     table_id: int, 
     drop_data: bool = Query(default=False),
     user: Optional[dict] = Depends(get_current_user)
 ):
     """Delete a table from the catalog"""
+    conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
@@ -380,7 +1185,6 @@ async def delete_table(
         table = cur.fetchone()
         
         if not table:
-            conn.close()
             raise HTTPException(status_code=404, detail="Table not found")
         
         # Check ownership
@@ -388,14 +1192,17 @@ async def delete_table(
             is_admin = user.get("role") == "admin"
             is_owner = table["owner_id"] == user["id"]
             if not (is_admin or is_owner):
-                conn.close()
                 raise HTTPException(status_code=403, detail="Not authorized to delete this table")
 
         # Delete from catalog
         cur.execute("DELETE FROM data_tables WHERE id = %s", (table_id,))
         conn.commit()
+        catalog_cache.invalidate(table_id)
+        # Give the connection back before the (possibly slow) data deletion
         conn.close()
         
+        result = {"message": f"Table '{table['name']}' deleted successfully"}
+
         # Optionally drop data from storage
         if drop_data and table["location"]:
             try:
@@ -405,21 +1212,92 @@ async def delete_table(
                     path_parts = table["location"].replace("s3a://", "").split("/", 1)
                     if len(path_parts) == 2:
                         bucket_name, prefix = path_parts
-                        # List and delete all objects in the prefix
-                        objects = minio_client.list_objects(bucket_name, prefix=prefix, recursive=True)
-                        for obj in objects:
-                            minio_client.remove_object(bucket_name, obj.object_name)
-                        # Also remove the directory marker if it exists
-                        minio_client.remove_object(bucket_name, prefix)
+                        prefix = prefix.rstrip("/")
+                        # Delete everything under the table's directory (the
+                        # trailing slash keeps sibling tables like <name>_v2
+                        # out), then its directory markers
+                        job = deletions.submit(
+                            bucket_name, prefix + "/", user["id"] if user else None,
+                            extra_keys=[prefix, prefix + "/"]
+                        )
+                        result["deletion_job"] = job.to_dict(with_errors=False)
             except Exception as e:
                 logger.error(f"Failed to delete data for table {table['name']}: {e}")
                 # We don't fail the request if data deletion fails, but we log it
         
-        return {"message": f"Table '{table['name']}' deleted successfully"}
-    except HTTPException:
+        return result
+    except (HTTPException, PoolTimeout):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
+
+
+# Storage usage
+@app.get("/api/storage/usage/buckets")
+def list_bucket_usage():
+    """Object count and bytes of every indexed bucket"""
+    return {"buckets": usage_index.buckets()}
+
+
+@app.get("/api/storage/usage/buckets/{bucket_name}")
+def get_prefix_usage(
+    bucket_name: str,
+    prefix: str = Query(default="", description="Directory prefix; the whole bucket if empty"),
+    children: bool = Query(default=False, description="Also list the direct sub-prefixes, largest first"),
+    limit: int = Query(default=100, ge=1, le=1000, description="Sub-prefixes returned")
+):
+    """Object count and bytes under a prefix, from the usage index"""
+    prefix = prefix.strip("/") + "/" if prefix.strip("/") else BUCKET_ROOT
+    usage = usage_index.prefix(bucket_name, prefix)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="Bucket not indexed (yet)")
+    if children:
+        usage["children"] = usage_index.children(bucket_name, prefix, limit)
+    return usage
+
+
+@app.post("/api/storage/usage/buckets/{bucket_name}/rescan", status_code=202)
+def rescan_bucket_usage(bucket_name: str, user: Optional[dict] = Depends(get_current_user)):
+    """Rebuild a bucket's usage from a full listing in the background (admin only)"""
+    if user and user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can rescan bucket usage")
+    usage_indexer.request_rescan(bucket_name)
+    return {"message": f"Rescan of bucket '{bucket_name}' requested"}
+
+
+def usage_visibility(user: Optional[dict]) -> dict:
+    """Which tables' usage a caller may see: same rule as list_tables"""
+    return {
+        "all_tables": bool(user and user.get("role") == "admin"),
+        "user_id": user["id"] if user else None,
+    }
+
+
+@app.get("/api/storage/usage/tables")
+def list_table_usage(
+    database: Optional[str] = Query(default=None),
+    user: Optional[dict] = Depends(get_current_user)
+):
+    """Object count and bytes under each visible catalog table's location, largest first"""
+    return {"tables": usage_index.tables(database=database, **usage_visibility(user))}
+
+
+@app.get("/api/storage/usage/tables/{table_id}")
+def get_table_usage(table_id: int, user: Optional[dict] = Depends(get_current_user)):
+    """Object count and bytes under a catalog table's location"""
+    tables = usage_index.tables(table_id=table_id, **usage_visibility(user))
+    if not tables:
+        raise HTTPException(status_code=404, detail="Table not found")
+    return tables[0]
+
+
+@app.get("/api/storage/usage/owners")
+def list_owner_usage(user: Optional[dict] = Depends(get_current_user)):
+    """Table count and bytes per table owner, over the tables the caller can see"""
+    return {"owners": usage_index.owners(**usage_visibility(user))}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""
+S3 multipart uploads through the MinIO client.
+The client's public API only uses multipart uploads inside put_object; these
+wrap its lower-level calls so that parts can arrive in separate (and
+parallel) requests, be listed again to resume after a failure, or be written
+by the caller straight to MinIO with presigned URLs.
+"""
+
+import math
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from minio import Minio
+from minio.datatypes import Part
+
+# S3 limits: every part but the last must be at least 5 MiB, at most 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def part_size_for(size: Optional[int], preferred: int) -> int:
+    """`preferred`, grown if needed so that `size` bytes fit in MAX_PARTS parts"""
+    part_size = max(preferred, MIN_PART_SIZE)
+    if size:
+        part_size = max(part_size, math.ceil(size / MAX_PARTS))
+    return part_size
+
+
+def initiate(client: Minio, bucket: str, object_name: str, content_type: Optional[str]) -> str:
+    """Start a multipart upload and return its upload id"""
+    headers = {"Content-Type": content_type or "application/octet-stream"}
+    return client._create_multipart_upload(bucket, object_name, headers)
+
+
+def upload_part(client: Minio, bucket: str, object_name: str, upload_id: str,
+                part_number: int, data: bytes, content_md5: Optional[str] = None) -> str:
+    """Upload one part; returns its ETag. Re-uploading a part number replaces it."""
+    headers = {"Content-MD5": content_md5} if content_md5 else None
+    return client._upload_part(bucket, object_name, data, headers, upload_id, part_number)
+
+
+def list_parts(client: Minio, bucket: str, object_name: str, upload_id: str) -> List[Dict]:
+    """Every part uploaded so far, in part number order"""
+    parts = []
+    marker = None
+    while True:
+        result = client._list_parts(bucket, object_name, upload_id, max_parts=1000,
+                                    part_number_marker=marker)
+        parts.extend(
+            {
+                "part_number": p.part_number,
+                "etag": p.etag,
+                "size": p.size,
+                "last_modified": p.last_modified.isoformat() if p.last_modified else None,
+            }
+            for p in result.parts
+        )
+        if not result.is_truncated:
+            return parts
+        marker = str(result.next_part_number_marker)
+
+
+def complete(client: Minio, bucket: str, object_name: str, upload_id: str,
+             parts: Optional[List[Tuple[int, str]]] = None) -> Dict:
+    """
+    Assemble the object from `parts` (part number, ETag), or from every
+    uploaded part if none are given. Returns the object's ETag and size.
+    """
+    uploaded = list_parts(client, bucket, object_name, upload_id)
+    if parts is None:
+        parts = [(p["part_number"], p["etag"]) for p in uploaded]
+    if not parts:
+        raise ValueError("No parts have been uploaded")
+    sizes = {p["part_number"]: p["size"] or 0 for p in uploaded}
+    missing = [number for number, _ in parts if number not in sizes]
+    if missing:
+        raise ValueError(f"Parts not uploaded: {missing}")
+    parts = sorted(parts)
+    result = client._complete_multipart_upload(
+        bucket, object_name, upload_id, [Part(number, etag) for number, etag in parts]
+    )
+    return {
+        "etag": result.etag,
+        "size": sum(sizes[number] for number, _ in parts),
+        "parts": len(parts),
+    }
+
+
+def abort(client: Minio, bucket: str, object_name: str, upload_id: str):
+    """Discard the upload and every part stored for it"""
+    client._abort_multipart_upload(bucket, object_name, upload_id)
+
+
+def presigned_part_url(client: Minio, bucket: str, object_name: str, upload_id: str,
+                       part_number: int, expires: timedelta) -> str:
+    """URL the caller can PUT one part to directly; the response carries its ETag"""
+    return client.get_presigned_url(
+        "PUT", bucket, object_name, expires=expires,
+        extra_query_params={"uploadId": upload_id, "partNumber": str(part_number)},
+    )
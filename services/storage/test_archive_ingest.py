@@ -0,0 +1,159 @@
+import io
+import tarfile
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+from archive_ingest import ArchiveError, ingest, object_key
+from io_pool import IOPool
+
+
+class FakeMinio:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.objects = {}
+        self.lengths = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, bucket, name, data, length, content_type=None, part_size=0):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        body = data.read()
+        with self._lock:
+            self.in_flight -= 1
+            self.objects[name] = body
+            self.lengths[name] = length
+        return SimpleNamespace(etag=f"etag-{name}")
+
+
+class Unseekable(io.RawIOBase):
+    """Write-only stream, so zipfile writes data descriptors as when streaming"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+FILES = {
+    "data/a.csv": b"id,value\n1,2\n",
+    "data/nested/b.json": b'{"x": 1}\n' * 1000,
+    "empty.txt": b"",
+}
+
+
+def make_tar(files, mode="w:gz"):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode=mode) as tar:
+        directory = tarfile.TarInfo("data/")
+        directory.type = tarfile.DIRTYPE
+        tar.addfile(directory)
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return out.getvalue()
+
+
+def make_zip(files, compression=zipfile.ZIP_DEFLATED, streamed=True):
+    out = Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression=compression) as archive:
+        archive.writestr("data/", b"")
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return bytes(out.data) if streamed else out.getvalue()
+
+
+def run(archive, client=None, parallel=4, buffer_bytes=1024 * 1024, prefix="raw"):
+    client = client or FakeMinio()
+    report = ingest(client, IOPool(8), "bucket", prefix, io.BytesIO(archive),
+                    parallel, buffer_bytes, 5 * 1024 * 1024, 1000)
+    return client, report
+
+
+def test_object_key_stays_under_prefix():
+    assert object_key("raw/", "./a/b.csv") == "raw/a/b.csv"
+    assert object_key("", "/a.csv") == "a.csv"
+    assert object_key("raw", "../etc/passwd") is None
+    assert object_key("raw", "./") is None
+
+
+@pytest.mark.parametrize("archive", [
+    make_tar(FILES, "w:gz"),
+    make_tar(FILES, "w"),
+    make_zip(FILES),
+    make_zip(FILES, zipfile.ZIP_STORED, streamed=False),
+], ids=["tar.gz", "tar", "zip-streamed", "zip-stored"])
+def test_ingest_writes_every_file_with_manifest(archive):
+    client, report = run(archive)
+
+    assert client.objects == {f"raw/{name}": content for name, content in FILES.items()}
+    assert [(f["path"], f["size"], f["etag"]) for f in report["files"]] == [
+        (f"raw/{name}", len(content), f"etag-raw/{name}") for name, content in FILES.items()
+    ]
+    assert [s["reason"] for s in report["skipped"]] == ["not a file"]
+    assert report["written"] == 3
+    assert report["bytes"] == sum(len(c) for c in FILES.values())
+    assert report["archive_bytes"] == len(archive)
+
+
+def test_ingest_bounds_parallel_writes():
+    files = {f"part-{i}.csv": b"x" * 100 for i in range(20)}
+    client, report = run(make_tar(files), FakeMinio(delay=0.01), parallel=3)
+
+    assert report["written"] == 20
+    assert 1 < client.max_in_flight <= 3
+
+
+def test_large_entries_are_streamed():
+    large = bytes(range(256)) * 400
+    client, report = run(make_zip({"big.bin": large, "small.txt": b"s"}), buffer_bytes=1000)
+
+    assert client.objects["raw/big.bin"] == large
+    # Size only known from the data descriptor: uploaded with unknown length
+    assert client.lengths["raw/big.bin"] == -1
+    assert report["files"][0]["size"] == len(large)
+    assert client.objects["raw/small.txt"] == b"s"
+
+
+def test_large_entry_put_failure_is_recorded():
+    class FailingMinio(FakeMinio):
+        def put_object(self, bucket, name, data, length, **kwargs):
+            if name == "raw/big.bin":
+                data.read()
+                raise ConnectionError("connection reset")
+            return super().put_object(bucket, name, data, length, **kwargs)
+
+    large = b"x" * 5000
+    client, report = run(make_tar({"big.bin": large, "small.txt": b"s"}), FailingMinio(), buffer_bytes=1000)
+
+    assert [(f["path"], f.get("error")) for f in report["files"]] == [
+        ("raw/big.bin", "connection reset"), ("raw/small.txt", None),
+    ]
+    assert client.objects == {"raw/small.txt": b"s"}
+
+
+def test_corrupt_zip_reports_files_already_written():
+    archive = bytearray(make_zip({"a.txt": b"a" * 100, "b.txt": b"b" * 100}, zipfile.ZIP_STORED, streamed=False))
+    # Flip a byte of b.txt's data
+    archive[archive.index(b"b" * 100)] = ord("c")
+
+    with pytest.raises(ArchiveError, match="CRC.*1 files were written"):
+        run(bytes(archive))
+
+
+def test_not_an_archive():
+    with pytest.raises(ArchiveError):
+        run(b"just some text, not an archive" * 100)
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+from types import SimpleNamespace
+from minio.deleteobjects import DeleteError
+
+import bulk_delete
+from bulk_delete import DeletionJobManager, is_empty
+from io_pool import IOPool
+
+
+class FakeMinio:
+    def __init__(self, keys, failing=(), delay=0.0):
+        self.keys = list(keys)
+        self.failing = set(failing)
+        self.delay = delay
+        self.requests = []
+        self.removed_buckets = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def list_objects(self, bucket, prefix="", recursive=False):
+        for key in self.keys:
+            if key.startswith(prefix):
+                yield SimpleNamespace(object_name=key)
+
+    def remove_objects(self, bucket, delete_objects):
+        names = [obj._name for obj in delete_objects]
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.requests.append(names)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        for name in names:
+            if name in self.failing:
+                yield DeleteError("AccessDenied", "Access Denied", name, None)
+
+    def remove_bucket(self, bucket):
+        self.removed_buckets.append(bucket)
+
+
+@pytest.fixture
+def pool():
+    pool = IOPool(8)
+    yield pool
+    pool.shutdown()
+
+def run_job(manager, *args, **kwargs):
+    job = manager.submit(*args, **kwargs)
+    deadline = time.time() + 5
+    while job.status not in bulk_delete.FINISHED_STATES and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+def test_deletes_in_batches(pool, monkeypatch):
+    monkeypatch.setattr(bulk_delete, "BATCH_SIZE", 10)
+    fake = FakeMinio([f"t/part-{i}" for i in range(25)] + ["t_v2/part-0"])
+    manager = DeletionJobManager(pool, lambda: fake, 1, 4, 60)
+
+    job = run_job(manager, "b", "t/", 1, extra_keys=["t", "t/"])
+
+    assert job.status == bulk_delete.SUCCEEDED
+    assert [len(r) for r in fake.requests] == [10, 10, 7]
+    assert job.listed == 25 and job.deleted == 27 and job.batches == 3
+    assert "t_v2/part-0" not in sum(fake.requests, [])
+
+def test_batches_run_in_parallel_within_window(pool, monkeypatch):
+    monkeypatch.setattr(bulk_delete, "BATCH_SIZE", 5)
+    fake = FakeMinio([f"k{i}" for i in range(60)], delay=0.05)
+    manager = DeletionJobManager(pool, lambda: fake, 1, 3, 60)
+
+    job = run_job(manager, "b", "", None)
+
+    assert job.deleted == 60
+    assert fake.max_in_flight == 3
+
+def test_failed_objects_are_reported(pool):
+    fake = FakeMinio(["a", "b", "c"], failing={"b"})
+    manager = DeletionJobManager(pool, lambda: fake, 1, 2, 60)
+
+    job = run_job(manager, "bucket", "", 7, remove_bucket=True)
+
+    assert job.status == bulk_delete.PARTIAL
+    assert job.deleted == 2 and job.failed == 1
+    assert job.to_dict()["errors"] == [{"key": "b", "code": "AccessDenied", "message": "Access Denied"}]
+    # Never remove a bucket that still has objects in it
+    assert fake.removed_buckets == []
+    assert [j.id for j in manager.list(7)] == [job.id]
+    assert manager.list(8) == []
+
+def test_bucket_removed_once_empty(pool):
+    fake = FakeMinio(["a", "b"])
+    manager = DeletionJobManager(pool, lambda: fake, 1, 2, 60)
+
+    job = run_job(manager, "bucket", "", None, remove_bucket=True)
+
+    assert job.status == bulk_delete.SUCCEEDED
+    assert fake.removed_buckets == ["bucket"]
+
+def test_is_empty():
+    assert is_empty(FakeMinio([]), "b")
+    assert not is_empty(FakeMinio(["x/1"]), "b", "x/")
@@ -0,0 +1,61 @@
+from catalog_cache import CATALOG_CHANNEL, STATS_CHANNEL, CatalogCache, CatalogChangeListener, validators
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CatalogCache(max_entries=2, ttl=60)
+    for key in ("a", "b"):
+        cache.put(("table", key), {}, "etag", None, cache.generation)
+    cache.get(("table", "a"))
+
+    cache.put(("table", "c"), {}, "etag", None, cache.generation)
+
+    assert cache.get(("table", "b")) is None
+    assert cache.get(("table", "a")) is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_entry_is_a_miss():
+    cache = CatalogCache(max_entries=2, ttl=0)
+    cache.put(("table", 1), {}, "etag", None, cache.generation)
+
+    assert cache.get(("table", 1)) is None
+
+def test_result_read_before_invalidation_is_not_stored():
+    cache = CatalogCache(max_entries=4, ttl=60)
+    generation = cache.generation
+    cache.invalidate(1)
+
+    cache.put(("tables", "default", "public"), {"tables": []}, "etag", None, generation)
+
+    assert cache.get(("tables", "default", "public")) is None
+
+def test_invalidate_keeps_other_tables():
+    cache = CatalogCache(max_entries=4, ttl=60)
+    for key in (("table", 1), ("table", 2), ("tables", "default", "admin")):
+        cache.put(key, {}, "etag", None, cache.generation)
+
+    cache.invalidate(1)
+
+    assert cache.get(("table", 2)) is not None
+    assert cache.get(("table", 1)) is None
+    assert cache.get(("tables", "default", "admin")) is None
+
+def test_etag_changes_with_rows():
+    assert validators([(1, "t1")], [])[0] != validators([(1, "t2")], [])[0]
+    assert validators([], [None])[1] is None
+
+def test_stats_change_invalidates_only_the_table_details():
+    cache = CatalogCache(max_entries=4, ttl=60)
+    listener = CatalogChangeListener(lambda: None, cache)
+    for key in (("table", 1), ("table", 2), ("tables", "default", "admin")):
+        cache.put(key, {}, "etag", None, cache.generation)
+
+    listener.apply(STATS_CHANNEL, '{"op": "update", "id": 1}')
+
+    assert cache.get(("table", 1)) is None
+    assert cache.get(("table", 2)) is not None
+    assert cache.get(("tables", "default", "admin")) is not None
+
+    listener.apply(CATALOG_CHANNEL, '{"op": "update", "id": 2}')
+
+    assert cache.get(("table", 2)) is None
+    assert cache.get(("tables", "default", "admin")) is None
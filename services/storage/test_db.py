@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+from psycopg2 import extensions
+from db import ConnectionPool, PoolTimeout
+
+
+def fake_connect():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.autocommit = False
+    conn.notifies = []
+    conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+@pytest.fixture
+def connect():
+    return MagicMock(side_effect=fake_connect)
+
+def test_connections_are_reused(connect):
+    pool = ConnectionPool(connect, max_size=2, acquire_timeout=1)
+
+    first = pool.connection()
+    raw = first._conn
+    first.close()
+    second = pool.connection()
+
+    assert second._conn is raw
+    assert connect.call_count == 1
+    assert pool.stats()["in_use"] == 1
+
+def test_acquire_times_out_when_exhausted(connect):
+    pool = ConnectionPool(connect, max_size=1, acquire_timeout=0.05)
+    held = pool.connection()
+
+    with pytest.raises(PoolTimeout):
+        pool.connection()
+    assert pool.stats()["timeouts"] == 1
+    held.close()
+
+def test_waiter_gets_released_connection(connect):
+    pool = ConnectionPool(connect, max_size=1, acquire_timeout=2)
+    held = pool.connection()
+    threading.Timer(0.05, held.close).start()
+
+    conn = pool.connection()
+
+    assert conn._conn is not None
+    assert pool.stats()["waited"] == 1
+    assert connect.call_count == 1
+
+def test_open_transaction_is_rolled_back_on_return(connect):
+    pool = ConnectionPool(connect, max_size=1, acquire_timeout=1)
+    conn = pool.connection()
+    raw = conn._conn
+    raw.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+
+    conn.close()
+
+    raw.rollback.assert_called_once()
+
+def test_broken_idle_connection_is_replaced(connect):
+    pool = ConnectionPool(connect, max_size=1, acquire_timeout=1, check_after=0)
+    conn = pool.connection()
+    raw = conn._conn
+    conn.close()
+    raw.cursor.side_effect = Exception("server closed the connection unexpectedly")
+
+    replacement = pool.connection()
+
+    assert replacement._conn is not raw
+    raw.close.assert_called_once()
+    assert pool.stats()["discarded"] == 1
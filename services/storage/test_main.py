@@ -1,7 +1,12 @@
+import io
+import json
+import tarfile
 import pytest
 from fastapi.testclient import TestClient
+from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 from main import app, get_db_connection, minio_client
+from catalog_cache import CatalogCache
 
 client = TestClient(app)
 
@@ -15,6 +20,12 @@ def mock_db():
         mock.return_value = conn
         yield conn, cursor
 
+# Each test starts with an empty catalog cache
+@pytest.fixture(autouse=True)
+def catalog_cache():
+    with patch("main.catalog_cache", CatalogCache(max_entries=16, ttl=60)) as cache:
+        yield cache
+
 # Mock MinIO Client
 @pytest.fixture
 def mock_minio():
@@ -73,6 +84,52 @@ def test_delete_table_admin(mock_db, mock_minio):
     assert response.status_code == 200
     assert "deleted successfully" in response.json()["message"]
 
+def test_delete_table_drop_data_starts_deletion_job(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = {"id": 1, "name": "test", "owner_id": 123, "location": "s3a://b/tables/test"}
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+
+    with patch("main.deletions") as deletions:
+        deletions.submit.return_value.to_dict.return_value = {"job_id": "abc", "status": "queued"}
+        response = client.delete("/api/storage/tables/1?drop_data=true", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["deletion_job"]["job_id"] == "abc"
+    # Trailing slash: a sibling table "tables/test_v2" must not match
+    deletions.submit.assert_called_once_with("b", "tables/test/", 123, extra_keys=["tables/test", "tables/test/"])
+
+def test_delete_non_empty_bucket(mock_minio):
+    listing = iter([MagicMock(object_name=f"k{i}") for i in range(3)])
+    mock_minio.list_objects.return_value = listing
+
+    response = client.delete("/api/storage/buckets/full")
+
+    assert response.status_code == 400
+    # The emptiness check stops at the first object
+    assert len(list(listing)) == 2
+    mock_minio.remove_bucket.assert_not_called()
+
+def test_force_delete_bucket_starts_deletion_job(mock_minio):
+    mock_minio.list_objects.return_value = iter([MagicMock(object_name="k")])
+
+    with patch("main.deletions") as deletions:
+        deletions.submit.return_value.to_dict.return_value = {"job_id": "abc", "status": "queued"}
+        response = client.delete("/api/storage/buckets/full?force=true", headers={"X-User-Id": "1", "X-User-Role": "admin"})
+
+    assert response.status_code == 202
+    deletions.submit.assert_called_once_with("full", "", 1, remove_bucket=True)
+
+@pytest.mark.parametrize("headers", [{}, {"X-User-Id": "123", "X-User-Role": "user"}])
+def test_force_delete_bucket_requires_admin(mock_minio, headers):
+    mock_minio.list_objects.return_value = iter([MagicMock(object_name="k")])
+
+    with patch("main.deletions") as deletions:
+        response = client.delete("/api/storage/buckets/full?force=true", headers=headers)
+
+    assert response.status_code == 403
+    deletions.submit.assert_not_called()
+    mock_minio.remove_bucket.assert_not_called()
+
 def test_list_tables_filtering(mock_db):
     conn, cursor = mock_db
     cursor.fetchall.return_value = []
@@ -86,3 +143,318 @@ def test_list_tables_filtering(mock_db):
     query = call_args[0][0]
     assert "owner_id = %s" in query
     assert "is_public = true" in query
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 0, 30, 123456, tzinfo=timezone.utc)
+
+def test_get_table_includes_stats(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchone.side_effect = [
+        {"id": 1, "name": "test", "owner_id": 123, "location": "s3a://b/p", "updated_at": UPDATED_AT},
+        {"table_id": 1, "row_count": 42, "size_bytes": 1024, "source": "delta_log", "computed_at": UPDATED_AT},
+    ]
+
+    response = client.get("/api/storage/tables/1")
+
+    assert response.status_code == 200
+    assert response.json()["table"]["stats"]["row_count"] == 42
+    assert "table_stats" in cursor.execute.call_args[0][0]
+
+def test_get_table_is_cached_and_revalidated(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchone.side_effect = [
+        {"id": 1, "name": "test", "owner_id": 123, "location": "s3a://b/p", "updated_at": UPDATED_AT},
+        None,
+    ]
+
+    first = client.get("/api/storage/tables/1")
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"] == "Wed, 01 May 2024 12:00:30 GMT"
+
+    assert client.get("/api/storage/tables/1", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(
+        "/api/storage/tables/1", headers={"If-Modified-Since": first.headers["last-modified"]}
+    ).status_code == 304
+    assert client.get("/api/storage/tables/1").json() == first.json()
+    # Served from the cache after the first request
+    assert cursor.execute.call_count == 2
+
+def test_table_listing_cache_invalidated_on_delete(mock_db):
+    conn, cursor = mock_db
+    row = {"id": 1, "name": "test", "owner_id": 123, "location": None, "updated_at": UPDATED_AT}
+    cursor.fetchall.return_value = [row]
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+    etag = client.get("/api/storage/tables", headers=headers).headers["etag"]
+    assert client.get("/api/storage/tables", headers=headers).status_code == 200
+    assert cursor.fetchall.call_count == 1
+
+    cursor.fetchone.return_value = row
+    client.delete("/api/storage/tables/1", headers=headers)
+    cursor.fetchall.return_value = []
+    response = client.get("/api/storage/tables", headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()["tables"] == []
+
+UPLOAD_SESSION = {
+    "upload_id": "up-1", "bucket": "openbricks-data", "object_name": "raw/big.csv",
+    "part_size": 16 * 1024 * 1024, "owner_id": 123, "status": "uploading",
+}
+
+def test_initiate_presigned_upload(mock_db, mock_minio):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = dict(UPLOAD_SESSION)
+    mock_minio._create_multipart_upload.return_value = "up-1"
+
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+    payload = {"bucket": "openbricks-data", "path": "raw", "filename": "big.csv",
+               "size": 40 * 1024 * 1024, "presigned": True}
+    response = client.post("/api/storage/uploads", json=payload, headers=headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["upload_id"] == "up-1"
+    assert body["part_count"] == 3
+    assert "partNumber=3" in body["part_urls"]["3"]
+    assert "uploadId=up-1" in body["part_urls"]["1"]
+
+def test_upload_part_streams_body_to_minio(mock_db, mock_minio):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = dict(UPLOAD_SESSION)
+    mock_minio._upload_part.return_value = "etag-2"
+
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+    response = client.put("/api/storage/uploads/up-1/parts/2", content=b"x" * 1024, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"part_number": 2, "etag": "etag-2", "size": 1024}
+    args = mock_minio._upload_part.call_args[0]
+    assert args[2] == b"x" * 1024
+    assert args[4:] == ("up-1", 2)
+
+def test_upload_part_larger_than_part_size_rejected(mock_db, mock_minio):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = dict(UPLOAD_SESSION, part_size=1024)
+
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+    response = client.put("/api/storage/uploads/up-1/parts/2", content=b"x" * 1025, headers=headers)
+
+    assert response.status_code == 413
+    mock_minio._upload_part.assert_not_called()
+
+@pytest.mark.parametrize("parts", ["1-1000000000", "1-101", "5-3", "0-2", "abc"])
+def test_upload_urls_rejects_bad_ranges(mock_db, mock_minio, parts):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = dict(UPLOAD_SESSION, presigned=True)
+
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+    response = client.get(f"/api/storage/uploads/up-1/urls?parts={parts}", headers=headers)
+
+    assert response.status_code == 400
+
+def test_upload_part_of_other_user_forbidden(mock_db, mock_minio):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = dict(UPLOAD_SESSION, owner_id=999)
+
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+    response = client.put("/api/storage/uploads/up-1/parts/1", content=b"x", headers=headers)
+
+    assert response.status_code == 403
+    mock_minio._upload_part.assert_not_called()
+
+def test_complete_upload_uses_uploaded_parts(mock_db, mock_minio):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = dict(UPLOAD_SESSION)
+    listing = MagicMock(is_truncated=False)
+    listing.parts = [
+        MagicMock(part_number=2, etag="e2", size=10, last_modified=None),
+        MagicMock(part_number=1, etag="e1", size=20, last_modified=None),
+    ]
+    mock_minio._list_parts.return_value = listing
+    mock_minio._complete_multipart_upload.return_value = MagicMock(etag="final")
+
+    headers = {"X-User-Id": "123", "X-User-Role": "user"}
+    response = client.post("/api/storage/uploads/up-1/complete", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"path": "raw/big.csv", "size": 30, "etag": "final"}
+    parts = mock_minio._complete_multipart_upload.call_args[0][3]
+    assert [p.part_number for p in parts] == [1, 2]
+
+def mock_object(mock_minio, data: bytes):
+    mock_minio.stat_object.return_value = MagicMock(
+        etag="abc123", size=len(data), content_type="application/octet-stream",
+        last_modified=datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    )
+
+    def get_object(bucket, path, offset=0, length=0):
+        body = MagicMock()
+        body.stream.return_value = iter([data[offset:offset + length]])
+        return body
+    mock_minio.get_object.side_effect = get_object
+
+def test_download_file_streams_object(mock_minio):
+    mock_object(mock_minio, b"0123456789")
+
+    response = client.get("/api/storage/files/openbricks-data/raw/data.parquet")
+
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["etag"] == '"abc123"'
+    assert response.headers["accept-ranges"] == "bytes"
+
+def test_download_file_range(mock_minio):
+    mock_object(mock_minio, b"0123456789")
+
+    response = client.get("/api/storage/files/openbricks-data/raw/data.parquet", headers={"Range": "bytes=-4"})
+
+    assert response.status_code == 206
+    assert response.content == b"6789"
+    assert response.headers["content-range"] == "bytes 6-9/10"
+    assert mock_minio.get_object.call_args[1] == {"offset": 6, "length": 4}
+
+def test_download_file_not_modified(mock_minio):
+    mock_object(mock_minio, b"0123456789")
+
+    response = client.get("/api/storage/files/openbricks-data/raw/data.parquet", headers={"If-None-Match": '"abc123"'})
+
+    assert response.status_code == 304
+    mock_minio.get_object.assert_not_called()
+
+def test_download_file_unsatisfiable_range(mock_minio):
+    mock_object(mock_minio, b"0123456789")
+
+    response = client.get("/api/storage/files/openbricks-data/raw/data.parquet", headers={"Range": "bytes=20-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */10"
+
+def listed(*names, size=10):
+    return [MagicMock(object_name=n, size=size, last_modified=None, is_dir=n.endswith("/")) for n in names]
+
+def test_list_files_paginates_with_continuation_token(mock_minio):
+    mock_minio.list_objects.return_value = iter(listed("a", "b", "c"))
+
+    first = client.get("/api/storage/files/b?limit=2").json()
+
+    assert [f["name"] for f in first["files"]] == ["a", "b"]
+    assert first["is_truncated"]
+
+    mock_minio.list_objects.return_value = iter(listed("c"))
+    second = client.get(f"/api/storage/files/b?limit=2&continuation_token={first['next_continuation_token']}").json()
+
+    assert mock_minio.list_objects.call_args.kwargs["start_after"] == "b"
+    assert [f["name"] for f in second["files"]] == ["c"]
+    assert not second["is_truncated"] and second["next_continuation_token"] is None
+
+def test_list_files_rejects_token_of_other_listing(mock_minio):
+    mock_minio.list_objects.return_value = iter(listed("a", "b"))
+    token = client.get("/api/storage/files/b?limit=1").json()["next_continuation_token"]
+
+    response = client.get(f"/api/storage/files/b?prefix=other/&continuation_token={token}")
+
+    assert response.status_code == 400
+
+def test_list_files_ndjson_stream_with_totals(mock_minio):
+    mock_minio.list_objects.return_value = iter(listed("t/x/1", "t/x/2", "t/y/1", "t/z"))
+
+    response = client.get("/api/storage/files/b?prefix=t/&format=ndjson&aggregate=true")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [line["name"] for line in lines[:-1]] == ["t/x/1", "t/x/2", "t/y/1", "t/z"]
+    assert lines[-1]["summary"]["objects"] == 4
+    assert lines[-1]["summary"]["prefixes"] == [
+        {"prefix": "t/", "objects": 1, "size": 10},
+        {"prefix": "t/x/", "objects": 2, "size": 20},
+        {"prefix": "t/y/", "objects": 1, "size": 10},
+    ]
+
+def test_request_id_propagated_and_metrics_exposed(mock_db, mock_minio):
+    response = client.get("/health", headers={"X-Request-Id": "gw-123"})
+    assert response.headers["x-request-id"] == "gw-123"
+    # MinIO calls on the I/O pool are timed as spans of the request
+    assert "minio_list_buckets;dur=" in response.headers["server-timing"]
+    # Generated when the gateway did not send one
+    assert client.get("/health").headers["x-request-id"]
+
+    body = client.get("/metrics").text
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in body
+    assert "object_store_operation_seconds_bucket" in body
+    assert "db_pool_connections_open" in body
+
+def test_prefix_usage_with_children(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchall.side_effect = [
+        [{"bucket": "data", "prefix": "sales/", "object_count": 3, "total_bytes": 300,
+          "updated_at": None, "scanned_at": None}],
+        [{"prefix": "sales/2024/", "object_count": 2, "total_bytes": 200, "updated_at": None}],
+    ]
+
+    response = client.get("/api/storage/usage/buckets/data?prefix=/sales&children=true")
+
+    assert response.status_code == 200
+    assert response.json()["total_bytes"] == 300
+    assert response.json()["children"][0]["prefix"] == "sales/2024/"
+    # The prefix is normalised to the index's directory form
+    assert cursor.execute.call_args_list[0][0][1] == ("sales/", "sales/", "data")
+
+@pytest.mark.parametrize("headers, visibility", [
+    ({}, (False, None)),
+    ({"X-User-Id": "123", "X-User-Role": "user"}, (False, 123)),
+    ({"X-User-Id": "1", "X-User-Role": "admin"}, (True, 1)),
+])
+def test_table_usage_hides_private_tables(mock_db, headers, visibility):
+    conn, cursor = mock_db
+    cursor.fetchall.return_value = []
+
+    response = client.get("/api/storage/usage/tables", headers=headers)
+
+    assert response.status_code == 200
+    query, params = cursor.execute.call_args[0]
+    assert "t.is_public = true OR t.owner_id = %s" in query
+    assert params[-2:] == visibility
+
+def test_private_table_usage_not_found(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchall.return_value = []
+
+    response = client.get("/api/storage/usage/tables/7", headers={"X-User-Id": "123", "X-User-Role": "user"})
+
+    assert response.status_code == 404
+
+def test_usage_of_unindexed_bucket_not_found(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchall.return_value = []
+
+    response = client.get("/api/storage/usage/buckets/unknown")
+
+    assert response.status_code == 404
+
+def test_upload_archive_streams_entries_to_bucket(mock_minio):
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for name, content in {"a.csv": b"1,2\n", "sub/b.csv": b"3,4\n"}.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    mock_minio.bucket_exists.return_value = True
+    written = {}
+    def put_object(bucket, name, data, length, **kwargs):
+        written[name] = data.read()
+        return MagicMock(etag=f"etag-{name}")
+    mock_minio.put_object.side_effect = put_object
+
+    response = client.post("/api/storage/archives/data?prefix=raw/2024", content=archive.getvalue())
+
+    assert response.status_code == 200
+    assert written == {"raw/2024/a.csv": b"1,2\n", "raw/2024/sub/b.csv": b"3,4\n"}
+    assert [f["etag"] for f in response.json()["files"]] == ["etag-raw/2024/a.csv", "etag-raw/2024/sub/b.csv"]
+    assert response.json()["throughput_bytes_per_second"] > 0
+
+def test_upload_archive_rejects_unreadable_body(mock_minio):
+    mock_minio.bucket_exists.return_value = True
+
+    response = client.post("/api/storage/archives/data", content=b"not an archive" * 100)
+
+    assert response.status_code == 400
@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from usage_index import UsageIndex, ObjectEvent, parent_of, parse_records, prefixes_of
+
+
+@pytest.fixture
+def db():
+    conn = MagicMock()
+    conn.__enter__.return_value = conn
+    cursor = MagicMock()
+    conn.cursor.return_value = cursor
+    with patch("usage_index.execute_values") as execute_values:
+        yield conn, cursor, execute_values
+
+
+def added(execute_values):
+    """(prefix, parent, count, bytes) rows of the last storage_usage upsert"""
+    rows = execute_values.call_args_list[-1][0][2]
+    return {prefix: (parent, count, size) for _, prefix, parent, count, size in rows}
+
+
+def test_prefixes_of_key():
+    assert prefixes_of("a/b/c.parquet", 16) == ["", "a/", "a/b/"]
+    assert prefixes_of("top.csv", 16) == [""]
+    assert prefixes_of("a/b/c/d.parquet", 2) == ["", "a/", "a/b/"]
+
+
+def test_parent_of_prefix():
+    assert parent_of("") is None
+    assert parent_of("a/") == ""
+    assert parent_of("a/b/") == "a/"
+
+
+def test_parse_records_decodes_keys_and_removals():
+    notification = {"Records": [
+        {"eventName": "s3:ObjectCreated:Put", "eventTime": "2024-01-01T00:00:00Z",
+         "s3": {"bucket": {"name": "data"}, "object": {"key": "sales/q1+report%281%29.csv", "size": 42, "eTag": "e1"}}},
+        {"eventName": "s3:ObjectRemoved:Delete",
+         "s3": {"bucket": {"name": "data"}, "object": {"key": "old.csv"}}},
+        {"eventName": "s3:ObjectAccessed:Get",
+         "s3": {"bucket": {"name": "data"}, "object": {"key": "read.csv"}}},
+    ]}
+    events = parse_records(notification)["data"]
+    assert [(e.key, e.size, e.removed) for e in events] == [
+        ("sales/q1 report(1).csv", 42, False),
+        ("old.csv", None, True),
+    ]
+
+
+def test_apply_adds_deltas_to_ancestor_prefixes(db):
+    conn, cursor, execute_values = db
+    # New object, then an overwrite of a 100 byte object, then a removal of a 30 byte one
+    cursor.fetchone.side_effect = [None, {"size": 100}, {"size": 30}]
+    index = UsageIndex(lambda: conn, max_depth=16)
+
+    changed = index.apply("data", [
+        ObjectEvent("t/a/1.parquet", 10),
+        ObjectEvent("t/b/2.parquet", 150),
+        ObjectEvent("t/b/3.parquet", None),
+    ])
+
+    assert changed == 3
+    assert added(execute_values) == {
+        "": (None, 0, 30),
+        "t/": ("", 0, 30),
+        "t/a/": ("t/", 1, 10),
+        "t/b/": ("t/", -1, 20),
+    }
+
+
+def test_apply_ignores_removal_of_unindexed_object(db):
+    conn, cursor, execute_values = db
+    cursor.fetchone.return_value = None
+    index = UsageIndex(lambda: conn, max_depth=16)
+
+    assert index.apply("data", [ObjectEvent("gone.csv", None)]) == 0
+    execute_values.assert_not_called()
+
+
+def test_reconcile_rebuilds_totals_and_reports_drift(db):
+    conn, cursor, execute_values = db
+    # Scanned before; the index held 1 object of 5 bytes
+    cursor.fetchone.side_effect = [{"?column?": 1}, {"objects": 1, "bytes": 5}]
+    pooled = MagicMock()
+    index = UsageIndex(pooled, max_depth=16, connect_rescan=lambda: conn)
+    listing = [
+        SimpleNamespace(object_name="t/1.parquet", size=10, etag="a", last_modified=None, is_dir=False),
+        SimpleNamespace(object_name="t/", size=0, etag=None, last_modified=None, is_dir=True),
+        SimpleNamespace(object_name="t/p=1/2.parquet", size=20, etag="b", last_modified=None, is_dir=False),
+    ]
+
+    report = index.reconcile("data", listing)
+
+    assert report["objects"] == 2
+    assert report["bytes"] == 30
+    assert report["drift_objects"] == 1
+    assert report["drift_bytes"] == 25
+    # Ran on its own connection, closed afterwards, not on a pooled one
+    pooled.assert_not_called()
+    conn.close.assert_called_once()
+    assert added(execute_values) == {
+        "": (None, 2, 30),
+        "t/": ("", 2, 30),
+        "t/p=1/": ("t/", 1, 20),
+    }
+
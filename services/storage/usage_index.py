@@ -0,0 +1,463 @@
+"""
+Storage usage index.
+Object counts and bytes per bucket, per prefix and (through their
+locations) per catalog table, kept in Postgres so a size is one primary-key
+lookup instead of a recursive listing. Every object's size is stored in
+'storage_objects', and each of its ancestor prefixes ('' for the bucket,
+then 'a/', 'a/b/', ...) has a running total in 'storage_usage'.
+
+Totals are updated incrementally from MinIO bucket notifications. A rescan
+of each bucket every reconcile interval (or after its listener lost events)
+rebuilds them from a full listing. Event updates and rescans of a bucket
+hold the same advisory lock, so events that arrive during a rescan are
+applied after it and the result is exact.
+"""
+
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import unquote_plus
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+# Prefix of a bucket's own totals
+BUCKET_ROOT = ""
+
+NOTIFICATION_EVENTS = ("s3:ObjectCreated:*", "s3:ObjectRemoved:*")
+
+# Rows per INSERT while a rescan streams a listing into the index
+SCAN_BATCH = 5000
+
+
+@dataclass
+class ObjectEvent:
+    key: str
+    # None for removals
+    size: Optional[int]
+    etag: Optional[str] = None
+    event_time: Optional[str] = None
+
+    @property
+    def removed(self) -> bool:
+        return self.size is None
+
+
+def prefixes_of(key: str, max_depth: int) -> List[str]:
+    """The bucket root and the first `max_depth` directory prefixes of `key`"""
+    parts = key.split("/")[:-1]
+    return [BUCKET_ROOT] + ["/".join(parts[:i]) + "/" for i in range(1, min(len(parts), max_depth) + 1)]
+
+
+def parent_of(prefix: str) -> Optional[str]:
+    if prefix == BUCKET_ROOT:
+        return None
+    head = prefix[:-1].rpartition("/")[0]
+    return head + "/" if head else BUCKET_ROOT
+
+
+def parse_records(notification: Dict[str, Any]) -> Dict[str, List[ObjectEvent]]:
+    """Object events of a MinIO notification, per bucket"""
+    events: Dict[str, List[ObjectEvent]] = {}
+    for record in notification.get("Records") or []:
+        name = record.get("eventName", "")
+        s3 = record.get("s3", {})
+        bucket = s3.get("bucket", {}).get("name")
+        obj = s3.get("object", {})
+        if not bucket or "key" not in obj:
+            continue
+        key = unquote_plus(obj["key"])
+        if name.startswith("s3:ObjectCreated:"):
+            event = ObjectEvent(key, int(obj.get("size") or 0), obj.get("eTag"), record.get("eventTime"))
+        elif name.startswith("s3:ObjectRemoved:"):
+            event = ObjectEvent(key, None, event_time=record.get("eventTime"))
+        else:
+            continue
+        events.setdefault(bucket, []).append(event)
+    return events
+
+
+class UsageIndex:
+    """
+    Reads and updates of the index tables; `connect()` returns a pooled
+    connection and `connect_rescan()` (default: `connect`) one of its own.
+    """
+
+    def __init__(self, connect: Callable, max_depth: int, connect_rescan: Optional[Callable] = None):
+        self.connect = connect
+        self.max_depth = max_depth
+        self.connect_rescan = connect_rescan or connect
+
+    def apply(self, bucket: str, events: List[ObjectEvent]) -> int:
+        """Apply object events to the index in one transaction; returns how many changed it"""
+        deltas: Dict[str, List[int]] = {}
+        changed = 0
+        with self.connect() as conn:
+            cur = conn.cursor()
+            _lock_bucket(cur, bucket)
+            for event in events:
+                if event.removed:
+                    cur.execute(
+                        "DELETE FROM storage_objects WHERE bucket = %s AND key = %s RETURNING size",
+                        (bucket, event.key)
+                    )
+                    old = cur.fetchone()
+                    if old is None:
+                        continue
+                    count, size = -1, -old["size"]
+                else:
+                    cur.execute(
+                        "SELECT size FROM storage_objects WHERE bucket = %s AND key = %s",
+                        (bucket, event.key)
+                    )
+                    old = cur.fetchone()
+                    cur.execute(
+                        """
+                        INSERT INTO storage_objects (bucket, key, size, etag, last_modified)
+                        VALUES (%s, %s, %s, %s, COALESCE(%s::timestamptz, NOW()))
+                        ON CONFLICT (bucket, key) DO UPDATE SET
+                            size = EXCLUDED.size, etag = EXCLUDED.etag, last_modified = EXCLUDED.last_modified
+                        """,
+                        (bucket, event.key, event.size, event.etag, event.event_time)
+                    )
+                    count = 0 if old else 1
+                    size = event.size - (old["size"] if old else 0)
+                changed += 1
+                for prefix in prefixes_of(event.key, self.max_depth):
+                    delta = deltas.setdefault(prefix, [0, 0])
+                    delta[0] += count
+                    delta[1] += size
+            self._add(cur, bucket, deltas)
+        return changed
+
+    def reconcile(self, bucket: str, objects: Iterable) -> Dict[str, Any]:
+        """Rebuild a bucket's index from a full listing (minio Object items)"""
+        # The transaction and the bucket's lock are held for the whole
+        # listing, minutes on a large bucket, so a pooled connection would be
+        # taken from requests for that long. The rescan opens a connection of
+        # its own instead: one connection beyond the pool size while it runs,
+        # at the cost of connecting anew for each rescan.
+        conn = self.connect_rescan()
+        try:
+            with conn:
+                return self._rebuild(conn.cursor(), bucket, objects)
+        finally:
+            conn.close()
+
+    def _rebuild(self, cur, bucket: str, objects: Iterable) -> Dict[str, Any]:
+        started = time.perf_counter()
+        totals: Dict[str, List[int]] = {BUCKET_ROOT: [0, 0]}
+        _lock_bucket(cur, bucket)
+        cur.execute("SELECT 1 FROM storage_usage_scans WHERE bucket = %s", (bucket,))
+        first_scan = cur.fetchone() is None
+        cur.execute(
+            "SELECT count(*) AS objects, COALESCE(sum(size), 0) AS bytes FROM storage_objects WHERE bucket = %s",
+            (bucket,)
+        )
+        before = cur.fetchone()
+        cur.execute("DELETE FROM storage_objects WHERE bucket = %s", (bucket,))
+        batch = []
+        for obj in objects:
+            if obj.is_dir:
+                continue
+            batch.append((bucket, obj.object_name, obj.size, obj.etag, obj.last_modified))
+            for prefix in prefixes_of(obj.object_name, self.max_depth):
+                total = totals.setdefault(prefix, [0, 0])
+                total[0] += 1
+                total[1] += obj.size
+            if len(batch) >= SCAN_BATCH:
+                _insert_objects(cur, batch)
+                batch = []
+        if batch:
+            _insert_objects(cur, batch)
+
+        cur.execute("DELETE FROM storage_usage WHERE bucket = %s", (bucket,))
+        self._add(cur, bucket, totals)
+        objects_count, total_bytes = totals[BUCKET_ROOT]
+        seconds = time.perf_counter() - started
+        report = {
+            "bucket": bucket,
+            "objects": objects_count,
+            "bytes": total_bytes,
+            "prefixes": len(totals),
+            # What the incremental updates had missed (or counted twice)
+            "drift_objects": None if first_scan else objects_count - before["objects"],
+            "drift_bytes": None if first_scan else total_bytes - int(before["bytes"]),
+            "seconds": round(seconds, 3),
+        }
+        cur.execute(
+            """
+            INSERT INTO storage_usage_scans (bucket, objects, bytes, drift_objects, drift_bytes, duration_ms, scanned_at)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (bucket) DO UPDATE SET
+                objects = EXCLUDED.objects, bytes = EXCLUDED.bytes,
+                drift_objects = EXCLUDED.drift_objects, drift_bytes = EXCLUDED.drift_bytes,
+                duration_ms = EXCLUDED.duration_ms, scanned_at = EXCLUDED.scanned_at
+            """,
+            (bucket, objects_count, total_bytes, report["drift_objects"], report["drift_bytes"], int(seconds * 1000))
+        )
+        return report
+
+    def forget(self, bucket: str):
+        """Drop every index row of a bucket that no longer exists"""
+        with self.connect() as conn:
+            cur = conn.cursor()
+            _lock_bucket(cur, bucket)
+            for table in ("storage_objects", "storage_usage", "storage_usage_scans"):
+                cur.execute(f"DELETE FROM {table} WHERE bucket = %s", (bucket,))
+
+    def last_scans(self) -> Dict[str, datetime]:
+        return {row["bucket"]: row["scanned_at"] for row in
+                self._fetch("SELECT bucket, scanned_at FROM storage_usage_scans")}
+
+    def buckets(self) -> List[Dict[str, Any]]:
+        return self._fetch(
+            """
+            SELECT s.bucket, COALESCE(u.object_count, 0) AS object_count, COALESCE(u.total_bytes, 0) AS total_bytes,
+                   u.updated_at, s.scanned_at, s.drift_objects, s.drift_bytes
+            FROM storage_usage_scans s
+            LEFT JOIN storage_usage u ON u.bucket = s.bucket AND u.prefix = ''
+            ORDER BY s.bucket
+            """
+        )
+
+    def prefix(self, bucket: str, prefix: str) -> Optional[Dict[str, Any]]:
+        rows = self._fetch(
+            """
+            SELECT s.bucket, %s AS prefix, COALESCE(u.object_count, 0) AS object_count,
+                   COALESCE(u.total_bytes, 0) AS total_bytes, u.updated_at, s.scanned_at
+            FROM storage_usage_scans s
+            LEFT JOIN storage_usage u ON u.bucket = s.bucket AND u.prefix = %s
+            WHERE s.bucket = %s
+            """,
+            (prefix, prefix, bucket)
+        )
+        return rows[0] if rows else None
+
+    def children(self, bucket: str, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """Direct sub-prefixes of `prefix`, largest first"""
+        return self._fetch(
+            """
+            SELECT prefix, object_count, total_bytes, updated_at FROM storage_usage
+            WHERE bucket = %s AND parent = %s
+            ORDER BY total_bytes DESC LIMIT %s
+            """,
+            (bucket, prefix, limit)
+        )
+
+    def tables(self, database: Optional[str] = None, table_id: Optional[int] = None,
+               all_tables: bool = False, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Catalog tables with the usage of the prefix at their location. Like
+        the catalog listing, only public tables and those owned by `user_id`
+        are included unless `all_tables` (admins).
+        """
+        return self._fetch(
+            f"""
+            SELECT t.id, t.name, t.database, t.owner_id, t.location,
+                   COALESCE(u.object_count, 0) AS object_count, COALESCE(u.total_bytes, 0) AS total_bytes,
+                   u.updated_at
+            FROM data_tables t
+            LEFT JOIN storage_usage u
+              ON u.bucket = {_LOCATION_BUCKET} AND u.prefix = {_LOCATION_PREFIX}
+            WHERE t.location LIKE 's3a://%%'
+              AND (%s::text IS NULL OR t.database = %s) AND (%s::int IS NULL OR t.id = %s)
+              AND {_VISIBLE}
+            ORDER BY total_bytes DESC
+            """,
+            (database, database, table_id, table_id, all_tables, user_id)
+        )
+
+    def owners(self, all_tables: bool = False, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Table count and usage per table owner, over the tables visible as in `tables`"""
+        return self._fetch(
+            f"""
+            SELECT t.owner_id, count(*) AS tables,
+                   COALESCE(sum(u.object_count), 0) AS object_count, COALESCE(sum(u.total_bytes), 0) AS total_bytes
+            FROM data_tables t
+            LEFT JOIN storage_usage u
+              ON u.bucket = {_LOCATION_BUCKET} AND u.prefix = {_LOCATION_PREFIX}
+            WHERE t.location LIKE 's3a://%%'
+              AND {_VISIBLE}
+            GROUP BY t.owner_id
+            ORDER BY total_bytes DESC
+            """,
+            (all_tables, user_id)
+        )
+
+    def _add(self, cur, bucket: str, deltas: Dict[str, List[int]]):
+        # Sorted so concurrent writers lock rows in the same order
+        rows = [(bucket, prefix, parent_of(prefix), count, size)
+                for prefix, (count, size) in sorted(deltas.items()) if count or size or prefix == BUCKET_ROOT]
+        if not rows:
+            return
+        execute_values(
+            cur,
+            """
+            INSERT INTO storage_usage (bucket, prefix, parent, object_count, total_bytes)
+            VALUES %s
+            ON CONFLICT (bucket, prefix) DO UPDATE SET
+                object_count = storage_usage.object_count + EXCLUDED.object_count,
+                total_bytes = storage_usage.total_bytes + EXCLUDED.total_bytes,
+                updated_at = NOW()
+            """,
+            rows
+        )
+        cur.execute(
+            "DELETE FROM storage_usage WHERE bucket = %s AND prefix = ANY(%s) AND prefix <> '' AND object_count <= 0",
+            (bucket, [row[1] for row in rows])
+        )
+
+    def _fetch(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+
+# Bucket and directory prefix of data_tables.location (s3a://bucket/path)
+_LOCATION_BUCKET = "split_part(substr(t.location, 7), '/', 1)"
+_LOCATION_PATH = f"trim(both '/' from substr(t.location, 8 + length({_LOCATION_BUCKET})))"
+# '' (BUCKET_ROOT) for a table at the root of its bucket, else 'path/'
+_LOCATION_PREFIX = f"COALESCE(NULLIF({_LOCATION_PATH}, '') || '/', '')"
+# Takes (all_tables, user_id): every table, or the public ones and the user's own
+_VISIBLE = "(%s OR t.is_public = true OR t.owner_id = %s)"
+
+
+def _lock_bucket(cur, bucket: str):
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"storage_usage:{bucket}",))
+
+
+def _insert_objects(cur, rows: List[tuple]):
+    execute_values(
+        cur,
+        "INSERT INTO storage_objects (bucket, key, size, etag, last_modified) VALUES %s",
+        rows
+    )
+
+
+class BucketEventListener(threading.Thread):
+    """
+    Applies a bucket's MinIO notifications to the index. `missed_events` is
+    set whenever the stream broke, since events are not replayed.
+    """
+
+    def __init__(self, client, bucket: str, index: UsageIndex):
+        super().__init__(name=f"usage-events-{bucket}", daemon=True)
+        self.client = client
+        self.bucket = bucket
+        self.index = index
+        self.missed_events = False
+        self.events = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = 1
+        while not self._stop_event.is_set():
+            try:
+                with self.client.listen_bucket_notification(self.bucket, events=NOTIFICATION_EVENTS) as stream:
+                    for notification in stream:
+                        for bucket, events in parse_records(notification).items():
+                            self.events += self.index.apply(bucket, events)
+                        backoff = 1
+                        if self._stop_event.is_set():
+                            return
+            except Exception as e:
+                self.missed_events = True
+                logger.warning(f"Usage events of bucket '{self.bucket}' interrupted: {e}; retrying in {backoff}s")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+
+class UsageIndexer(threading.Thread):
+    """
+    Keeps one BucketEventListener per bucket and rescans buckets never
+    scanned, scanned more than `interval` seconds ago, whose listener missed
+    events, or requested through `request_rescan`.
+    """
+
+    def __init__(self, client, index: UsageIndex, interval: int, poll: int = 60):
+        super().__init__(name="usage-indexer", daemon=True)
+        self.client = client
+        self.index = index
+        self.interval = interval
+        self.poll = poll
+        self.listeners: Dict[str, BucketEventListener] = {}
+        self.last_reports: Dict[str, Dict[str, Any]] = {}
+        self._requested: set = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        for listener in self.listeners.values():
+            listener.stop()
+
+    def request_rescan(self, bucket: str):
+        with self._lock:
+            self._requested.add(bucket)
+        self._wake.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_cycle()
+            except Exception as e:
+                logger.error(f"Usage index cycle failed: {e}")
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    def run_cycle(self):
+        buckets = {b.name for b in self.client.list_buckets()}
+        # Listen first: events during the rescan then land after it
+        for bucket in buckets:
+            listener = self.listeners.get(bucket)
+            if listener is None or not listener.is_alive():
+                listener = self.listeners[bucket] = BucketEventListener(self.client, bucket, self.index)
+                listener.start()
+        for bucket in [b for b in self.listeners if b not in buckets]:
+            self.listeners.pop(bucket).stop()
+            self.last_reports.pop(bucket, None)
+            self.index.forget(bucket)
+            logger.info(f"Bucket '{bucket}' is gone; removed from the usage index")
+
+        last_scans = self.index.last_scans()
+        due = time.time() - self.interval
+        with self._lock:
+            requested, self._requested = self._requested, set()
+        for bucket in sorted(buckets):
+            if self._stop_event.is_set():
+                return
+            listener = self.listeners[bucket]
+            scanned_at = last_scans.get(bucket)
+            if not (bucket in requested or listener.missed_events or scanned_at is None
+                    or scanned_at.timestamp() < due):
+                continue
+            listener.missed_events = False
+            try:
+                report = self.index.reconcile(bucket, self.client.list_objects(bucket, recursive=True))
+            except Exception as e:
+                logger.error(f"Usage rescan of bucket '{bucket}' failed: {e}")
+                listener.missed_events = True
+                continue
+            self.last_reports[bucket] = report
+            logger.info(f"Usage rescan of bucket '{bucket}': {report}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "listeners": sum(1 for l in self.listeners.values() if l.is_alive()),
+            "events": sum(l.events for l in self.listeners.values()),
+            "drift_objects": sum(abs(r["drift_objects"] or 0) for r in self.last_reports.values()),
+        }